@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Batch renderer: headless rendering of Geoplotter maps from a list of jobs, over a process pool
+
+Usage:
+    python batch.py jobs.json [--workers N] [--report timings.json]
+
+jobs.json holds a list of jobs (or a JSON object per line), each of the form:
+    {"data": "data/GBplaces.csv",
+     "map": "data/ukMERC.png",
+     "georef": {"cities": [[pxlon,pxlat,lon,lat],[pxlon,pxlat,lon,lat]]}  or  {"bounds": [west,east,south,north]}
+               or {"points": [[pxlon,pxlat,lon,lat],...]} (least squares), optionally with "projection": "Mercator",
+     "options": {"title": "...", "plottype": "Placenames", "population": false, "type": true,
+                 "placenames": true, "labels": 10, "legend": true, "bins": 200, "smoothing": 1.0,
+                 "detail": false},
+     "output": "out/uk.png",
+     "dpi": 100}
+The output format (PNG, SVG, PDF...) follows the extension of "output".
+"""
+
+#%% Import modules
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+
+import georef
+import imagecache
+import render
+from placetable import loadPlaces
+
+
+#%% Per-worker caches: each dataset and map is parsed once per worker process
+
+places = {}
+images = imagecache.ImageCache()
+
+
+def getPlaces(path):
+    key = imagecache.fileKey(path)
+    if key not in places:
+        places[key] = loadPlaces(path)
+    return places[key]
+
+
+# Function returning the georeference of a job's map (fitted once per map and worker)
+def jobGeoref(job,res):
+    ref = job['georef']
+    projection = ref.get('projection',georef.Equirectangular.name)
+    if 'cities' in ref:
+        (u1,v1,x1,y1),(u2,v2,x2,y2) = ref['cities']
+        return georef.cachedFit(job['map'],georef.fromCities,res,[u1,v1],[x1,y1],[u2,v2],[x2,y2],projection)
+    if 'points' in ref:
+        return georef.cachedFit(job['map'],georef.fit,res,ref['points'],projection)
+    if 'bounds' in ref:
+        return georef.cachedFit(job['map'],georef.fromBounds,res,*ref['bounds'],projection)
+    raise ValueError("The georef of a job needs either 'cities', 'points' or 'bounds'.")
+
+
+def renderJob(job):
+    '''
+    Render a single job to its output file. Returns a report with the timings (seconds) of each
+    stage, or the error if the job failed.
+    '''
+    report = {'output':job.get('output'),'pid':os.getpid()}
+    start = time.perf_counter()
+    try:
+        t = time.perf_counter()
+        table = getPlaces(job['data'])
+        img = images.raster(job['map'])
+        report['load'] = time.perf_counter()-t
+
+        t = time.perf_counter()
+        options = render.PlotOptions.fromDict(job.get('options',{}))
+        ref = jobGeoref(job,(img.shape[1],img.shape[0]))
+        fig = Figure()
+        ax = fig.add_subplot(111)
+        render.drawMap(ax,img,ref.xlims,ref.ylims,ref.aspect)
+        ref.formatAxes(ax)
+        render.drawPlaces(ax,ref.projectTable(table),options,ref.xlims,ref.ylims,ref.aspect)
+        report['render'] = time.perf_counter()-t
+
+        t = time.perf_counter()
+        directory = os.path.dirname(job['output'])
+        if directory:
+            os.makedirs(directory,exist_ok=True)
+        fig.savefig(job['output'],dpi=job.get('dpi',100))
+        report['save'] = time.perf_counter()-t
+        report['ok'] = True
+    except (OSError,ValueError,KeyError,TypeError) as e:
+        report['ok'] = False
+        report['error'] = "%s: %s"%(type(e).__name__,e)
+    report['total'] = time.perf_counter()-start
+    return report
+
+
+# Function reading jobs from a JSON list or a JSON-lines file
+def readJobs(path):
+    with open(path) as f:
+        text = f.read()
+    try:
+        jobs = json.loads(text)
+    except json.JSONDecodeError:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return jobs if isinstance(jobs,list) else [jobs]
+
+
+def runJobs(jobs,workers=None):
+    '''Render jobs over a pool of worker processes and return their reports, in job order'''
+    #Jobs sharing a dataset and map are handed out together so they hit the same worker's cache
+    order = sorted(range(len(jobs)),key=lambda i:(jobs[i].get('data',''),jobs[i].get('map','')))
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1,len(jobs)//(4*workers))
+    reports = [None]*len(jobs)
+    if workers==1:
+        results = map(renderJob,[jobs[i] for i in order])
+        for i,r in zip(order,results):
+            reports[i] = r
+        return reports
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i,r in zip(order,pool.map(renderJob,[jobs[i] for i in order],chunksize=chunk)):
+            reports[i] = r
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Geoplotter maps without the GUI.")
+    parser.add_argument('jobs',help="JSON (or JSON lines) file listing the jobs to render")
+    parser.add_argument('--workers',type=int,default=None,help="number of worker processes (default: all cores)")
+    parser.add_argument('--report',default=None,help="write the per-job timings to this JSON file")
+    args = parser.parse_args(argv)
+
+    jobs = readJobs(args.jobs)
+    start = time.perf_counter()
+    reports = runJobs(jobs,args.workers)
+    elapsed = time.perf_counter()-start
+
+    for r in reports:
+        if r['ok']:
+            print("%-40s load %6.3fs  render %6.3fs  save %6.3fs  total %6.3fs"%(r['output'],
+                r['load'],r['render'],r['save'],r['total']))
+        else:
+            print("%-40s FAILED (%s)"%(r['output'],r['error']))
+    failed = sum(not r['ok'] for r in reports)
+    print("%d jobs in %.2fs (%d failed)"%(len(jobs),elapsed,failed))
+
+    if args.report:
+        with open(args.report,'w') as f:
+            json.dump({'elapsed':elapsed,'jobs':reports},f,indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: timing and peak memory of each stage of the Geoplotter pipeline on synthetic data
+
+Usage:
+    python benchmark.py [--sizes 100,1000,...] [--categories 2] [--duplicates 0.1] [--repeat 3]
+                        [--startup-target 0.5] [--output benchmark.json] [--compare previous.json]
+
+GBplaces-style CSV files (% place,type,population,latitude,longitude) are generated once per size
+in --workdir and reused by later runs. Every stage is run headlessly (Agg backend) --repeat times
+for its wall time, then once more under tracemalloc for its peak memory (allocations made through
+Python and numpy; buffers allocated inside matplotlib's C++ renderer are not seen). Results are
+written as JSON, and --compare prints the change of each stage against a previous results file.
+
+The startup time of the GUI (launching a fresh interpreter and importing the GUI script, which is all
+that precedes building the window) is measured too, against a target of --startup-target seconds.
+"""
+
+#%% Import modules
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+try:
+    import resource
+except ImportError:     #not available on Windows
+    resource = None
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import georef
+import imagecache
+import render
+import spatial
+from datacache import DatasetCache
+from placetable import loadPlaces
+
+
+#%% Set up variables
+
+defaultSizes = [100,1000,10000,100000,1000000,10000000]
+typeNames = ['City','Town','Village','Hamlet','Suburb','Island']
+bounds = (-8.22923,1.85502,49.9717,58.97832)    #west, east, south, north of data/ukMERC.png
+mapPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','ukMERC.png')
+guiPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),'interactive-19.11.py')
+startupTarget = 0.5     #seconds from launching the GUI until it is ready to build its window
+hoverQueries = 1000
+generateChunk = 1000000
+
+
+# Function writing a synthetic GBplaces-style CSV file of rows places
+# A fraction duplicates of the places reuse the coordinates of another place
+def generateCSV(path,rows,categories=2,duplicates=0.0,seed=0):
+    rng = np.random.default_rng(seed)
+    types = [typeNames[t] if t<len(typeNames) else 'Type%d'%t for t in range(categories)]
+    with open(path,'w',newline='') as f:
+        f.write("% place,type,population,latitude,longitude\n")
+        for start in range(0,rows,generateChunk):
+            n = min(generateChunk,rows-start)
+            lat = rng.uniform(bounds[2],bounds[3],n)
+            lon = rng.uniform(bounds[0],bounds[1],n)
+            dup = np.flatnonzero(rng.random(n)<duplicates)
+            if len(dup):
+                source = rng.integers(0,n,len(dup))
+                lat[dup],lon[dup] = lat[source],lon[source]
+            pop = np.exp(rng.normal(9,1.5,n)).astype(np.int64)+1
+            codes = rng.integers(0,categories,n)
+            f.write("".join("Place%d,%s,%d,%.5f,%.5f\n"%(start+i,types[c],p,la,lo)
+                for i,c,p,la,lo in zip(range(n),codes.tolist(),pop.tolist(),lat.tolist(),lon.tolist())))
+
+
+# Function returning the path of a synthetic data file, generating it if needed
+def dataFile(workdir,rows,categories,duplicates,seed=0):
+    name = "places_%d_%dtypes_%gdup_%d.csv"%(rows,categories,duplicates,seed)
+    path = os.path.join(workdir,name)
+    if not os.path.exists(path):
+        generateCSV(path+'.tmp',rows,categories,duplicates,seed)
+        os.replace(path+'.tmp',path)
+    return path
+
+
+#%% Stages: each takes the context of the run (ctx) and stores what later stages need in it
+
+def stageParse(ctx):
+    ctx['places'] = loadPlaces(ctx['path'])
+    #Memory used by each column of the table (bytes)
+    ctx['extra'] = {'columnBytes':dict(ctx['places'].memoryUsage())}
+
+def stageCacheStore(ctx):
+    ctx['cache'].store(ctx['path'],ctx['places'])
+
+def stageCacheLoad(ctx):
+    ctx['cache'].load(ctx['path'])
+
+def stageGroup(ctx):
+    render.groupByType(ctx['places'])
+
+def stageGeoref(ctx):
+    ref = georef.fromBounds(ctx['res'],*bounds,projection=georef.Mercator.name)
+    ctx['georef'] = ref
+    ctx['plotted'] = ref.projectTable(ctx['places'])
+
+def stageIndex(ctx):
+    ctx['index'] = spatial.GridIndex(ctx['plotted'].lon,ctx['plotted'].lat)
+
+def drawFigure(ctx,**options):
+    ref = ctx['georef']
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    render.drawMap(ax,ctx['image'],ref.xlims,ref.ylims,ref.aspect)
+    render.drawPlaces(ax,ctx['plotted'],render.PlotOptions(**options),ref.xlims,ref.ylims,ref.aspect)
+    fig.canvas.draw()
+    ctx['ax'] = ax
+
+def stageRender(ctx):
+    drawFigure(ctx)
+
+def stageRenderDetail(ctx):
+    drawFigure(ctx,detail=True)
+
+def stageHeatmap(ctx):
+    drawFigure(ctx,plottype=render.plottypes[1],population=True)
+
+def stageHover(ctx):
+    #Queries at random places of the data, as when the mouse moves over the points
+    plotted,index = ctx['plotted'],ctx['index']
+    rng = np.random.default_rng(1)
+    rows = rng.integers(0,len(plotted),hoverQueries)
+    scale = spatial.pixelScale(ctx['ax'])
+    latencies = np.empty(hoverQueries)
+    for k,i in enumerate(rows.tolist()):
+        t = time.perf_counter()
+        index.nearest(plotted.lon[i],plotted.lat[i],spatial.pickRadius,scale)
+        latencies[k] = time.perf_counter()-t
+    ctx['extra'] = {'p50':float(np.percentile(latencies,50)),'p95':float(np.percentile(latencies,95)),
+        'p99':float(np.percentile(latencies,99))}
+
+stages = [('parse',stageParse),('cacheStore',stageCacheStore),('cacheLoad',stageCacheLoad),
+    ('group',stageGroup),('georef',stageGeoref),('index',stageIndex),('render',stageRender),
+    ('renderDetail',stageRenderDetail),('heatmap',stageHeatmap),('hover',stageHover)]
+
+
+#%% Running
+
+def measure(func,ctx,repeat,memory=True):
+    '''Run a stage repeat times and return its timings (seconds) and peak traced memory (bytes)'''
+    times = []
+    for r in range(repeat):
+        t = time.perf_counter()
+        func(ctx)
+        times.append(time.perf_counter()-t)
+    result = {'seconds':min(times),'median':statistics.median(times),'runs':times}
+    if memory:
+        #Separate run: tracing allocations slows the stage down too much to time it at the same time
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        func(ctx)
+        result['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+# Function timing the startup of the GUI in fresh interpreters: returns the timings like measure
+# The window itself cannot be built headlessly: the GUI records its full startup as the 'startup' stage
+def measureStartup(repeat):
+    code = ("import importlib.util;spec=importlib.util.spec_from_file_location('geoplotter',%r);"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"%guiPath)
+    times = []
+    for r in range(repeat):
+        t = time.perf_counter()
+        subprocess.run([sys.executable,'-c',code],check=True,cwd=os.path.dirname(guiPath))
+        times.append(time.perf_counter()-t)
+    return {'seconds':min(times),'median':statistics.median(times),'runs':times}
+
+
+def runSize(path,rows,args,image,cache):
+    ctx = {'path':path,'cache':cache,'image':image,'res':(image.shape[1],image.shape[0])}
+    results = []
+    for name,func in stages:
+        if args.stages and name not in args.stages:
+            #Skipped stages still run once when later stages depend on what they build
+            if name in ('parse','georef','index','render'):
+                func(ctx)
+            continue
+        r = measure(func,ctx,args.repeat,memory=not args.no_memory)
+        r.update({'rows':rows,'categories':args.categories,'duplicates':args.duplicates,'stage':name})
+        if 'extra' in ctx:
+            r.update(ctx.pop('extra'))
+        results.append(r)
+        print("%10s rows  %-13s %9.4fs%s"%(format(rows,','),name,r['seconds'],
+            "  peak %8.1f MB"%(r['peakBytes']/2**20) if 'peakBytes' in r else ""))
+        if name=='parse':
+            print("%10s       %s"%("",ctx['places'].memoryReport()))
+    return results
+
+
+# Function describing the environment of a run, so that results files can be compared fairly
+def environment():
+    try:
+        commit = subprocess.run(['git','rev-parse','HEAD'],capture_output=True,text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'time':time.strftime('%Y-%m-%dT%H:%M:%S'),'commit':commit,'python':platform.python_version(),
+        'numpy':np.__version__,'matplotlib':matplotlib.__version__,'platform':platform.platform(),
+        'processor':platform.processor(),'cpus':os.cpu_count()}
+
+
+# Function printing the change of each stage against a previous results file
+def compare(results,startup,path):
+    with open(path) as f:
+        data = json.load(f)
+    previous = {(r['rows'],r['categories'],r['duplicates'],r['stage']):r for r in data['results']}
+    print("\nChange against %s:"%path)
+    if startup and data.get('startup'):
+        old = data['startup']
+        print("%10s       %-13s %9.4fs -> %9.4fs  (x%.2f)"%("",'startup',old['seconds'],startup['seconds'],
+            old['seconds']/startup['seconds']))
+    for r in results:
+        old = previous.get((r['rows'],r['categories'],r['duplicates'],r['stage']))
+        if old:
+            print("%10s rows  %-13s %9.4fs -> %9.4fs  (x%.2f)"%(format(r['rows'],','),r['stage'],
+                old['seconds'],r['seconds'],old['seconds']/r['seconds'] if r['seconds'] else float('inf')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Geoplotter pipeline on synthetic data.")
+    parser.add_argument('--sizes',default=",".join(map(str,defaultSizes)),help="comma separated row counts")
+    parser.add_argument('--categories',type=int,default=2,help="number of place types")
+    parser.add_argument('--duplicates',type=float,default=0.0,help="fraction of places sharing coordinates")
+    parser.add_argument('--repeat',type=int,default=3,help="timed runs of each stage (the fastest is reported)")
+    parser.add_argument('--stages',default=None,help="comma separated stages to measure (default: all)")
+    parser.add_argument('--no-memory',action='store_true',help="skip the peak memory measurements")
+    parser.add_argument('--startup-target',type=float,default=startupTarget,help="target startup time of the GUI (seconds)")
+    parser.add_argument('--no-startup',action='store_true',help="skip the startup measurement")
+    parser.add_argument('--workdir',default=os.path.join(tempfile.gettempdir(),'geoplotter-bench'),
+        help="directory of the generated data files")
+    parser.add_argument('--output',default='benchmark.json',help="results file (JSON)")
+    parser.add_argument('--compare',default=None,help="previous results file to compare with")
+    args = parser.parse_args(argv)
+    args.stages = None if args.stages is None else args.stages.split(',')
+
+    os.makedirs(args.workdir,exist_ok=True)
+    startup = None
+    if not args.no_startup:
+        startup = measureStartup(args.repeat)
+        startup.update({'target':args.startup_target,'met':startup['seconds']<=args.startup_target})
+        print("%10s       %-13s %9.4fs  (target %.2fs: %s)"%("",'startup',startup['seconds'],args.startup_target,
+            "met" if startup['met'] else "MISSED"))
+    image = imagecache.decode(mapPath)
+    cache = DatasetCache(os.path.join(args.workdir,'datasets'))
+    results = []
+    for rows in [int(float(s)) for s in args.sizes.split(',')]:
+        path = dataFile(args.workdir,rows,args.categories,args.duplicates)
+        results.extend(runSize(path,rows,args,image,cache))
+        cache.invalidate(path)
+
+    with open(args.output,'w') as f:
+        #Peak resident memory of the whole run (kilobytes on Linux), including what tracemalloc cannot see
+        peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+        json.dump({'environment':environment(),'repeat':args.repeat,'peakRSS':peakRSS,'startup':startup,
+            'results':results},f,indent=1)
+    print("Results written to %s"%args.output)
+    if args.compare:
+        compare(results,startup,args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
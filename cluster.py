@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Cluster: hierarchical grid clustering of the places, drawn as one sized marker per cluster
+
+The hierarchy is built once per place table: level L splits the square extent of the places into
+2^L x 2^L cells, and each non-empty cell is a cluster holding its count, population sum, centroid,
+bounding box and most populated place. Zooming only selects the level whose cells are about
+clusterPixels wide on screen and the clusters of that level in view.
+"""
+
+#%% Import modules
+
+import math
+import numpy as np
+
+
+#%% Set up variables
+
+clusterPixels = 48      #approximate width of the screen area merged into one cluster
+maxLevel = 20           #finest level of the hierarchy at most (2^20 x 2^20 cells)
+minDiameter = 6         #marker diameter of a single place (points)
+maxDiameter = 36        #marker diameter of the largest clusters (points)
+
+
+#%% Cluster level and tree classes
+
+class ClusterLevel:
+    '''
+    Class holding the clusters of one level as columns, in Z-order of their cells (key): cell
+    coordinates (cx,cy), count, population sum (pop), coordinate sums (sx,sy, for centroids),
+    bounding box and representative row (the most populated place, whose population is best).
+    '''
+
+    def __init__(self,key,cx,cy,count,pop,sx,sy,xmin,xmax,ymin,ymax,row,best):
+        self.key = key
+        self.cx,self.cy = cx,cy
+        self.count,self.pop = count,pop
+        self.sx,self.sy = sx,sy
+        self.xmin,self.xmax,self.ymin,self.ymax = xmin,xmax,ymin,ymax
+        self.row,self.best = row,best
+        self.x = sx/count
+        self.y = sy/count
+
+    def __len__(self):
+        return len(self.count)
+
+    @classmethod
+    def merge(cls,keys,sorted,cx,cy,count,pop,sx,sy,xmin,xmax,ymin,ymax,row,best):
+        '''Aggregate items sharing a key (places or finer clusters) into one cluster each'''
+        order = slice(None) if sorted else np.argsort(keys,kind='stable')
+        keys = keys[order]
+        if not len(keys):
+            return cls(keys,cx,cy,count,pop,sx,sy,xmin,xmax,ymin,ymax,row,best)
+        starts = np.flatnonzero(np.concatenate([[True],keys[1:]!=keys[:-1]]))
+        def add(a): return np.add.reduceat(a[order],starts)
+        def low(a): return np.minimum.reduceat(a[order],starts)
+        def high(a): return np.maximum.reduceat(a[order],starts)
+        #Representative: the first item of each cluster with its highest population
+        ranked = best[order]
+        top = high(best)
+        candidates = np.flatnonzero(ranked==np.repeat(top,np.diff(np.append(starts,len(keys)))))
+        first = candidates[np.searchsorted(candidates,starts)]
+        if not sorted:
+            first = order[first]
+        return cls(keys[starts],cx[first],cy[first],add(count),add(pop),add(sx),add(sy),low(xmin),high(xmax),low(ymin),high(ymax),
+            row[first],top)
+
+
+# Function spreading the bits of integers below 2^32 apart (bit i moves to bit 2i)
+def spreadBits(v):
+    v = v.astype(np.uint64)&np.uint64(0xffffffff)
+    for shift,mask in ((16,0x0000ffff0000ffff),(8,0x00ff00ff00ff00ff),(4,0x0f0f0f0f0f0f0f0f),
+                       (2,0x3333333333333333),(1,0x5555555555555555)):
+        v = (v|(v<<np.uint64(shift)))&np.uint64(mask)
+    return v
+
+
+# Function returning the Z-order (Morton) keys of cells: the four cells of a coarser cell are consecutive,
+# so a coarser level's keys (key>>2) come out already sorted
+def mortonKeys(cx,cy):
+    return (spreadBits(cx)|(spreadBits(cy)<<np.uint64(1))).astype(np.int64)
+
+
+class ClusterTree:
+    '''
+    Class building the cluster hierarchy of places (x,y: plot coordinates, pop: populations or None)
+    from the finest level up: each level merges the clusters of the level below, never the places.
+    '''
+
+    def __init__(self,x,y,pop=None,levels=None):
+        x = np.asarray(x,dtype=np.float64)
+        y = np.asarray(y,dtype=np.float64)
+        n = len(x)
+        self.n = n
+        if n:
+            self.x0,self.y0 = float(x.min()),float(y.min())
+            self.size = max(float(x.max())-self.x0,float(y.max())-self.y0,1e-9)*(1+1e-9)
+        else:
+            self.x0,self.y0,self.size = 0.,0.,1.
+        #Finest level: about one place per cell where places are spread evenly
+        finest = levels if levels is not None else min(maxLevel,max(1,int(math.ceil(math.log(max(n,1),4)))+1))
+        self.finest = finest
+
+        m = 2**finest
+        cx = np.minimum(((x-self.x0)/self.size*m).astype(np.int64),m-1)
+        cy = np.minimum(((y-self.y0)/self.size*m).astype(np.int64),m-1)
+        pop = np.zeros(n,dtype=np.int64) if pop is None else np.asarray(pop,dtype=np.int64)
+        self.hasPop = n>0 and bool(pop.any())
+        level = ClusterLevel.merge(mortonKeys(cx,cy),False,cx,cy,np.ones(n,dtype=np.int64),pop,x,y,x,x,y,y,
+            np.arange(n),pop)
+        self.levels = [level]
+        for L in range(finest-1,-1,-1):
+            c = self.levels[0]
+            self.levels.insert(0,ClusterLevel.merge(c.key>>2,True,c.cx>>1,c.cy>>1,c.count,c.pop,c.sx,c.sy,
+                c.xmin,c.xmax,c.ymin,c.ymax,c.row,c.best))
+
+    def levelFor(self,scale):
+        '''Return the level whose cells are about clusterPixels wide at scale (pixels per data unit)'''
+        pixels = self.size*min(scale)
+        if pixels<=0:
+            return 0
+        return int(np.clip(math.floor(math.log2(max(pixels/clusterPixels,1))),0,self.finest))
+
+    def within(self,level,xmin,xmax,ymin,ymax):
+        '''Return the clusters of level whose centroid lies in the box'''
+        c = self.levels[level]
+        return np.flatnonzero((c.x>=xmin)&(c.x<=xmax)&(c.y>=ymin)&(c.y<=ymax))
+
+
+#%% Tree of the last place table, so that successive plots of the same data do not build it again
+
+lastTree = (None,None)
+
+
+def treeFor(places):
+    global lastTree
+    if lastTree[0] is not places:
+        lastTree = (places,ClusterTree(places.lon,places.lat,places.pop))
+    return lastTree[1]
+
+
+# Function returning the marker sizes (points^2) of clusters of the given counts
+def markerSizes(count,largest):
+    scale = np.log2(count)/max(math.log2(max(largest,2)),1)
+    return (minDiameter+(maxDiameter-minDiameter)*scale)**2
+
+
+#%% Cluster layer class
+
+class ClusterLayer:
+    '''
+    Class drawing the clusters of the current view as one scatter collection (marker area and colour
+    growing with the number of places), updated from the precomputed levels on every zoom/pan.
+    '''
+
+    def __init__(self,ax,places,label='places (clusters)'):
+        self.ax = ax
+        self.places = places
+        self.tree = treeFor(places)
+        self.level = 0
+        self.visible = np.zeros(0,dtype=np.intp)
+        largest = int(self.tree.levels[0].count.max()) if self.tree.n else 1
+        self.largest = largest
+        self.artist = ax.scatter(np.zeros(0),np.zeros(0),c=np.zeros(0),cmap='plasma',marker='o',alpha=0.8,
+            edgecolors='k',linewidths=0.5,label=label)
+        self.artist.set_clim(0,max(math.log2(largest),1))
+        self.cids = [ax.callbacks.connect('xlim_changed',self.update),
+            ax.callbacks.connect('ylim_changed',self.update)]
+        self.update()
+
+    def scale(self):
+        (x0,y0),(x1,y1) = self.ax.transData.transform([(0,0),(1,1)])
+        return abs(x1-x0),abs(y1-y0)
+
+    def update(self,ax=None):
+        '''Show the clusters of the level matching the zoom that lie in the view'''
+        ax = self.ax
+        ax.apply_aspect()
+        self.level = self.tree.levelFor(self.scale())
+        (x0,x1),(y0,y1) = sorted(ax.get_xlim()),sorted(ax.get_ylim())
+        self.visible = self.tree.within(self.level,x0,x1,y0,y1)
+        c = self.tree.levels[self.level]
+        v = self.visible
+        self.artist.set_offsets(np.column_stack([c.x[v],c.y[v]]))
+        self.artist.set_sizes(markerSizes(c.count[v],self.largest))
+        self.artist.set_array(np.log2(c.count[v]))
+
+    def clusterAt(self,x,y,radius):
+        '''Return the visible cluster under (x,y) (within its marker, or radius pixels), or None'''
+        v = self.visible
+        if not len(v):
+            return None
+        c = self.tree.levels[self.level]
+        sx,sy = self.scale()
+        d = np.hypot((c.x[v]-x)*sx,(c.y[v]-y)*sy)
+        #Marker radius in pixels
+        reach = np.maximum(np.sqrt(markerSizes(c.count[v],self.largest))/2*self.ax.figure.dpi/72,radius)
+        hits = np.flatnonzero(d<=reach)
+        if not len(hits):
+            return None
+        return int(v[hits[np.argmin(d[hits])]])
+
+    def info(self,i):
+        '''Return the count, population sum, centroid and representative row of cluster i of the current level'''
+        c = self.tree.levels[self.level]
+        return int(c.count[i]),int(c.pop[i]),float(c.x[i]),float(c.y[i]),int(c.row[i])
+
+    def zoomTo(self,i,margin=0.1):
+        '''Zoom the axes onto the bounding box of cluster i of the current level'''
+        c = self.tree.levels[self.level]
+        w = max(c.xmax[i]-c.xmin[i],self.tree.size/2**(self.level+2))
+        h = max(c.ymax[i]-c.ymin[i],self.tree.size/2**(self.level+2))
+        cx,cy = (c.xmin[i]+c.xmax[i])/2,(c.ymin[i]+c.ymax[i])/2
+        self.ax.set_xlim(cx-w*(0.5+margin),cx+w*(0.5+margin))
+        self.ax.set_ylim(cy-h*(0.5+margin),cy+h*(0.5+margin))
+
+    def disconnect(self):
+        for cid in self.cids:
+            self.ax.callbacks.disconnect(cid)
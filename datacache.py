@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Dataset cache: parsed and validated place tables stored as memory-mappable binary files, so that
+reopening a known data file skips parsing altogether
+"""
+
+#%% Import modules
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+import imagecache
+from placetable import PlaceTable, NameColumn
+
+
+#%% Set up variables
+
+cacheVersion = 2
+datasetDir = os.path.join(imagecache.cacheDir,'datasets')
+defaultLimit = 4*2**30      #bytes of cached datasets kept on disk
+sampleBytes = 2**20         #bytes hashed at the start, middle and end of a data file
+
+
+# Function hashing samples of a file's content: cheap even for multi-GB files, yet catches edits that
+# keep the size and mtime (e.g. files copied with their timestamps)
+def contentHash(path,size):
+    h = hashlib.sha1()
+    with open(path,'rb') as f:
+        for start in sorted({0,max(0,size//2-sampleBytes//2),max(0,size-sampleBytes)}):
+            f.seek(start)
+            h.update(f.read(sampleBytes))
+    return h.hexdigest()
+
+
+# Function returning the cache key of a data file (path, size, mtime and content hash)
+def datasetKey(path):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return {'path':path,'size':stat.st_size,'mtime':stat.st_mtime_ns,'hash':contentHash(path,stat.st_size)}
+
+
+# Function returning the total size in bytes of the files in a directory
+def directorySize(directory):
+    total = 0
+    for root,dirs,files in os.walk(directory):
+        for f in files:
+            total += os.path.getsize(os.path.join(root,f))
+    return total
+
+
+#%% Dataset cache class
+
+class DatasetCache:
+    '''
+    Class storing place tables on disk, one directory per data file: a .npy file per column (type
+    codes keep their small integer type) plus the names as a byte buffer and offsets, and the report
+    of the invalid rows skipped if there were any. Tables are loaded as memory maps, so opening a cached file
+    takes milliseconds and columns are only read as they are used. The least recently used entries
+    are removed to keep the cache under limit bytes.
+    '''
+
+    def __init__(self,directory=datasetDir,limit=defaultLimit):
+        self.directory = directory
+        self.limit = limit
+
+    def entryDir(self,key):
+        name = hashlib.sha1(json.dumps(key,sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory,name)
+
+    def entries(self):
+        '''Return the entry directories with their metadata'''
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory,name)
+            try:
+                with open(os.path.join(entry,'meta.json')) as f:
+                    found.append((entry,json.load(f)))
+            except (OSError,ValueError):
+                continue
+        return found
+
+    def load(self,path):
+        '''Return the cached PlaceTable of the data file at path, or None if it is not cached (or stale)'''
+        key = datasetKey(path)
+        entry = self.entryDir(key)
+        try:
+            with open(os.path.join(entry,'meta.json')) as f:
+                meta = json.load(f)
+            if meta['version']!=cacheVersion or meta['key']!=key:
+                return None
+
+            def column(name):
+                if name not in meta['columns']:
+                    return None
+                return np.load(os.path.join(entry,name+'.npy'),mmap_mode='r')
+
+            names = NameColumn(column('names'),column('offsets'))
+            table = PlaceTable(names,column('lon'),column('lat'),column('pop'),column('codes'),meta['categories'])
+        except (OSError,ValueError,KeyError):
+            return None
+        #Mark the entry as recently used
+        os.utime(entry)
+        return table
+
+    def errorReport(self,path):
+        '''Return the path of the cached report of the invalid rows of the data file at path and their number, or None'''
+        entry = self.entryDir(datasetKey(path))
+        try:
+            with open(os.path.join(entry,'meta.json')) as f:
+                invalid = json.load(f).get('invalid',0)
+        except (OSError,ValueError):
+            return None
+        report = os.path.join(entry,'errors.csv')
+        return (report,invalid) if invalid and os.path.exists(report) else None
+
+    def store(self,path,table,errors=None,key=None):
+        '''
+        Write table to the cache as the parsed content of the data file at path (errors: its ValidationErrors).
+        key is the datasetKey of the file taken before it was read (taken now if None): a file that changed
+        while it was being read then no longer matches its entry, rather than being loaded truncated.
+        '''
+        key = datasetKey(path) if key is None else key
+        entry = self.entryDir(key)
+        #Entries of older versions of the same file can never be used again
+        self.invalidate(path)
+
+        tmp = entry+'.tmp%d'%os.getpid()
+        os.makedirs(tmp,exist_ok=True)
+        columns = {'lon':table.lon,'lat':table.lat,'pop':table.pop,'codes':table.codes,
+            'names':table.names.buffer,'offsets':table.names.offsets}
+        try:
+            for name,data in columns.items():
+                if data is not None:
+                    np.save(os.path.join(tmp,name+'.npy'),np.asarray(data))
+            invalid = 0 if errors is None else errors.rows
+            if invalid:
+                errors.write(os.path.join(tmp,'errors.csv'))
+            meta = {'version':cacheVersion,'key':key,'rows':len(table),'invalid':invalid,'categories':list(table.categories),
+                'columns':[name for name,data in columns.items() if data is not None],'created':time.time()}
+            with open(os.path.join(tmp,'meta.json'),'w') as f:
+                json.dump(meta,f)
+            #The complete entry appears at once: a crash leaves at most a .tmp directory behind
+            os.replace(tmp,entry)
+        except OSError:
+            shutil.rmtree(tmp,ignore_errors=True)
+            return False
+        self.prune()
+        return True
+
+    def invalidate(self,path=None):
+        '''Remove the cached entries of the data file at path (of every file if path is None)'''
+        target = None if path is None else os.path.abspath(path)
+        for entry,meta in self.entries():
+            if target is None or meta.get('key',{}).get('path')==target:
+                shutil.rmtree(entry,ignore_errors=True)
+        if target is None and os.path.isdir(self.directory):
+            #Also clear any partially written entries
+            for name in os.listdir(self.directory):
+                shutil.rmtree(os.path.join(self.directory,name),ignore_errors=True)
+
+    def prune(self):
+        '''Remove the least recently used entries until the cache is under its size limit'''
+        entries = [(os.path.getmtime(entry),directorySize(entry),entry) for entry,meta in self.entries()]
+        total = sum(size for used,size,entry in entries)
+        for used,size,entry in sorted(entries):
+            if total<=self.limit:
+                break
+            shutil.rmtree(entry,ignore_errors=True)
+            total -= size
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Georeference: projection of the places onto a map image, fitted from control points (two cities,
+any number of points by least squares) or from the boundaries of the map
+
+Plots are drawn in the plane of the map's projection: x is the longitude and y the projected
+latitude, both in degrees, so that the map image is a plain rectangle in data coordinates.
+"""
+
+#%% Import modules
+
+from collections import OrderedDict
+import numpy as np
+
+import imagecache
+
+
+#%% Projections
+
+class Equirectangular:
+    '''Plate carrée: longitude and latitude are plotted as they are'''
+
+    name = "Equirectangular"
+    linear = True
+
+    def forward(self,lon,lat):
+        return np.asarray(lon,dtype=np.float64),np.asarray(lat,dtype=np.float64)
+
+    def inverse(self,x,y):
+        return np.asarray(x,dtype=np.float64),np.asarray(y,dtype=np.float64)
+
+
+class Mercator:
+    '''Spherical Mercator, with the projected latitude expressed in degrees'''
+
+    name = "Mercator"
+    linear = False
+    maxLat = 85.0511    #latitudes are clipped to the square Web Mercator extent
+
+    def forward(self,lon,lat):
+        lat = np.radians(np.clip(np.asarray(lat,dtype=np.float64),-self.maxLat,self.maxLat))
+        return np.asarray(lon,dtype=np.float64),np.degrees(np.log(np.tan(np.pi/4+lat/2)))
+
+    def inverse(self,x,y):
+        y = np.radians(np.asarray(y,dtype=np.float64))
+        return np.asarray(x,dtype=np.float64),np.degrees(2*np.arctan(np.exp(y))-np.pi/2)
+
+
+projections = {p.name:p for p in (Equirectangular(),Mercator())}
+
+
+# Function returning a projection from its name (raises ValueError if it is unknown)
+def getProjection(name):
+    if not isinstance(name,str):
+        return name
+    if name not in projections:
+        raise ValueError("Unknown projection '%s' (expected one of %s)."%(name,", ".join(projections)))
+    return projections[name]
+
+
+#%% Georeference class
+
+class Georeference:
+    '''
+    Class holding a fitted map georeference: the projection, the extent of the map image in the
+    projected plane (xlims west/east, ylims south/north) and its resolution. When fitted from control
+    points, residuals holds the pixel error (du,dv) of each point. Coordinates are transformed as
+    whole arrays in one call.
+    '''
+
+    def __init__(self,projection,xlims,ylims,res,points=None,residuals=None):
+        self.projection = getProjection(projection)
+        self.xlims = [float(xlims[0]),float(xlims[1])]
+        self.ylims = [float(ylims[0]),float(ylims[1])]
+        self.res = (int(res[0]),int(res[1]))
+        self.points = points
+        self.residuals = residuals
+
+    @property
+    def aspect(self):
+        '''Aspect ratio keeping the pixels of the map image square'''
+        return abs(((self.xlims[1]-self.xlims[0])/self.res[0])/((self.ylims[1]-self.ylims[0])/self.res[1]))
+
+    @property
+    def rms(self):
+        '''Root mean square of the control point residuals, in pixels (None if not fitted)'''
+        if self.residuals is None:
+            return None
+        return float(np.sqrt(np.mean(np.sum(self.residuals**2,axis=1))))
+
+    def project(self,lon,lat):
+        '''Return the plot coordinates (x,y) of arrays of longitudes and latitudes'''
+        return self.projection.forward(lon,lat)
+
+    def unproject(self,x,y):
+        '''Return the longitudes and latitudes of arrays of plot coordinates'''
+        return self.projection.inverse(x,y)
+
+    def toPixels(self,lon,lat):
+        '''Return the pixel column and row (from the top left corner) of arrays of coordinates'''
+        x,y = self.project(lon,lat)
+        u = (x-self.xlims[0])/(self.xlims[1]-self.xlims[0])*self.res[0]
+        v = (self.ylims[1]-y)/(self.ylims[1]-self.ylims[0])*self.res[1]
+        return u,v
+
+    def projectTable(self,places):
+        '''Return places with their coordinates projected onto the plot plane (places itself if unchanged)'''
+        global lastProjected
+        if self.projection.linear:
+            return places
+        #Only the last projected table is kept (outside the georeference, which may be cached with its map)
+        if lastProjected[0] is not self or lastProjected[1] is not places:
+            lastProjected = (self,places,places.withCoords(*self.project(places.lon,places.lat)))
+        return lastProjected[2]
+
+    def formatAxes(self,ax):
+        '''Tick and label the y axis of ax in degrees of latitude rather than projected units'''
+        if not self.projection.linear:
+            #Imported here: matplotlib is only needed once there is a plot
+            import ticks
+            ax.yaxis.set_major_locator(ticks.LatitudeLocator(self))
+            ax.yaxis.set_major_formatter(ticks.latitudeFormatter(self))
+
+
+#%% Fitting
+
+# Function fitting a projection to control points (pixel lon, pixel lat, lon, lat) by least squares
+# Each image axis is fitted separately: pixel = scale*projected + offset
+def fit(res,points,projection=Equirectangular.name):
+    projection = getProjection(projection)
+    points = np.asarray(points,dtype=np.float64).reshape(-1,4)
+    if len(points)<2:
+        raise ValueError("At least two control points are needed to georeference a map.")
+    u,v = points[:,0],points[:,1]
+    x,y = projection.forward(points[:,2],points[:,3])
+    if np.ptp(u)==0 or np.ptp(v)==0 or np.ptp(x)==0 or np.ptp(y)==0:
+        raise ValueError("The control points must differ in both their pixel and geographical coordinates.")
+
+    (a,b),(c,d) = np.polyfit(x,u,1),np.polyfit(y,v,1)
+    residuals = np.column_stack([a*x+b-u,c*y+d-v])
+
+    #Extent of the image: its left edge is at pixel 0, its top edge at pixel row 0
+    x0 = -b/a
+    y0 = -d/c
+    xlen = res[0]/abs(a)
+    ylen = res[1]/abs(c)
+    return Georeference(projection,[x0,x0+xlen],[y0-ylen,y0],res,points,residuals)
+
+
+# Function georeferencing a map from the pixel and geographical coordinates of two cities
+def fromCities(res,c1img,c1geo,c2img,c2geo,projection=Equirectangular.name):
+    return fit(res,[list(c1img)+list(c1geo),list(c2img)+list(c2geo)],projection)
+
+
+# Function georeferencing a map from its boundaries (degrees) and resolution
+def fromBounds(res,west,east,south,north,projection=Equirectangular.name):
+    if east==west or north==south:
+        raise ValueError("The map boundaries must not be equal.")
+    projection = getProjection(projection)
+    xlims,ylims = projection.forward([west,east],[south,north])
+    return Georeference(projection,xlims,ylims,res)
+
+
+# Function reading control points from text: one point per line, 4 numbers separated by commas or spaces
+def parsePoints(text):
+    points = []
+    for line in text.splitlines():
+        line = line.split('#')[0].replace(',',' ').split()
+        if not line:
+            continue
+        if len(line)!=4:
+            raise ValueError("Each control point needs 4 values: pixel longitude, pixel latitude, longitude, latitude.")
+        points.append([float(value) for value in line])
+    return points
+
+
+#%% Transforms fitted per map image, and the last projected table
+
+maxTransforms = 16      #fitted georeferences kept (the least recently used are dropped)
+transforms = OrderedDict()
+lastProjected = (None,None,None)
+
+
+# Function returning the georeference of the map at path, fitted by fitter(*args) on first use
+# Refitting is skipped as long as the map file and the fitting inputs are unchanged
+def cachedFit(path,fitter,*args):
+    key = (imagecache.fileKey(path),fitter.__name__,repr(args))
+    if key in transforms:
+        transforms.move_to_end(key)
+    else:
+        transforms[key] = fitter(*args)
+        while len(transforms)>maxTransforms:
+            transforms.popitem(last=False)
+    return transforms[key]
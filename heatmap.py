@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Heatmap: vectorised (population-weighted) density grids of places drawn over the map
+"""
+
+#%% Import modules
+
+import math
+import numpy as np
+
+
+#%% Set up variables
+
+defaultBins = 200       #number of grid cells along the longest side of the map
+defaultSmoothing = 1.0  #standard deviation of the gaussian smoothing, in grid cells
+
+
+# Function to work out the grid shape (rows,columns) for a resolution along the longest side
+def gridShape(xlims,ylims,bins=defaultBins,aspect=1):
+    width = abs(xlims[1]-xlims[0])*aspect
+    height = abs(ylims[1]-ylims[0])
+    if width>=height:
+        return max(1,int(round(bins*height/width))),bins
+    return bins,max(1,int(round(bins*width/height)))
+
+
+# Function returning a normalised 1D gaussian kernel
+def gaussianKernel(sigma):
+    radius = max(1,int(math.ceil(3*sigma)))
+    x = np.arange(-radius,radius+1,dtype=np.float64)
+    k = np.exp(-0.5*(x/sigma)**2)
+    return k/k.sum()
+
+
+# Function to smooth a grid with a separable gaussian (one pass per axis)
+def smooth(grid,sigma):
+    if sigma<=0:
+        return grid
+    k = gaussianKernel(sigma)
+    r = len(k)//2
+    for axis in (0,1):
+        padded = np.pad(grid,[(r,r) if a==axis else (0,0) for a in (0,1)])
+        out = np.zeros_like(grid)
+        n = grid.shape[axis]
+        #Each kernel tap adds a shifted copy of the grid: cost is taps x cells, independent of points
+        for j in range(len(k)):
+            out += k[j]*(padded[j:j+n] if axis==0 else padded[:,j:j+n])
+        grid = out
+    return grid
+
+
+#%% Density grid
+
+def densityGrid(lon,lat,xlims,ylims,shape,weights=None,sigma=defaultSmoothing):
+    '''
+    Bin points into a grid of the given shape (rows,columns) over the extent xlims/ylims.
+    Row 0 is the southern edge, ready for imshow with origin='lower'. Points outside the
+    extent are ignored; weights (e.g. population) are summed per cell if given.
+    '''
+    ny,nx = shape
+    lon = np.asarray(lon,dtype=np.float64)
+    lat = np.asarray(lat,dtype=np.float64)
+    x0,x1 = min(xlims),max(xlims)
+    y0,y1 = min(ylims),max(ylims)
+
+    #Integer cell of each point, computed for all points at once
+    ix = np.floor((lon-x0)*(nx/(x1-x0))).astype(np.intp)
+    iy = np.floor((lat-y0)*(ny/(y1-y0))).astype(np.intp)
+    inside = (ix>=0)&(ix<nx)&(iy>=0)&(iy<ny)
+    cells = iy[inside]*nx+ix[inside]
+    if weights is not None:
+        weights = np.asarray(weights,dtype=np.float64)[inside]
+
+    grid = np.bincount(cells,weights=weights,minlength=nx*ny).astype(np.float64).reshape(ny,nx)
+    return smooth(grid,sigma)
+
+
+def drawHeatmap(ax,grid,xlims,ylims,cmap='YlOrRd',alpha=0.7,gamma=0.5):
+    '''
+    Draw a density grid as a single image layer over the map, leaving (near) empty cells transparent.
+    A power-law colour scale (gamma<1) keeps sparse regions visible next to dense ones.
+    '''
+    from matplotlib.colors import PowerNorm
+    top = grid.max() if grid.size else 0
+    masked = np.ma.masked_less_equal(grid,top*1e-3)
+    return ax.imshow(masked,extent=[xlims[0],xlims[1],ylims[0],ylims[1]],origin='lower',
+        cmap=cmap,norm=PowerNorm(gamma,vmin=0,vmax=top if top>0 else 1),alpha=alpha,
+        interpolation='bilinear',aspect=ax.get_aspect(),zorder=2)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Image cache: decoded map rasters and preview thumbnails, shared by openimage and run
+"""
+
+#%% Import modules
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+#%% Set up variables
+
+cacheDir = os.path.join(os.path.expanduser('~'),'.geoplotter')  #base directory of the on-disk caches
+defaultBudget = 512*2**20   #bytes of decoded images kept in memory
+thumbSize = (200,300)       #size of the preview shown in the map frame
+
+
+# Function returning the cache key of a file: it changes whenever the file is modified
+def fileKey(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path),stat.st_mtime_ns,stat.st_size)
+
+
+# Function returning PIL's Image module, or None if PIL is not installed
+# PIL is only imported on first use, so that importing this module stays cheap
+def imageModule():
+    try:
+        from PIL import Image
+    except ModuleNotFoundError:
+        return None
+    return Image
+
+
+# Function decoding an image file into an array (kept as uint8 when PIL is available)
+def decode(path):
+    Image = imageModule()
+    if Image is not None:
+        with Image.open(path) as img:
+            #Palette images are expanded so that imshow does not treat the indices as data
+            if img.mode not in ('RGB','RGBA','L'):
+                img = img.convert('RGBA')
+            return np.asarray(img)
+    import matplotlib.image
+    return matplotlib.image.imread(path)
+
+
+#%% Image cache class
+
+class ImageCache:
+    '''
+    Class keeping decoded rasters and thumbnails in memory, keyed by path, mtime and size, and evicting
+    the least recently used entries when more than budget bytes are held. Thumbnails can also be
+    persisted to thumbDir so that recently opened maps are previewed without being decoded.
+    The cache may be used from background threads.
+    '''
+
+    def __init__(self,budget=defaultBudget,thumbDir=None):
+        self.budget = budget
+        self.thumbDir = thumbDir
+        self.entries = OrderedDict()
+        self.used = 0
+        self.lock = threading.RLock()
+
+    def get(self,key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+        return None
+
+    def put(self,key,value,nbytes):
+        '''Store value, evicting the least recently used entries to stay within budget'''
+        with self.lock:
+            if key in self.entries:
+                self.used -= self.entries.pop(key)[1]
+            if nbytes>self.budget:
+                #Never cache an entry that does not fit: it would only evict everything else
+                return value
+            while self.entries and self.used+nbytes>self.budget:
+                self.used -= self.entries.popitem(last=False)[1][1]
+            self.entries[key] = (value,nbytes)
+            self.used += nbytes
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def cachedRaster(self,path):
+        '''Return the decoded image at path if it is cached (None otherwise), without decoding it'''
+        return self.get((fileKey(path),'raster'))
+
+    def raster(self,path):
+        '''Return the decoded image at path, decoding it only if it is not already cached'''
+        key = (fileKey(path),'raster')
+        img = self.get(key)
+        if img is None:
+            img = decode(path)
+            self.put(key,img,img.nbytes)
+        return img
+
+    def thumbPath(self,key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.thumbDir,name+'.png')
+
+    def thumbnail(self,path,size=thumbSize):
+        '''
+        Return (thumbnail,resolution) for the image at path: a PIL image of the given size and the
+        (width,height) of the full image. Requires PIL.
+        '''
+        from PIL import Image
+        key = (fileKey(path),'thumb',tuple(size))
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        thumb = None
+        if self.thumbDir is not None and os.path.exists(self.thumbPath(key)):
+            try:
+                with Image.open(self.thumbPath(key)) as img:
+                    thumb = img.copy()
+                    res = tuple(int(v) for v in img.info['resolution'].split('x'))
+            except (OSError,KeyError,ValueError):
+                thumb = None
+
+        if thumb is None:
+            raster = self.get((key[0],'raster'))
+            if raster is not None:
+                #Reuse the decoded raster if a Run already decoded this map
+                img = Image.fromarray(raster if raster.dtype==np.uint8 else (raster*255).astype(np.uint8))
+                res = img.size
+            else:
+                img = Image.open(path)
+                res = img.size
+                #Let JPEG decoders downscale while decoding
+                img.draft('RGB',size)
+                if img.mode not in ('RGB','RGBA','L'):
+                    img = img.convert('RGBA')
+            thumb = img.resize(size,Image.LANCZOS)
+            img.close()
+            if self.thumbDir is not None:
+                self.saveThumb(key,thumb,res)
+
+        w,h = thumb.size
+        return self.put(key,(thumb,res),w*h*len(thumb.getbands()))
+
+    def saveThumb(self,key,thumb,res):
+        from PIL import PngImagePlugin
+        info = PngImagePlugin.PngInfo()
+        info.add_text('resolution','%dx%d'%res)
+        try:
+            os.makedirs(self.thumbDir,exist_ok=True)
+            thumb.save(self.thumbPath(key),pnginfo=info)
+        except OSError:
+            #A thumbnail that cannot be saved is simply rebuilt next time
+            pass
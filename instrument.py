@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Instrument: duration and memory allocation of the named stages of loading and plotting, and latency
+percentiles of the interactive handlers (hover, pick), optionally logged as JSON lines
+
+Disabled by default: stages then cost a single attribute check. Enable with configure(), or through
+the environment variables GEOPLOTTER_PROFILE=1 and/or GEOPLOTTER_PROFILE_LOG=<path of a JSON-lines log>.
+"""
+
+#%% Import modules
+
+import os
+import json
+import time
+import functools
+import tracemalloc
+from collections import deque
+
+
+#%% Set up variables
+
+latencySamples = 1000   #latest latencies kept per handler for the percentiles
+latencyLogEvery = 100   #a latency summary is logged every latencyLogEvery calls of a handler
+
+
+# Function returning the given percentiles of a sequence of values (nearest rank)
+def percentiles(values,ps=(50,95,99)):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {'p%d'%p:values[min(len(values)-1,int(round(p/100*(len(values)-1))))] for p in ps}
+
+
+#%% Stage classes
+
+class NullStage:
+    '''Stage doing nothing, used while instrumentation is disabled'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        return False
+
+nullStage = NullStage()
+
+
+class Stage:
+    '''Context manager measuring one named stage for a Recorder'''
+
+    def __init__(self,recorder,name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        r = self.recorder
+        self.parent = r.stack[-1].name if r.stack else None
+        self.tracing = False
+        if self.parent is None:
+            #New outermost stage: its children are reported with it
+            r.group = []
+            #Allocations are only traced within stages, as tracing slows everything down (handlers too)
+            if r.memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+            elif tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+        r.stack.append(self)
+        self.memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        seconds = time.perf_counter()-self.start
+        r = self.recorder
+        r.stack.pop()
+        record = {'event':'stage','stage':self.name,'parent':self.parent,'seconds':seconds}
+        if self.memory is not None and tracemalloc.is_tracing():
+            current,peak = tracemalloc.get_traced_memory()
+            #Net allocation of the stage, and the peak since its outermost stage began, above the stage's start
+            record['allocated'] = current-self.memory
+            record['peak'] = max(0,peak-self.memory)
+        if self.tracing:
+            tracemalloc.stop()
+        r.group.append(record)
+        if self.parent is None:
+            r.last[self.name] = r.group
+        r.emit(record)
+        return False
+
+
+#%% Recorder class
+
+class Recorder:
+    '''
+    Class collecting the stage records and handler latencies. Stages are used as
+    "with recorder.stage(name):" and may be nested; the last run of each outermost stage is kept
+    in self.last with the records of its children. Records are appended to the log file, if any.
+    '''
+
+    def __init__(self,enabled=False,log=None,memory=True):
+        self.enabled = False
+        self.memory = memory
+        self.log = None
+        self.stack = []
+        self.group = []
+        self.last = {}
+        self.latencies = {}
+        self.calls = {}
+        self.configure(enabled,log,memory)
+
+    def configure(self,enabled=True,log=None,memory=None):
+        '''Enable or disable recording, optionally logging to the JSON-lines file log while enabled'''
+        if memory is not None:
+            self.memory = memory
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.enabled = bool(enabled)
+        if self.enabled and log:
+            self.log = open(log,'a')
+
+    def stage(self,name):
+        return Stage(self,name) if self.enabled else nullStage
+
+    def record(self,name,seconds):
+        '''Record an outermost stage timed elsewhere, e.g. a background task (duration only)'''
+        record = {'event':'stage','stage':name,'parent':None,'seconds':seconds}
+        self.last[name] = [record]
+        self.emit(record)
+
+    def latency(self,name,seconds):
+        '''Record one call of the handler name, which took seconds'''
+        samples = self.latencies.get(name)
+        if samples is None:
+            samples = self.latencies[name] = deque(maxlen=latencySamples)
+        samples.append(seconds)
+        self.calls[name] = self.calls.get(name,0)+1
+        if self.calls[name]%latencyLogEvery==0:
+            self.emit(dict(event='latency',handler=name,calls=self.calls[name],**percentiles(samples)))
+
+    def emit(self,record):
+        if self.log is not None:
+            record['time'] = time.time()
+            self.log.write(json.dumps(record)+'\n')
+            self.log.flush()
+
+    def summary(self,names=None,top=3):
+        '''One-line summary for a status bar: last run of each outermost stage and handler latencies'''
+        if not self.enabled:
+            return ""
+        parts = []
+        for name in (names or self.last):
+            group = self.last.get(name)
+            if not group:
+                continue
+            total = group[-1]
+            children = sorted((r for r in group if r['parent']==name),key=lambda r:-r['seconds'])[:top]
+            text = "%s %.2fs"%(name,total['seconds'])
+            if children:
+                text += " (%s)"%", ".join("%s %.2fs"%(r['stage'],r['seconds']) for r in children)
+            if 'peak' in total:
+                text += " peak %.0f MB"%(total['peak']/2**20)
+            parts.append(text)
+        for name,samples in self.latencies.items():
+            p = percentiles(samples)
+            parts.append("%s p50 %.1fms p95 %.1fms p99 %.1fms"%(name,p['p50']*1e3,p['p95']*1e3,p['p99']*1e3))
+        return "  |  ".join(parts)
+
+
+#%% Module-level recorder, shared by the GUI and the render module
+
+recorder = Recorder()
+
+
+def stage(name):
+    return recorder.stage(name)
+
+
+def configure(enabled=True,log=None,memory=None):
+    recorder.configure(enabled,log,memory)
+
+
+# Function configuring the module-level recorder from GEOPLOTTER_PROFILE and GEOPLOTTER_PROFILE_LOG
+def configureFromEnvironment():
+    log = os.environ.get('GEOPLOTTER_PROFILE_LOG')
+    enabled = os.environ.get('GEOPLOTTER_PROFILE','').strip() not in ('','0')
+    if enabled or log:
+        recorder.configure(True,log)
+
+
+# Decorator recording the latency of every call of a handler while instrumentation is enabled
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if not recorder.enabled:
+                return func(*args,**kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                recorder.latency(name,time.perf_counter()-start)
+        return wrapper
+    return decorate
@@ -8,45 +8,103 @@ date: 20/11/2018
 
 #%% Import standard modules
 
+import time
+startTime = time.perf_counter()     #the time until the window is shown is recorded as the 'startup' stage
+
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import messagebox
 from tkinter import filedialog
-import matplotlib.pyplot as plt
-import math
-
-#%% Import modules with uncertain import results
-
-importerror = False
-weberror = False
-try:
-    from PIL import Image, ImageTk
-except ModuleNotFoundError:
-    importerror = True
-try:
-    import webbrowser
-    import requests
-except ModuleNotFoundError:
-    weberror = True
+import os
+import csv
+import shutil
+import importlib.util
+import numpy as np
+
+import datacache
+import georef
+import heatmap
+import imagecache
+import instrument
+import labels
+import live
+import namesearch
+import overlay
+import query
+import render
+import spatial
+import tiles
+import wiki
+import worker
+from render import plottypes
+from placetable import (PlaceBuilder, ValidationErrors, findHeader, rowReader, streamRows,
+    cityHeaders, lonHeaders, latHeaders, popHeaders, typeHeaders)
+
+#%% Check for modules with uncertain import results
+#They are only looked for here: matplotlib.pyplot, PIL and requests are imported on first use, or in the
+#background once the window is shown (see warmImports), so that the window appears without waiting for them
+
+importerror = importlib.util.find_spec('PIL') is None
+weberror = importlib.util.find_spec('requests') is None
 
 
 #%% Set up variables
 
-plottypes = ["Placenames","Heatmap"]
-methods = ["Cities","Image boundaries"]
-markers = ['s','o','^','v','*']
-colours = ['r','c','y','b','m']
+methods = ["Cities","Image boundaries","Control points"]
+wikiPoll = 200      #milliseconds between checks for the Wikipedia summary of the hovered place
+wikiDelay = 300     #milliseconds after the last zoom/pan before the pages of the places in view are looked up
+findDelay = 150     #milliseconds after the last key typed in the Find place box before places are searched
+liveInterval = 1000//live.defaultFPS    #milliseconds between two frames of live places
 
 
 # Function for checking for presence of essential headers in CSV-file
 def checkHeader(headers,validHeaders,name='valid'):
-    headerFound = False
-    for h in range(len(headers)):
-        if headers[h].lower() in validHeaders:
-            return h
-    messagebox.showinfo("ERROR",("The file you have selected does not contain a %s header."%(name)
+    h = findHeader(headers,validHeaders)
+    if h is None:
+        messagebox.showinfo("ERROR",("The file you have selected does not contain a %s header."%(name)
             +"\nPlease verify your data sheet."))
-    return False
+    return h
+
+
+# Function run in the background to stream the rows of a data file into a builder and cache the result: returns
+# the place table of the valid rows and the ValidationErrors of the others
+def parseData(task,rows,builder,path,datasets):
+    #The file is keyed before streaming: if rows are appended meanwhile (a file still being written), the entry
+    #must not claim the grown file
+    try:
+        key = datacache.datasetKey(path)
+    except OSError:
+        key = None
+    places = streamRows(rows,builder,progress=task.report)
+    try:
+        datasets.store(path,places,builder.errors,key)
+    except OSError:
+        #The cache only speeds up the next load: a failed write is not an error
+        pass
+    return places,builder.errors
+
+
+# Function run in the background to look a data file up in the dataset cache: returns the cached place table
+# (None if there is none) and the cached report of its invalid rows (None if there were none)
+def loadCached(datasets,path):
+    places = datasets.load(path)
+    return places,(datasets.errorReport(path) if places is not None else None)
+
+
+# Function run in the background once the window is shown, importing the modules needed by the first Run
+def warmImports():
+    import matplotlib.pyplot
+    if not importerror:
+        import PIL.ImageTk
+    if not weberror:
+        import requests
+
+
+# Function run in the background to read the map of a plot: a tile pyramid (built on first use) or the decoded image
+def readMap(task,images,path,tiled):
+    if tiled:
+        return tiles.pyramidFor(path,progress=task.report)
+    return images.raster(path)
 
 
 #%% Main UI class
@@ -65,8 +123,27 @@ class Geoplotter:
         master.resizable(0,0)
 
         #Plot variables
-        self.p1 = None
-        self.cont = False
+        self.overlay = None
+        #Plot of the last Run, updated in place by the next Run while its window is open
+        self.session = None
+        self.mapKey = None
+        self.plots = []
+        self.images = imagecache.ImageCache(thumbDir=os.path.join(imagecache.cacheDir,'thumbnails'))
+        #Parsed data files, reloaded from disk without parsing the next time they are opened
+        self.datasets = datacache.DatasetCache()
+        #Wikipedia pages of the places, looked up in the background for the tooltips and clicks
+        self.wiki = None if weberror else wiki.Resolver()
+        self.wikiScheduled = False
+        #Live data followed onto the open plot (see toggleLive)
+        self.follower = None
+        self.liveLayer = None
+        #Matches of the last search (label, rows, distances) and their highlight on the open plot
+        self.matches = None
+        self.matchLayer = None
+        self.lastSearch = 'nearest'
+        #Index of the place names (built in the background once a file is loaded) and rows of the places found
+        self.nameIndex = None
+        self.found = []
         self.coords = []
         
         #GUI variables - store states of settings 
@@ -81,6 +158,9 @@ class Geoplotter:
         self.methodoption = tk.StringVar(master)
         self.methodoption.set(methods[0])
 
+        self.projectionoption = tk.StringVar(master)
+        self.projectionoption.set(georef.Equirectangular.name)
+
         self.populationVal = tk.IntVar()
         self.populationVal.set(0)
         self.typeVal = tk.IntVar()
@@ -95,6 +175,23 @@ class Geoplotter:
 
         self.hyperlink = tk.IntVar()
         self.hyperlink.set(1)
+
+        self.detail = tk.IntVar()
+        self.detail.set(0)
+
+        self.clusterVal = tk.IntVar()
+        self.clusterVal.set(0)
+
+        self.tiled = tk.IntVar()
+        self.tiled.set(0)
+
+        self.queryType = tk.StringVar(master)
+        self.queryType.set("All")
+
+        #Instrumentation, enabled from the environment (GEOPLOTTER_PROFILE, GEOPLOTTER_PROFILE_LOG) or the Profile box
+        instrument.configureFromEnvironment()
+        self.profile = tk.IntVar()
+        self.profile.set(1 if instrument.recorder.enabled else 0)
         
         self.criteria = []
 
@@ -104,6 +201,8 @@ class Geoplotter:
         self.mapframe = tk.LabelFrame(master,text="Open map")
         self.analysisframe = tk.LabelFrame(master,text="Analysis")
         self.boundariesframe = tk.LabelFrame(master,text="Boundaries")
+        self.queryframe = tk.LabelFrame(master,text="Search nearby")
+        self.findframe = tk.LabelFrame(master,text="Find place")
         self.buttons = ttk.Frame(master)
 
         #Frame layout
@@ -112,6 +211,8 @@ class Geoplotter:
         self.analysisframe.grid(row=1,column=0,rowspan=5,padx=5,pady=5,
             ipadx=5,ipady=5,sticky='NESW')
         self.boundariesframe.grid(row=0,column=3,rowspan=3,padx=5,pady=5,ipadx=5,ipady=5)
+        self.queryframe.grid(row=3,column=3,rowspan=3,padx=5,pady=5,ipadx=5,ipady=5,sticky='NESW')
+        self.findframe.grid(row=6,column=3,padx=5,pady=5,ipadx=5,ipady=5,sticky='NESW')
         self.buttons.grid(row=7,column=0,columnspan=4)#,sticky='NESW')
 
         #File frame
@@ -122,11 +223,42 @@ class Geoplotter:
 
         self.filebutton = ttk.Button(self.fileframe,
             text="Open data file...",command = self.dothings)
+        self.progresslabel = ttk.Label(self.fileframe,text="")
+        self.reloadbutton = ttk.Button(self.fileframe,
+            text="Reload file",command = self.reloadData,state='disable')
+        #Background loading (data file, map image) can be stopped at any time
+        self.cancelbutton = ttk.Button(self.fileframe,
+            text="Cancel",command = self.cancelTask,state='disable')
+        self.task = None
+        #Live mode: places appended to the data file, or sent to a socket or pipe, are added to the open plot
+        self.liveframe = ttk.Frame(self.fileframe)
+        self.livelabel = ttk.Label(self.liveframe,text="Live source: ")
+        self.liveInput = ttk.Entry(self.liveframe,width=22)
+        self.keeplabel = ttk.Label(self.liveframe,text="Keep last (places, s): ")
+        self.keepInput = ttk.Entry(self.liveframe,width=8)
+        self.windowInput = ttk.Entry(self.liveframe,width=8)
+        self.livebutton = ttk.Button(self.fileframe,
+            text="Follow",command = self.toggleLive,state='disable')
+        #Report of the invalid rows skipped by the last load (a ValidationErrors, or the path of a cached report)
+        self.loadErrors = None
+        self.errorbutton = ttk.Button(self.fileframe,
+            text="Error report...",command = self.saveErrorReport,state='disable')
 
         #File frame positions
         self.datafile.grid(row=0,column=0)
         self.datafilename.grid(row=0,column=1)
         self.filebutton.grid(row=1,column=0, columnspan=2,sticky='WE')
+        self.progresslabel.grid(row=2,column=0,columnspan=2,sticky='W')
+        self.reloadbutton.grid(row=3,column=0,sticky='WE')
+        self.cancelbutton.grid(row=3,column=1,sticky='WE')
+        self.liveframe.grid(row=4,column=0,columnspan=2,sticky='WE')
+        self.livelabel.grid(row=0,column=0,sticky='W')
+        self.liveInput.grid(row=0,column=1,columnspan=2,sticky='WE')
+        self.keeplabel.grid(row=1,column=0,sticky='W')
+        self.keepInput.grid(row=1,column=1)
+        self.windowInput.grid(row=1,column=2)
+        self.livebutton.grid(row=5,column=0,columnspan=2,sticky='WE')
+        self.errorbutton.grid(row=6,column=0,columnspan=2,sticky='WE')
 
         #Map frame
         self.mapfile = ttk.Label(self.mapframe,text="Map file: ")
@@ -135,6 +267,11 @@ class Geoplotter:
         self.mapfilename.configure(state='readonly')
 
         self.mapbutton = ttk.Button(self.mapframe,text="Open map image...",command = self.openimage)
+        #Tiled mode for very large maps: only the visible tiles are loaded, at screen resolution
+        self.tiledCheck = ttk.Checkbutton(self.mapframe,
+            text="Tiled map (large images)",variable=self.tiled,onvalue=1,offvalue=0)
+        if importerror:
+            self.tiledCheck.configure(state='disable')
         
         # Try to display image of map
         if not importerror: #only display image if PIL has been correctly imported
@@ -151,10 +288,11 @@ class Geoplotter:
         self.mapfilename.grid(row=0,column=1)
         self.mapbutton.grid(row=1,column=0, columnspan=2,sticky='WE')
         self.imagedisplay.grid(row=2,column=0,rowspan=2,columnspan=2,padx=(20,10),sticky='WE')
+        self.tiledCheck.grid(row=4,column=0,columnspan=2,sticky='W')
         
         #Analysis frame - settings of plots 
         self.type = ttk.Label(self.analysisframe, text="Type: ")
-        self.typelist = ttk.OptionMenu(self.analysisframe, self.typeoption,'',plottypes[0])
+        self.typelist = ttk.OptionMenu(self.analysisframe, self.typeoption,'',*plottypes)
 
         self.title = ttk.Label(self.analysisframe, text="Title: ")
         self.titleInput = tk.Entry(self.analysisframe, width=20,foreground='black')
@@ -172,11 +310,27 @@ class Geoplotter:
 
         self.placenameCheck = ttk.Checkbutton(self.analysisframe,
             text="Placenames", variable=self.placename,onvalue=1,offvalue=0)
+        #Number of (most populated) places to label
+        self.labelsInput = tk.Entry(self.analysisframe, width=8,foreground='black')
+        self.labelsInput.insert(0,string=str(labels.defaultLabels))
         self.legendCheck = ttk.Checkbutton(self.analysisframe,
             text="Legend", variable=self.legend,onvalue=1,offvalue=0)
         self.hyperlinkCheck = ttk.Checkbutton(self.analysisframe,
             text="Hyperlinks", variable=self.hyperlink,onvalue=1,offvalue=0)
-
+        #Level of detail: only draw the points the current view can show (for very large files)
+        self.detailCheck = ttk.Checkbutton(self.analysisframe,
+            text="Level of detail", variable=self.detail,onvalue=1,offvalue=0)
+        #Clusters: nearby places merged into one marker (sized by their number) at every zoom
+        self.clusterCheck = ttk.Checkbutton(self.analysisframe,
+            text="Cluster markers", variable=self.clusterVal,onvalue=1,offvalue=0)
+
+        #Heatmap settings: grid resolution (cells along the longest side) and smoothing (in cells)
+        self.binsLabel = ttk.Label(self.analysisframe, text="Heatmap grid: ")
+        self.binsInput = tk.Entry(self.analysisframe, width=8,foreground='black')
+        self.binsInput.insert(0,string=str(heatmap.defaultBins))
+        self.smoothLabel = ttk.Label(self.analysisframe, text="Smoothing: ")
+        self.smoothInput = tk.Entry(self.analysisframe, width=8,foreground='black')
+        self.smoothInput.insert(0,string=str(heatmap.defaultSmoothing))
 
 
         #Analysis frame positions
@@ -191,8 +345,15 @@ class Geoplotter:
         self.typeCheck.grid(row=3,column=2)
 
         self.placenameCheck.grid(row=4,column=0,sticky='W')
+        self.labelsInput.grid(row=4,column=1,sticky='W')
         self.legendCheck.grid(row=5,column=0,sticky='W')
+        self.clusterCheck.grid(row=5,column=1,sticky='W')
         self.hyperlinkCheck.grid(row=6,column=0,sticky='W')
+        self.detailCheck.grid(row=6,column=1,sticky='W')
+        self.binsLabel.grid(row=7,column=0)
+        self.binsInput.grid(row=7,column=1,sticky='W')
+        self.smoothLabel.grid(row=8,column=0)
+        self.smoothInput.grid(row=8,column=1,sticky='W')
 
         
         for child in self.analysisframe.winfo_children(): #grey out analysis widgets until file is loaded
@@ -200,8 +361,8 @@ class Geoplotter:
 
         #Boundaries frame - specify the boundaries of the map in order to accurately plot the positions of cities
         self.methodlabel = ttk.Label(self.boundariesframe,text="Method: ")
-        self.methodlist = ttk.OptionMenu(self.boundariesframe, self.methodoption,'',methods[0],
-            methods[1],command=lambda _: self.change())
+        self.methodlist = ttk.OptionMenu(self.boundariesframe, self.methodoption,'',*methods,
+            command=lambda _: self.change())
         self.methodoption.trace('w',self.change) #track if method has been updated
 
         # Option 1: provide the coordinates of two cities and deduce map boundaries implicitly
@@ -245,6 +406,18 @@ class Geoplotter:
         self.east = ttk.Entry(self.imagelimitsframe,state='disabled',width=7)
         self.south = ttk.Entry(self.imagelimitsframe,state='disabled',width=7)
 
+        # Option 3: any number of control points, fitted by least squares
+        self.pointsframe = tk.Frame(self.boundariesframe)
+        self.pointslabel = ttk.Label(self.pointsframe,
+            text="One point per line:\npixel lon, pixel lat, longitude, latitude")
+        self.pointsInput = tk.Text(self.pointsframe,width=34,height=5,state='disabled')
+
+        # Projection of the map image
+        self.projectionframe = tk.Frame(self.boundariesframe)
+        self.projectionlabel = ttk.Label(self.projectionframe,text="Projection: ")
+        self.projectionlist = ttk.OptionMenu(self.projectionframe,self.projectionoption,'',*georef.projections)
+        self.residuallabel = ttk.Label(self.projectionframe,text="")
+
         # Resolution information about the image 
         self.resolutionlabel = ttk.Label(self.resolutionframe,text="Image Resolution (X x Y):")
         self.resolutionentryX = ttk.Entry(self.resolutionframe,state='normal',width=7)
@@ -261,7 +434,9 @@ class Geoplotter:
 
         self.citiesframe.grid(row=1,column=0,columnspan=2,sticky='WE')
         self.imagelimitsframe.grid(row=2,column=0,columnspan=2,sticky='WE')
-        self.resolutionframe.grid(row=3,column=0,columnspan=2,sticky='WE')
+        self.pointsframe.grid(row=3,column=0,columnspan=2,sticky='WE')
+        self.resolutionframe.grid(row=4,column=0,columnspan=2,sticky='WE')
+        self.projectionframe.grid(row=5,column=0,columnspan=2,sticky='WE')
 
         self.city1.grid(row=0,column=0)
         self.city1px.grid(row=1,column=0)
@@ -297,21 +472,89 @@ class Geoplotter:
         self.east.grid(row=3,column=3)
         self.south.grid(row=4,column=2,padx=10)
 
+        self.pointslabel.grid(row=0,column=0,sticky='W',padx=5)
+        self.pointsInput.grid(row=1,column=0,padx=5)
+
+        self.projectionlabel.grid(row=0,column=0,sticky='W',padx=10)
+        self.projectionlist.grid(row=0,column=1,sticky='WE')
+        self.residuallabel.grid(row=1,column=0,columnspan=2,sticky='W',padx=10)
+
         self.resolutionlabel.grid(row = 0,column=0,sticky='W',padx=10)
         self.resolutionentryX.grid(row=0,column=1,padx=5,pady=10)
         self.resolutionentryY.grid(row=0,column=2,padx=5,pady=10)
         
+        #Search frame - places within a distance of, or nearest to, a place or point (right-click the plot), or in view
+        self.centreLabel = ttk.Label(self.queryframe,text="Centre (place or lat, lon): ")
+        self.centreInput = ttk.Entry(self.queryframe,width=20)
+        self.radiusLabel = ttk.Label(self.queryframe,text="Radius (km): ")
+        self.radiusInput = ttk.Entry(self.queryframe,width=8)
+        self.radiusInput.insert(0,string="30")
+        self.nearestLabel = ttk.Label(self.queryframe,text="Nearest: ")
+        self.nearestInput = ttk.Entry(self.queryframe,width=8)
+        self.nearestInput.insert(0,string="5")
+        self.queryTypeLabel = ttk.Label(self.queryframe,text="Type: ")
+        self.queryTypeList = ttk.Combobox(self.queryframe,textvariable=self.queryType,values=["All"],width=12)
+        self.radiusButton = ttk.Button(self.queryframe,text="Within radius",command=lambda: self.search('radius'))
+        self.nearestButton = ttk.Button(self.queryframe,text="Nearest",command=lambda: self.search('nearest'))
+        self.viewButton = ttk.Button(self.queryframe,text="In view",command=lambda: self.search('view'))
+        self.exportButton = ttk.Button(self.queryframe,text="Export...",command=self.exportMatches)
+        self.matchlabel = ttk.Label(self.queryframe,text="")
+
+        #Search frame positions
+        self.centreLabel.grid(row=0,column=0,columnspan=2,sticky='W',padx=5)
+        self.centreInput.grid(row=1,column=0,columnspan=2,sticky='WE',padx=5)
+        self.radiusLabel.grid(row=2,column=0,sticky='W',padx=5)
+        self.radiusInput.grid(row=2,column=1,sticky='W')
+        self.nearestLabel.grid(row=3,column=0,sticky='W',padx=5)
+        self.nearestInput.grid(row=3,column=1,sticky='W')
+        self.queryTypeLabel.grid(row=4,column=0,sticky='W',padx=5)
+        self.queryTypeList.grid(row=4,column=1,sticky='W')
+        self.radiusButton.grid(row=5,column=0,sticky='WE',padx=5)
+        self.nearestButton.grid(row=5,column=1,sticky='WE')
+        self.viewButton.grid(row=6,column=0,sticky='WE',padx=5)
+        self.exportButton.grid(row=6,column=1,sticky='WE')
+        self.matchlabel.grid(row=7,column=0,columnspan=2,sticky='W',padx=5)
+
+        for child in self.queryframe.winfo_children(): #grey out search widgets until file is loaded
+            child.configure(state='disable')
+
+        #Find frame - places found by the start of their name (or a misspelt name) as it is typed
+        self.findInput = ttk.Entry(self.findframe,width=30)
+        self.findScheduled = None
+        self.findInput.bind('<KeyRelease>',self.scheduleFind)
+        self.findInput.bind('<Return>',self.showFirstFound)
+        self.findList = tk.Listbox(self.findframe,height=5,width=34,exportselection=False)
+        self.findList.bind('<<ListboxSelect>>',self.selectFound)
+        self.findlabel = ttk.Label(self.findframe,text="")
+
+        #Find frame positions
+        self.findInput.grid(row=0,column=0,sticky='WE',padx=5)
+        self.findList.grid(row=1,column=0,sticky='WE',padx=5,pady=5)
+        self.findlabel.grid(row=2,column=0,sticky='W',padx=5)
+
+        for child in self.findframe.winfo_children(): #grey out the search box until the names are indexed
+            child.configure(state='disable')
+
         #Buttons frame - major actions that can be taken by the user: About, Help, Run the plotting, Close the UI
         self.aboutButton = tk.Button(self.buttons,text="About",command=self.aboutWindow)
         self.helpButton = tk.Button(self.buttons,text = "Help",command=self.helpWindow)
         self.runButton = tk.Button(self.buttons,text="Run",command=self.run)
-        self.closeButton = tk.Button(self.buttons,text="Close",command=self.master.destroy)
+        self.closeButton = tk.Button(self.buttons,text="Close",command=self.close)
+        #Profiling: stage timings and hover/click latencies are shown in the status bar
+        self.profileCheck = ttk.Checkbutton(self.buttons,text="Profile",variable=self.profile,
+            onvalue=1,offvalue=0,command=self.toggleProfile)
+        self.statusbar = ttk.Label(master,text="",anchor='w')
 
         #Button positions
         self.aboutButton.grid(row=0,column=0,padx=30,pady=10)
         self.helpButton.grid(row=0,column=1,padx=30,pady=10)
         self.runButton.grid(row=0,column=2,padx=30,pady=10)
         self.closeButton.grid(row=0,column=3,padx=30,pady=10)
+        self.profileCheck.grid(row=0,column=4,padx=10,pady=10)
+        self.statusbar.grid(row=8,column=0,columnspan=4,sticky='WE',padx=5)
+
+        #Once the window is shown: record how long it took and import the plotting modules in the background
+        master.after_idle(self.started)
 
         #General layout:
         #Apply the same layout to al widgets in analysis frame and mapframe
@@ -327,22 +570,28 @@ class Geoplotter:
                 if type(label)==tk.ttk.Label:
                     label.grid(sticky='W',padx=5,pady=0)
 
+    def started(self):
+        '''Method called once the window is shown'''
+        instrument.recorder.record('startup',time.perf_counter()-startTime)
+        self.refreshStatus()
+        worker.submit(warmImports)
+
     def openfile(self):
         '''
         Method used to open the CSV data file to be analysed and plotted.
         '''
 
         #Open window for user to select a (valid) CSV file.
-        filepath = tk.filedialog.askopenfile(filetypes=(("CSV files","*.csv"),("Text files","*.txt")))
+        filepath = tk.filedialog.askopenfilename(filetypes=(("CSV files","*.csv"),("Text files","*.txt")))
 
         #Check that filepath exists before updating the GUI
-        if filepath!=None:
-            self.path = filepath.name
+        #Note: the file itself is only opened while it is being read, see lineReader
+        if filepath:
+            self.path = filepath
             self.datafilename.configure(state='normal')
             self.datafilename.delete(0,'end')
             self.datafilename.insert(0,string=self.path)
             self.datafilename.configure(state='readonly')
-            self.file = open(self.path,'r')
             self.fileLoaded = True
         else:
             #update fileLoaded to inform program to not proceed until appropriate file has been loaded 
@@ -358,22 +607,12 @@ class Geoplotter:
         # Get the option in boundaries method drop-down menu
         ans = self.methodoption.get()
 
-        #Check if the menu is set to the first method
-        if ans == methods[0]:
-            #Disable all widgets within the unused frame
-            for child in self.imagelimitsframe.winfo_children():
-                child.configure(state='disable')
-            #Enable all widgets within the used frame
-            for kid in self.citiesframe.winfo_children():
-                kid.configure(state='normal')
-        #If the menu is set to the second method, apply same procedure
-        elif ans == methods[1]:
-            for child in self.imagelimitsframe.winfo_children():
-                child.configure(state='normal')
-            for kid in self.citiesframe.winfo_children():
-                kid.configure(state='disable') 
-        
-        # Note: implementation of additional methods can be added here (with further elif's)
+        #Enable all widgets within the frame of the selected method, disable those of the unused frames
+        # Note: implementation of additional methods can be added here (with a frame of their own)
+        frames = [self.citiesframe,self.imagelimitsframe,self.pointsframe]
+        for method,frame in zip(methods,frames):
+            for child in frame.winfo_children():
+                child.configure(state='normal' if method==ans else 'disable')
         
         return 1
             
@@ -384,17 +623,16 @@ class Geoplotter:
         '''
 
         # Open window for user to select an image for the map
-        imagefile = tk.filedialog.askopenfile(filetypes=(("PNG files","*.png"),
+        imagefile = tk.filedialog.askopenfilename(filetypes=(("PNG files","*.png"),
             ("JPEG files","*.jpg"),("All files","*.*")))
         
         #Check image has been selected
-        if imagefile!=None:
+        if imagefile:
 
-            self.imgpath = imagefile.name
+            self.imgpath = imagefile
             
             #Track if default image has already been loaded and, if not, update entries with default values
             # -- Note: this option allows for a default image to be loaded with known boundaries
-            # -- Although this is currently hard-coded, a smarter cache system can be implemented here
             if self.imgpath[-10:]=="ukMERC.png": self.default()
     
 
@@ -402,124 +640,154 @@ class Geoplotter:
             self.mapfilename.delete(0,'end')
             self.mapfilename.insert(0,string=self.imgpath)
             self.mapfilename.configure(state='readonly')
-            #Display image preview if PIL installed
+            #Display image preview if PIL installed (from the image cache: recent maps are not decoded again)
+            #The preview is made in the background: the map only counts as loaded once it is shown
             if not importerror:
-                img = Image.open(str.encode(self.imgpath))
-                self.res = img.size
-                img = img.resize((200,300),Image.ANTIALIAS)
-                photo = ImageTk.PhotoImage(img,master=self.master)
-                self.imagedisplay.configure(image=photo)
-                self.imagedisplay.image = photo
-
-                #Retrieve image resolution from PIL 
-                self.resolutionentryX.configure(state='normal')
-                self.resolutionentryY.configure(state='normal')
-                self.resolutionentryX.delete(0,'end')
-                self.resolutionentryY.delete(0,'end')
-                self.resolutionentryX.insert(0,string=self.res[0])
-                self.resolutionentryY.insert(0,string=self.res[1])
-                self.resolutionentryX.configure(state='readonly')
-                self.resolutionentryY.configure(state='readonly')
-            self.imageLoaded = True
+                self.imageLoaded = False
+                self.progresslabel.configure(text="Reading map...")
+                self.startTask('thumbnail',worker.submit(self.images.thumbnail,self.imgpath),self.showThumbnail)
+            else:
+                self.imageLoaded = True
             
         else:
             #Allow program to record if no image has been loaded
             self.imageLoaded = False
 
+    def showThumbnail(self,task):
+        '''Method displaying the preview of the map and its resolution once they have been read'''
+        try:
+            img,self.res = task.result()
+        except worker.Cancelled:
+            self.progresslabel.configure(text="Map loading cancelled")
+            return
+        except OSError:
+            messagebox.showinfo("ERROR","The map image could not be read.")
+            self.progresslabel.configure(text="")
+            return
+        self.progresslabel.configure(text="")
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(img,master=self.master)
+        self.imagedisplay.configure(image=photo)
+        self.imagedisplay.image = photo
+
+        #Retrieve image resolution from PIL 
+        self.resolutionentryX.configure(state='normal')
+        self.resolutionentryY.configure(state='normal')
+        self.resolutionentryX.delete(0,'end')
+        self.resolutionentryY.delete(0,'end')
+        self.resolutionentryX.insert(0,string=self.res[0])
+        self.resolutionentryY.insert(0,string=self.res[1])
+        self.resolutionentryX.configure(state='readonly')
+        self.resolutionentryY.configure(state='readonly')
+        self.imageLoaded = True
+
     def lineReader(self):
         '''
-        Method to read line by line the opened data file and store in self.data.
+        Method to open the data file and read its header into self.firstline. The remaining rows
+        are left in self.rows, to be streamed in chunks by dataLoader.
         '''
         
-
-        #Track if capable of opening using csv module 
-        csvFail = False
-        self.data = []
-    
         csv = True if self.path[-3:]=='csv' else False
-        # If csv-file imported, load it using csv package. Note: alternatives exist, such as pandas.read_csv
-        if csv:
-            try:
-                import csv
-                reader = csv.reader(self.file,delimiter=',')
-                #add each row to as list of values to data
-                for row in reader:
-                    self.data.append(row)
-                self.firstline = self.data[0]
-
-            except ModuleNotFoundError:
-                #alert user that CSV module was not found
-                csvFail = True
-                messagebox.showinfo("ERROR",("The CSV module does not appear to be installed."\
-                    "The file will be opened conventionally."))
-            except:
-                #alert user that some other error has occured
-                csvFail = True
-                messagebox.showinfo("ERROR",("an unforeseen error has occured."\
-                    "The file will be opened conventionally"))
-            
-        #if error occured in csv-read or file is not explicitly a .csv 
-        if csvFail or not csv:
-            try:
-                #add each row to as list of values to data
-                for row in self.file:
-                    r = row.rstrip()
-                    self.data.append(r.split(','))
-                    self.firstline = self.data[0]
+        try:
+            self.file = open(self.path,'r',newline='')
+            #If csv-file imported, load it using csv package, otherwise split lines conventionally
+            self.rows = rowReader(self.file,csvFile=csv)
+            self.firstline = next(self.rows)
+        except (OSError,StopIteration,UnicodeDecodeError):
+            #alert user that this file is not appropriately structured
+            messagebox.showinfo("ERROR",("File is not structured as a .csv."))
+            #inform program that the selected file is not valid
+            self.closeFile()
+            self.fileLoaded = False
 
-         
-            except:
-                #alert user that this file is not appropriately structured
-                messagebox.showinfo("ERROR",("File is not structured as a .csv."))
-                #inform program that the selected file is not valid
-                self.fileLoaded = False
+    def closeFile(self):
+        '''Method to close the data file once it has been read'''
+        if getattr(self,'file',None) is not None:
+            self.file.close()
+        self.file = None
+        self.rows = None
+
+    def showProgress(self,rows,elapsed):
+        '''Method to report the progress of the data file being read (rows and rows/sec)'''
+        rate = rows/elapsed if elapsed>0 else 0
+        self.progresslabel.configure(text="Loaded %s rows (%s rows/sec)"%(format(rows,','),format(int(rate),',')))
 
     def dataLoader(self):
         '''
-        Method used to distribute the elements of self.data into their respective lists
+        Method used to check the headers of the data file, then stream its rows in chunks into the place
+        table, self.places, in the background (see dataParsed)
         '''
 
-        #Define all possible headers in the CSV-file
-        cityHeaders = ['% place','%place','place','city','cities']
-        lonHeaders = ['longitude','lon']
-        latHeaders = ['latitude','lat']
-        popHeaders = ['population','pop']
-        typeHeaders = ['type']
-
         #Presume file is incorrect until otherwise updated
         self.fileLoaded = False
 
         #Check for the three essential headers
         self.citIdx = checkHeader(self.firstline,cityHeaders,'city')
-        if self.citIdx==False and type(self.citIdx)==bool: return 0
+        if self.citIdx is None: return self.closeFile()
         self.lonIdx = checkHeader(self.firstline,lonHeaders,'longitude')
-        if self.lonIdx==False and type(self.lonIdx)==bool: return 0
+        if self.lonIdx is None: return self.closeFile()
         self.latIdx = checkHeader(self.firstline,latHeaders,'latitude')
-        if self.latIdx==False and type(self.latIdx)==bool: return 0
+        if self.latIdx is None: return self.closeFile()
 
         #Check that the other desired headers are present
         self.popIdx = checkHeader(self.firstline,popHeaders,'population')
-        if self.popIdx==False and type(self.popIdx)==bool: 
+        if self.popIdx is None:
             self.populationCheck.configure(state='disable')
         self.typeIdx = checkHeader(self.firstline,typeHeaders,'type')
-        if self.typeIdx==False and type(self.typeIdx)==bool: 
+        if self.typeIdx is None:
             self.typeCheck.configure(state='disable')
             
-        #Check all values expected to be numerical are valid
+        #Check all values while converting each chunk: invalid rows are skipped and reported once loaded
+        builder = PlaceBuilder(self.citIdx,self.lonIdx,self.latIdx,self.popIdx,self.typeIdx,errors=ValidationErrors())
+        self.startTask('parse',worker.Task(parseData,self.rows,builder,self.path,self.datasets),
+            self.dataParsed,progress=self.showProgress)
+
+    def dataParsed(self,task):
+        '''Method receiving the place table parsed in the background'''
+        self.closeFile()
         try:
-            self.x, self.y,self.pop = [], [], []
-            for i in range(1,len(self.data)):
-                self.x.append(float(self.data[i][self.lonIdx]))
-                self.y.append(float(self.data[i][self.latIdx]))
-                if self.popIdx!=False and type(self.popIdx)==int:
-                    self.pop.append(int(self.data[i][self.popIdx]))
-            self.fileLoaded = True
-        except ValueError:
-            #Inform user that file has values that can't be interpreted correctly (i.e. expected a number, none given)
-            messagebox.showinfo("ERROR",
-                ("The file may only contain floats or integers for the coordinates of the city%s."%("and the populations" if (self.popIdx!=False and type(self.popIdx)==int) else "")))
+            places,errors = task.result()
+        except worker.Cancelled:
+            self.progresslabel.configure(text="Loading cancelled")
+            return
+        except (ValueError,csv.Error):
+            #alert user that a row after the header could not be read (e.g. not UTF-8 or a malformed quote)
+            messagebox.showinfo("ERROR",("File is not structured as a .csv."))
+            self.progresslabel.configure(text="")
             self.fileLoaded = False
-            return 0
+            return
+        self.setErrors(errors if errors.rows else None)
+        if not len(places):
+            #Inform user that no row has values that can be interpreted correctly (i.e. expected a number, none given)
+            messagebox.showinfo("ERROR",("None of the rows of the file are valid (%s).\n"%errors.summary()
+                +"Use Error report... to save the list of invalid values."))
+            return
+        self.finishLoad(places)
+        if errors.rows:
+            messagebox.showinfo("Data warning",("%s invalid rows were skipped (%s) and the other %s rows loaded.\n"
+                %(format(errors.rows,','),errors.summary(),format(len(places),','))
+                +"Use Error report... to save the list of invalid values."))
+
+    def setErrors(self,errors):
+        '''Method keeping the report of the invalid rows of the last load (None if there were none)'''
+        self.loadErrors = errors
+        self.errorbutton.configure(state='normal' if errors is not None else 'disable')
+
+    def saveErrorReport(self):
+        '''Method writing the report of the invalid rows of the last load to a CSV file (line, column, reason, value)'''
+        if self.loadErrors is None:
+            return
+        filepath = tk.filedialog.asksaveasfilename(defaultextension='.csv',filetypes=(("CSV files","*.csv"),),
+            initialfile=os.path.splitext(os.path.basename(self.path))[0]+"-errors.csv")
+        if not filepath:
+            return
+        try:
+            if isinstance(self.loadErrors,str):
+                shutil.copyfile(self.loadErrors,filepath)
+            else:
+                self.loadErrors.write(filepath)
+        except OSError as e:
+            messagebox.showinfo("ERROR","The error report could not be written (%s)."%e)
 
     def default(self):
         '''
@@ -541,6 +809,8 @@ class Geoplotter:
         #Default resolution values
         self.resolutionentryX.insert(0,string=str(538))
         self.resolutionentryY.insert(0,string=str(811))    
+        #The default map is a Mercator projection
+        self.projectionoption.set(georef.Mercator.name)
 
     def dothings(self):
         '''
@@ -548,14 +818,245 @@ class Geoplotter:
         '''
         self.openfile()
         if self.fileLoaded:
-            self.lineReader()
+            self.loadData()
+
+    def reloadData(self):
+        '''
+        Method used to parse the current data file again, discarding its cached copy
+        '''
+        self.datasets.invalidate(self.path)
+        self.fileLoaded = True
+        self.loadData()
+
+    def loadData(self):
+        '''
+        Method used to load the data file at self.path: from the dataset cache if it was parsed
+        before (and has not changed since), otherwise by reading it (and caching the result).
+        Both happen in the background; the analysis frame stays disabled until the data has arrived.
+        '''
+        self.fileLoaded = False
+        for child in self.analysisframe.winfo_children():
+            child.configure(state='disable')
+        #Live mode follows the rows appended from here on (rows appended while loading may be shown twice)
+        self.loadedSize = os.path.getsize(self.path)
+        self.setErrors(None)
+        self.startTask('cacheLoad',worker.submit(loadCached,self.datasets,self.path),self.cacheChecked)
+
+    def cacheChecked(self,task):
+        '''Method using the cached place table if there was one, otherwise starting to read the file'''
+        try:
+            places,report = task.result()
+        except worker.Cancelled:
+            self.progresslabel.configure(text="Loading cancelled")
+            return
+        except OSError:
+            places = None
+        if places is not None:
+            text = "Loaded %s rows from cache"%format(len(places),',')
+            if report is not None:
+                #The invalid rows were reported when the file was parsed: their report can still be saved
+                text += " (%s invalid skipped)"%format(report[1],',')
+                self.setErrors(report[0])
+            self.progresslabel.configure(text=text)
+            self.finishLoad(places)
+            return
+
+        self.fileLoaded = True
+        self.lineReader()
         if self.fileLoaded:
             self.dataLoader()
-        
-        #Allow user to start modifying the parameters dependant on the data
-        if self.fileLoaded:
-            for child in self.analysisframe.winfo_children():
+
+    def finishLoad(self,places):
+        '''Method called once the place table is loaded: allows the user to start modifying the parameters dependant on the data'''
+        self.places = places
+        self.fileLoaded = True
+        self.reloadbutton.configure(state='normal')
+        self.livebutton.configure(state='normal')
+        self.enableAnalysis()
+        #Matches of the previous data are no longer valid, nor is the plot drawn from it
+        self.matches = None
+        self.showMatches()
+        self.detachPlot()
+        for child in self.queryframe.winfo_children():
+            child.configure(state='normal')
+        self.queryTypeList.configure(state='readonly' if places.hasType else 'disable',values=["All"]+places.categories)
+        self.queryType.set("All")
+        self.indexNames()
+
+    def indexNames(self):
+        '''Method indexing the names of the loaded places in the background, for the Find place box'''
+        places = self.places
+        #Places found in the previous data are rows of its table: they are listed again once the index is ready
+        self.nameIndex = None
+        self.found = []
+        self.findList.delete(0,'end')
+        for child in self.findframe.winfo_children():
+            child.configure(state='disable')
+        self.findlabel.configure(text="Indexing names...")
+        start = time.perf_counter()
+
+        def indexed(task):
+            #A file loaded in the meantime has its own index on the way
+            if places is not self.places:
+                return
+            self.nameIndex = task.result()
+            if instrument.recorder.enabled:
+                instrument.recorder.record('nameIndex',time.perf_counter()-start)
+            for child in self.findframe.winfo_children():
                 child.configure(state='normal')
+            self.findlabel.configure(text="")
+            self.findPlaces()
+        worker.watch(self.master,worker.submit(namesearch.NameIndex,places.names,places.pop),indexed)
+
+    def enableAnalysis(self):
+        '''Method enabling the analysis frame, except for the criteria the data has no column for'''
+        for child in self.analysisframe.winfo_children():
+            child.configure(state='normal')
+        if not self.places.hasPop:
+            self.populationCheck.configure(state='disable')
+        if not self.places.hasType:
+            self.typeCheck.configure(state='disable')
+
+    def startTask(self,name,task,done,progress=None):
+        '''
+        Method following a background task: the controls that would start another task are disabled
+        and Cancel is enabled until done(task) is called on its completion
+        '''
+        self.task = task
+        start = time.perf_counter()
+        controls = [self.filebutton,self.reloadbutton,self.mapbutton,self.runButton]
+        states = [str(c.cget('state')) for c in controls]
+        for c in controls:
+            c.configure(state='disable')
+        self.cancelbutton.configure(state='normal')
+
+        def finished(task):
+            self.task = None
+            for c,state in zip(controls,states):
+                c.configure(state=state)
+            self.cancelbutton.configure(state='disable')
+            if instrument.recorder.enabled:
+                instrument.recorder.record(name,time.perf_counter()-start)
+            done(task)
+            self.refreshStatus()
+        worker.watch(self.master,task,finished,progress)
+
+    def cancelTask(self):
+        '''Method cancelling the background task in progress (it stops at its next progress report)'''
+        if self.task is not None:
+            self.task.cancel()
+            self.progresslabel.configure(text="Cancelling...")
+
+    def close(self):
+        '''Method closing the window, stopping any background task first'''
+        self.cancelTask()
+        if self.follower is not None:
+            self.follower.stop()
+        if self.wiki is not None:
+            self.wiki.close()
+        self.master.destroy()
+
+    def toggleLive(self):
+        '''
+        Method starting (or stopping) following live data onto the open plot: the live source if one is
+        given ("host:port" of a local socket, or the path of a named pipe or growing file, starting with
+        a header line), otherwise the rows appended to the data file since it was loaded
+        '''
+        if self.follower is not None:
+            self.stopLive("Stopped following")
+            return
+        if not self.plotOpen():
+            messagebox.showinfo("ERROR","Live places are added to the open plot: please Run a plot first.")
+            return
+        try:
+            capacity = int(self.keepInput.get()) if self.keepInput.get().strip() else None
+            window = float(self.windowInput.get()) if self.windowInput.get().strip() else None
+            if (capacity is not None and capacity<1) or (window is not None and window<=0):
+                raise ValueError()
+        except ValueError:
+            messagebox.showinfo("ERROR",("The number of places and seconds kept must be positive numbers"\
+                " (leave them blank to keep every place)."))
+            return
+
+        spec = self.liveInput.get().strip()
+        try:
+            if spec:
+                source,header = live.openSource(spec),None
+            else:
+                source,header = live.openSource(self.path,self.loadedSize),live.readHeader(self.path)
+        except (OSError,ValueError) as e:
+            messagebox.showinfo("ERROR","The live source could not be opened (%s)."%e)
+            return
+        try:
+            parser = live.RowParser(header,self.places.categories)
+        except ValueError as e:
+            source.close()
+            messagebox.showinfo("ERROR",str(e))
+            return
+
+        #Places of an earlier live session on this plot are replaced
+        if self.liveLayer is not None and self.liveLayer.ax is self.ax:
+            self.liveLayer.remove()
+        self.liveBuffer = live.LiveBuffer(capacity,window)
+        self.liveLayer = live.LiveLayer(self.ax,self.options)
+        self.follower = live.Follower(source,parser,self.georef.project)
+        self.livebutton.configure(text="Stop following")
+        self.progresslabel.configure(text="Following %s"%(spec or "the data file"))
+        self.master.after(liveInterval,self.liveFrame)
+
+    def liveFrame(self):
+        '''Method adding the live places parsed since the last frame to the plot, and dropping expired ones'''
+        follower = self.follower
+        if follower is None:
+            return
+        if not self.plotOpen() or self.liveLayer.ax is not self.ax:
+            self.stopLive("Stopped following: the plot was closed")
+            return
+
+        tables = follower.take()
+        for table in tables:
+            self.liveBuffer.append(table)
+        dropped = self.liveBuffer.trim()
+        #At most one redraw per frame, however fast the places arrive
+        if tables or dropped:
+            with instrument.stage('live'):
+                self.liveLayer.update(self.liveBuffer,follower.parser.categories)
+                self.fig.canvas.draw_idle()
+            skipped = follower.parser.skipped
+            self.progresslabel.configure(text="Live: %s places shown, %s received%s"%(format(len(self.liveBuffer),','),
+                format(follower.received,','),", %s invalid rows skipped"%format(skipped,',') if skipped else ""))
+
+        if follower.ended and follower.tables.empty():
+            self.stopLive("Live source closed" if follower.error is None else "Live source failed: %s"%follower.error)
+            return
+        self.master.after(liveInterval,self.liveFrame)
+
+    def stopLive(self,text):
+        '''Method stopping following live data (the places already added stay on the plot)'''
+        self.follower.stop()
+        self.follower = None
+        self.livebutton.configure(text="Follow")
+        self.progresslabel.configure(text=text)
+
+    def toggleProfile(self):
+        '''Method enabling or disabling the instrumentation when the Profile box is ticked'''
+        instrument.configure(self.profile.get()==1,log=os.environ.get('GEOPLOTTER_PROFILE_LOG'))
+        self.refreshStatus()
+
+    def refreshStatus(self):
+        '''Method showing the memory used by the loaded data, the latest stage timings and handler latencies in the status bar'''
+        parts = [instrument.recorder.summary(['startup','cacheLoad','parse','thumbnail','mapLoad','run','search','nameIndex'])]
+        if getattr(self,'places',None) is not None:
+            parts.insert(0,"Data: "+self.places.memoryReport())
+        self.statusbar.configure(text="  |  ".join(p for p in parts if p))
+        #Hover and click latencies keep changing while a plot is open
+        if instrument.recorder.enabled and not getattr(self,'statusPolling',False):
+            self.statusPolling = True
+            self.master.after(1000,self.pollStatus)
+
+    def pollStatus(self):
+        self.statusPolling = False
+        self.refreshStatus()
 
     def colourWindow(self):
         '''
@@ -570,43 +1071,48 @@ class Geoplotter:
         Method to check user's input in all the boundary boxes
         '''
 
-        messageEmpty = "Some values appear to have been left blank."
+        messageEmpty = "%d values appear to have been left blank."
         messageInvalid = '"%s" is not valid number (%s).'
         conclusion = "\nPlease verify all your values before proceeding."
+        problems = []
         
-        #Function to check all entries in a frame
+        #Function to check all entries in a frame, collecting every problem
         def check(frame,func=float):
+            blank = 0
             for element in frame.winfo_children():
                 if type(element)==tk.ttk.Entry:
                     value = element.get()
                     if value=="":
-                        #Inform user that some entries have been left blank
-                        messagebox.showinfo("ERROR",(messageEmpty+conclusion))
-                        return 0
+                        blank += 1
                     else:
                         try:
                             func(value) 
                         except ValueError:
-                            #Inform user that some of their inputs are not numerically valid
-                            messagebox.showinfo("ERROR",
-                                (messageInvalid%(value,func.__name__)+conclusion))
-                            return 0
-            return 1
+                            problems.append(messageInvalid%(value,func.__name__))
+            if blank:
+                problems.insert(0,messageEmpty%blank if blank>1 else "A value appears to have been left blank.")
 
-        #Check frames that have been filled in by user
+        #Check frames that have been filled in by user (control points are checked as they are read)
         if self.methodoption.get()==methods[0]:
-            if check(self.citiesframe)==0: return 0
-        else:
-            if check(self.imagelimitsframe)==0: return 0
-        if check(self.resolutionframe,func=int)==0: return 0
+            check(self.citiesframe)
+        elif self.methodoption.get()==methods[1]:
+            check(self.imagelimitsframe)
+        check(self.resolutionframe,func=int)
+        if problems:
+            #Inform user of all the blank or numerically invalid inputs at once
+            messagebox.showinfo("ERROR","\n".join(problems)+conclusion)
+            return 0
 
     def setcoords(self):
         '''
-        Method that calculates the coordinate boundaries of a map image from either two cities or user input
+        Method that georeferences the map image (self.georef) from two cities, control points or user input,
+        and sets the coordinate boundaries of the plot
         '''
         #Get resolution if PIL not imported
         if importerror:
             self.res = [int(self.resolutionentryX.get()),int(self.resolutionentryY.get())]
+        projection = self.projectionoption.get()
+        res = tuple(self.res)
 
         #Two cities method
         if self.methodoption.get() == methods[0]:
@@ -616,67 +1122,31 @@ class Geoplotter:
             c2img = list(map(float,[self.c2pxlon.get(),self.c2pxlat.get()]))
             c2geo = list(map(float,[self.c2geolon.get(),self.c2geolat.get()]))
 
-            #Calculations for transforming between coordinate systems
-            xdif = abs(c1geo[0]-c2geo[0])
-            ydif = abs(c1geo[1]-c2geo[1])
-            udif = abs(c1img[0]-c2img[0])
-            vdif = abs(c1img[1]-c2img[1])
-    
-            multx = xdif/udif
-            multy = ydif/vdif
-            self.aspect = multx/multy
-            
-            xlen = multx*self.res[0]
-            ylen = multy*self.res[1]
+            self.georef = georef.cachedFit(self.imgpath,georef.fromCities,res,c1img,c1geo,c2img,c2geo,projection)
 
-            cx = c1geo[0]-multx*c1img[0]
-            cy = c1geo[1]-multy*c1img[1]         
-        
-            self.xlims = [cx,cx + xlen]
-            self.ylims = [cy-ylen,cy]
+        #Control points method: least squares fit of all the points given
+        elif self.methodoption.get() == methods[2]:
+            points = georef.parsePoints(self.pointsInput.get('1.0','end'))
+            self.georef = georef.cachedFit(self.imgpath,georef.fit,res,points,projection)
 
         #Boundaries method: get user's input
         else:
-            self.xlims = [float(self.west.get()),float(self.east.get())]
-            self.ylims = [float(self.south.get()),float(self.north.get())]
-         
-    def townCity(self):
-        '''Method to differentiate between different places using the type column of the data'''
-
-        self.types = list(set([self.data[i][self.typeIdx] for i in range(1,len(self.data))])) 
-        self.xs, self.ys = [], []
-        self.pops = []
-
-        #Keep each x,y,pop data separate for each type t
-        for t in self.types:
-            self.xs.append([])
-            self.ys.append([])
-            self.pops.append([])
-            for i in range(1,len(self.data)):
-                if self.data[i][self.typeIdx]==t:
-                    self.xs[len(self.xs)-1].append(float(self.data[i][self.lonIdx]))
-                    self.ys[len(self.ys)-1].append(float(self.data[i][self.latIdx]))
-                    self.pops[len(self.pops)-1].append(float(self.data[i][self.popIdx]))
-
-    def top10Pops(self):
-        '''Method to work out ten most populated places'''
-
-        self.top10 = []
-        allPops = []
-        
-        allPops = list(reversed(list(sorted(self.pop))))
-        if len(allPops)<11:
-            self.top10 = allPops
+            bounds = [float(self.west.get()),float(self.east.get()),float(self.south.get()),float(self.north.get())]
+            self.georef = georef.cachedFit(self.imgpath,georef.fromBounds,res,*bounds,projection)
+
+        self.xlims,self.ylims,self.aspect = self.georef.xlims,self.georef.ylims,self.georef.aspect
+        #Report how well the control points fit the projection
+        rms = self.georef.rms
+        if rms is None:
+            self.residuallabel.configure(text="")
         else:
-            self.top10 = allPops[:10]
- 
-
+            self.residuallabel.configure(text="Fit error: %.2f px RMS, %.2f px max"%(rms,
+                np.abs(self.georef.residuals).max()))
+         
     def run(self):
         '''
         Method that runs the plotting and displays the data on the map based on the user's input on the GUI
         '''
-
-        self.plots = []
         message = 'No %s has been loaded.'
 
         #Check if all data has been loaded correctly
@@ -690,177 +1160,492 @@ class Geoplotter:
         #Check user has correctly filled in the required boundary information
         if self.checkCoords() == 0: return 0
 
-        #Set the boundaries
-        self.setcoords()
+        #Check the settings of the analysis frame
+        options = self.plotOptions()
+        if options is None: return 0
 
-        #Begin the plot setup
-        img = plt.imread(self.imgpath)
-        self.fig = plt.figure()
-        
-        self.ax = self.fig.add_subplot(111)
-        #Define the limits of the plot
-        self.ax.imshow(img,extent=[self.xlims[0],self.xlims[1],self.ylims[0],self.ylims[1]])
-        self.ax.set_aspect(aspect=self.aspect)
-
-        #if type not selected
-        if self.typeVal.get()==0:
-            if self.populationVal.get()==1:
-                sizeList,colourList = self.getSizeList()
-            else:
-                sizeList = 7
-                colourList = 'r'
-
-            p = self.ax.scatter(self.x,self.y,s=sizeList,c= colourList,cmap='jet',marker=markers[0],label='city or town',picker=7,alpha=0.9)
-            self.plots.append(p)
-        
-        #if type selected, check that type exists
-        elif self.typeIdx!=False and type(self.typeIdx)!=bool:
-            self.townCity()
-            for s in range(len(self.xs)):
-                p, = self.ax.plot(self.xs[s],self.ys[s],colours[s]+markers[s],label=self.types[s],picker=7,alpha=0.5)
-                self.plots.append(p)
-
-        #if type selected but not type column
-        else:
-            messagebox.showinfo("ERROR",("Type cannot be displayed as there is no header 'type'."\
-                +"Please untick the type box before proceeding"))
+        #Set the boundaries
+        try:
+            with instrument.stage('georef'):
+                self.setcoords()
+        except ValueError as e:
+            messagebox.showinfo("ERROR",str(e))
             return 0
 
-        #Give the plot its title
-        plt.title(self.titleInput.get())
-        
-        #Check if placename labels are required and display if so
-        if self.placename.get() == 1:
-            for i in range(1,len(self.data)):
-                self.top10Pops()
-                if int(self.data[i][self.popIdx]) in self.top10:
-                    self.ax.annotate(self.data[i][self.citIdx],
-                        (float(self.data[i][self.lonIdx]),float(self.data[i][self.latIdx])))
-
-        #Check if legen is required and display if so
-        if self.legend.get()==1:
-            plt.legend(loc='upper right')
-        
-        #Check if hyperlink is required and enable if so
-        if self.hyperlink.get()==1:
-            self.fig.canvas.mpl_connect("pick_event", self.openURL)
-
-        #Check if plot is able to support interactivity and display if so
-        if self.typeVal.get()==1 and self.populationVal.get()==0:
-            self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
-
-        #Show what all the hard work has led up to:
-        plt.show()
-    
+        #An open plot of the same map and georeference is updated in place: the map is not read again
+        tiled = self.tiled.get()==1
+        mapKey = (self.imgpath,tiled,tuple(self.xlims),tuple(self.ylims),self.aspect,self.georef.projection.name)
+        if self.plotOpen() and mapKey==self.mapKey:
+            self.show(options,None)
+            return
+
+        #The map is read in the background unless a previous Run already decoded it. The open plot only matches
+        #mapKey again once the new map has been drawn (not if reading it is cancelled or fails)
+        self.mapKey = None
+        basemap = None if tiled else self.images.cachedRaster(self.imgpath)
+        if basemap is not None:
+            self.show(options,basemap,mapKey)
+        else:
+            self.progresslabel.configure(text="Reading map...")
+            self.startTask('mapLoad',worker.Task(readMap,self.images,self.imgpath,tiled),
+                lambda task: self.mapRead(task,options,mapKey),progress=self.showTileProgress)
 
-    def getSizeList(self):
-        '''Method to customise size and color w.r.t. data'''
+    def showTileProgress(self,level,row,height):
+        '''Method to report the progress of the tiles of a map being built'''
+        self.progresslabel.configure(text="Building map tiles: level %d, %d%%"%(level,100*row//height))
 
-        #Adapt larger numbers to manageable domain
-        lnPops = list(map(math.log,self.pop))
-        baseMarker = 7
-        minPop = min(lnPops)
-        maxPop = max(lnPops)
+    def mapRead(self,task,options,mapKey):
+        '''Method plotting on the map once it has been read in the background'''
+        try:
+            basemap = task.result()
+        except worker.Cancelled:
+            self.progresslabel.configure(text="Plot cancelled")
+            return
+        except OSError:
+            messagebox.showinfo("ERROR","The map image could not be read.")
+            return
+        self.progresslabel.configure(text="")
+        self.show(options,basemap,mapKey)
+
+    def show(self,options,basemap,mapKey=None):
+        '''
+        Method plotting the places on the map (a decoded image or a tile pyramid; None to keep the map of
+        the open plot) and showing the figure. mapKey identifies the map drawn (kept only if it was drawn).
+        '''
+        with instrument.stage('run'):
+            plotted = self.plot(options,basemap)
+        if basemap is not None:
+            self.mapKey = mapKey if plotted else None
+        self.refreshStatus()
+
+        #Show what all the hard work has led up to (an open plot has already been updated in place)
+        if plotted and self.newFigure:
+            import matplotlib.pyplot as plt
+            plt.show()
+
+    def plotOpen(self):
+        '''Method checking whether the plot of the previous Run is still open'''
+        if self.session is None:
+            return False
+        import matplotlib.pyplot as plt
+        return plt.fignum_exists(self.fig.number)
+
+    def plot(self,options,basemap):
+        '''
+        Method bringing the plot up to date with options (returns 0 if they cannot be applied to the data).
+        The figure of the previous Run is reused while it is open, and only the layers whose settings
+        changed are drawn again; a new map (or georeference) starts the axes afresh.
+        '''
 
-        #Change wieght of colour and size respectively
-        colourList = [int(baseMarker*(i-minPop+1)**1.1) for i in lnPops]
-        sizeList = [int(baseMarker*(i-minPop+1)**3) for i in lnPops]
+        #Begin the plot setup (pyplot is normally imported by now, see warmImports)
+        import matplotlib.pyplot as plt
+        self.newFigure = not self.plotOpen()
+        if self.newFigure:
+            self.fig = plt.figure()
+            self.fig.canvas.mpl_connect("button_press_event", self.openURL)
+            self.fig.canvas.mpl_connect("button_press_event", self.setCentre)
+            self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
+        if basemap is not None:
+            self.clearPlot()
+            self.ax = self.fig.add_subplot(111)
+            #Define the limits of the plot
+            with instrument.stage('map'):
+                if isinstance(basemap,tiles.TilePyramid):
+                    #Tiled map: only the tiles of the visible extent are loaded, at the level matching the zoom
+                    self.basemap = tiles.TiledMap(self.ax,basemap,self.xlims,self.ylims)
+                    self.ax.set_aspect(aspect=self.aspect)
+                else:
+                    render.drawMap(self.ax,basemap,self.xlims,self.ylims,self.aspect)
+                self.georef.formatAxes(self.ax)
+            self.session = render.PlotSession(self.ax)
+            #Look up the pages of the places brought into view by zooming and panning
+            self.ax.callbacks.connect('xlim_changed',self.schedulePrefetch)
+            self.ax.callbacks.connect('ylim_changed',self.schedulePrefetch)
+
+        #Places in the plane of the map projection: everything drawn or picked uses these coordinates
+        with instrument.stage('project'):
+            self.plotted = self.georef.projectTable(self.places)
+
+        #Draw the places (points or heatmap), title, placenames and legend: only what changed since the last Run
+        try:
+            with instrument.stage('places'):
+                changed = self.session.draw(self.plotted,options,self.xlims,self.ylims,self.aspect)
+        except ValueError as e:
+            messagebox.showinfo("ERROR",str(e))
+            if self.newFigure:
+                plt.close(self.fig)
+                self.session = None
+            return 0
+        self.options = options
+        self.layers = self.session.layers
+        self.plots = self.layers.plots
+
+        #Build the spatial index whenever the points change: hover and clicks look up places through it
+        #(or through the clusters on screen)
+        if 'points' in changed and self.plots and self.layers.clusters is None:
+            with instrument.stage('index'):
+                detail = self.layers.detail
+                self.index = detail.index if detail is not None else spatial.GridIndex(self.plotted.lon,self.plotted.lat)
+        self.hoverRow = None
+
+        #Check if plot is able to support interactivity (hovering is ignored otherwise, as are clicks without hyperlinks)
+        if options.interactive and self.plots:
+            if self.overlay is None:
+                self.overlay = overlay.HoverOverlay(self.ax)
+            self.styles = render.styleTable(len(self.places.categories))
+        elif self.overlay is not None:
+            self.overlay.hide()
+        if options.hyperlinks:
+            self.prefetchPages()
+        if self.matches is not None:
+            self.showMatches(draw=False)
+
+        #When profiling, time the (first) draw here rather than inside plt.show
+        if instrument.recorder.enabled:
+            with instrument.stage('draw'):
+                self.fig.canvas.draw()
+        elif not self.newFigure:
+            self.fig.canvas.draw_idle()
+        return 1
 
-        return [sizeList,colourList]
+    def detachPlot(self):
+        '''
+        Method leaving the open plot of the previous data as it is, but no longer updated or used: its rows,
+        projected places and spatial index do not match the loaded data, so the next Run opens a new figure
+        '''
+        if self.overlay is not None:
+            self.overlay.disconnect()
+            self.overlay = None
+        self.session = None
+        self.mapKey = None
+        self.plots = []
+        self.plotted = None
+        self.index = None
+        self.hoverRow = None
+
+    def clearPlot(self):
+        '''Method removing the axes of the open plot, along with its hover overlay'''
+        if self.overlay is not None:
+            self.overlay.disconnect()
+            self.overlay = None
+        self.fig.clf()
+        self.session = None
+        self.plots = []
+        self.matchLayer = None
 
-    def highlight(self,p,event):
+    def plotOptions(self):
+        '''Method returning the settings of the analysis frame as render.PlotOptions (None if invalid)'''
+        try:
+            return render.PlotOptions(title=self.titleInput.get(),plottype=self.typeoption.get(),
+                population=self.populationVal.get()==1,type=self.typeVal.get()==1,
+                placenames=self.placename.get()==1,legend=self.legend.get()==1,
+                hyperlinks=self.hyperlink.get()==1,bins=self.binsInput.get(),smoothing=self.smoothInput.get(),
+                labels=self.labelsInput.get(),detail=self.detail.get()==1,cluster=self.clusterVal.get()==1)
+        except ValueError:
+            messagebox.showinfo("ERROR",("The heatmap grid and number of placenames must be positive integers"\
+                " and the smoothing a positive number."))
+            return None
+
+    def schedulePrefetch(self,ax=None):
+        '''Method looking up the pages of the places in view once zooming/panning has paused'''
+        if not self.wikiScheduled:
+            self.wikiScheduled = True
+            self.master.after(wikiDelay,self.prefetchPages)
+
+    def prefetchPages(self):
+        '''Method queuing the lookup of the pages of the most populated places in view'''
+        self.wikiScheduled = False
+        if self.wiki is None or not self.plotOpen() or not self.options.hyperlinks:
+            return
+        (x0,x1),(y0,y1) = sorted(self.ax.get_xlim()),sorted(self.ax.get_ylim())
+        lon,lat = self.plotted.lon,self.plotted.lat
+        inside = np.flatnonzero((lon>=x0)&(lon<=x1)&(lat>=y0)&(lat<=y1))
+        if self.places.hasPop:
+            inside = inside[labels.topN(self.places.pop[inside],wiki.prefetchLimit)]
+        self.wiki.prefetch(self.places.names[inside[:wiki.prefetchLimit]])
+
+    def placeAt(self,event):
+        '''Method returning the row of the place under the mouse (within spatial.pickRadius pixels), or None'''
+        if not self.plots or event.inaxes!=self.ax or event.xdata is None:
+            return None
+        return self.index.nearest(event.xdata,event.ydata,spatial.pickRadius,spatial.pixelScale(self.ax))
+
+    def clusterAt(self,event):
+        '''Method returning the cluster under the mouse (its index in the level shown), or None'''
+        if event.inaxes!=self.ax or event.xdata is None:
+            return None
+        return self.layers.clusters.clusterAt(event.xdata,event.ydata,spatial.pickRadius)
+
+    def highlightCluster(self,i):
+        '''Method to highlight a cluster and show its number of places and total population'''
+        count,pop,x,y,row = self.layers.clusters.info(i)
+        if count==1:
+            self.highlight(row)
+            return
+        places = self.places
+        textstr = "%d places\nPopulation: %s\nLargest: %s\nClick to zoom in"%(count,
+            pop if places.hasPop else "N/A",places.names[row])
+        self.overlay.show(x,y,textstr,'k','o')
+
+    def highlight(self,row):
         '''Method to highlight marker and change associated text'''
-        cont,ind = p.contains(event)
-
-        if cont:
-            #Coordinates information
-            x,y = p.get_data()
-            xIdx = x[ind["ind"][0]]
-            yIdx = y[ind["ind"][0]]
-
-
-            dIdx = self.x.index(xIdx)+1
-            for e in range(len(self.types)):
-                #Check which type the marker is (city or town?)
-                if self.data[dIdx][self.typeIdx]==self.types[e]:
-                    col = colours[e]
-                    mkr = markers[e]
-            #Text to display with the info about the marker
-            textstr = "%s\nPopulation: %s\nLatitude: %s\nLongitude: %s"%(self.data[dIdx][self.citIdx],
-                self.data[dIdx][self.popIdx],
-                self.data[dIdx][self.latIdx],
-                self.data[dIdx][self.lonIdx])
-            #Check if hyperlinks are desired by user
-            if self.hyperlink.get()==1:
+        places = self.places
+        #Text to display with the info about the marker
+        textstr = "%s\nPopulation: %s\nLatitude: %s\nLongitude: %s"%(places.names[row],
+            places.pop[row] if places.hasPop else "N/A",
+            places.lat[row],
+            places.lon[row])
+        #Check if hyperlinks are desired by user: the start of the place's Wikipedia page is shown once known
+        if self.options.hyperlinks:
+            page = self.wiki.lookup(places.names[row]) if self.wiki is not None else None
+            if page is None:
                 textstr += "\nClick for more info (Wiki)"
-            props = dict(boxstyle='round',facecolor='wheat',alpha=0.7)
-            #Add text to plot
-            self.text = self.ax.text(0.05,0.95,textstr,bbox = props,transform=self.ax.transAxes,fontsize=7,verticalalignment='top')
-            self.text.set_visible(True)
-            #Add temporarily highlighted marker to plot
-            temp, = self.ax.plot(xIdx,yIdx,col+mkr,markersize=20,alpha=1)
-            
-            #Update the log of all the highlighted points 
-            if self.p1==None: self.p1=[]
-            self.p1.append(temp)
-            self.fig.canvas.draw()
-        
-        return cont
+                if self.wiki is not None:
+                    self.wiki.prefetch([places.names[row]])
+                    if self.wiki.isPending(places.names[row]):
+                        self.master.after(wikiPoll,self.refreshTooltip,row)
+            elif page['exists']:
+                textstr += "\n\n%s\n\nClick for more info (Wiki)"%wiki.shortExtract(page)
+            else:
+                textstr += "\nNo Wikipedia page found"
+        #Move the (single) highlighted marker and tooltip of the overlay to this place, styled by its type (if known)
+        colour,marker = 'r',render.markers[0]
+        if places.hasType:
+            styleColours,styleMarkers = self.styles
+            #Check which type the marker is (city or town?)
+            e = places.codes[row]
+            colour,marker = styleColours[e],styleMarkers[e]
+        self.overlay.show(self.plotted.lon[row],self.plotted.lat[row],textstr,colour,marker)
             
             
+    def refreshTooltip(self,row):
+        '''Method showing the Wikipedia summary of the hovered place once it has been looked up'''
+        if row!=self.hoverRow or not self.plotOpen():
+            return
+        if self.wiki.isPending(self.places.names[row]):
+            self.master.after(wikiPoll,self.refreshTooltip,row)
+        elif self.wiki.lookup(self.places.names[row]) is not None:
+            self.highlight(row)
+
+    @instrument.timed('hover')
     def hover(self,event):
         '''
         Method used to detect mouse hovering above marker
         '''
+        if not (self.options.interactive and self.plots):
+            return
+
+        clusters = self.layers.clusters
+        if clusters is not None:
+            i = self.clusterAt(event)
+            row = None
+            if i is not None:
+                #A cluster of a single place is that place (its Wikipedia summary then shows up as for points)
+                count,pop,x,y,row = clusters.info(i)
+                row = row if count==1 else (clusters.level,i)
+        else:
+            row = self.placeAt(event)
+        #Nothing to update while the mouse stays over the same place (or over none)
+        if row==self.hoverRow:
+            return
+        self.hoverRow = row
+
+        if row is not None and clusters is not None:
+            self.highlightCluster(i)
+        elif row is not None:
+            self.highlight(row)
+        else:
+            #Remove the highlight when no longer hovering over marker
+            self.overlay.hide()
 
-        self.text = None
-        #Check if mouse inside plot
-        if event.inaxes == self.ax:
-            if not self.cont:
-                #Check if mouse is hovering over a city
-                p = self.plots[0]
-                self.cont = self.highlight(p,event)
-                
-            if not self.cont:
-                #Check if mouse is hovering over town
-                p=self.plots[1]
-                self.cont = self.highlight(p,event)
-                
-            if self.p1!=None:
-                #Update plot when no longer overing over marker
-                self.cont = False
-                self.text.set_visible(False)
-                for i in self.p1:
-                    i.remove()
-                    self.p1=None
-
+    @instrument.timed('pick')
     def openURL(self,event):
         '''
         Method to open web browser web page when marker is clicked
         '''
-        #Clicked marker information
-        thisMarker =event.artist
-
-        x = thisMarker.get_xdata()
-        y = thisMarker.get_ydata()
-        ind = event.ind
-        #Marker coordinates
-        points = (float(x[ind][0]),float(y[ind][0]))
-        
-        #Index of city in self.data with firstline offset taken into account (i.e. +1)
-        dIdx = self.x.index(points[0])+1
-        city = self.data[dIdx][self.citIdx] 
-
-        #Path to open
-        path = "https://en.wikipedia.org/wiki/"+city
-        #request = requests.get(path)
-        #Check that URL exists
-        #if request.status_code==200:
+        #Right-clicks set the centre of searches (see setCentre)
+        if event.button==3:
+            return
+        #Row of the clicked place in the place table
+        clusters = self.layers.clusters if self.plots else None
+        if clusters is not None:
+            i = self.clusterAt(event)
+            if i is None:
+                return
+            count,pop,x,y,row = clusters.info(i)
+            if count>1:
+                #Clicking a cluster zooms onto its places (the clusters of the finer level are then shown)
+                clusters.zoomTo(i)
+                self.hoverRow = None
+                self.overlay.hide()
+                self.fig.canvas.draw_idle()
+                return
+        elif self.options.hyperlinks:
+            row = self.placeAt(event)
+        else:
+            return
+        if row is None or not self.options.hyperlinks:
+            return
+        city = self.places.names[row]
+        if weberror:
+            messagebox.showinfo("Web warning","The modules needed to open web pages could not be imported.")
+            return
+
+        #Open the page once it is known to exist, looking it up in the background if needed
+        page = self.wiki.lookup(city)
+        if page is not None:
+            self.openPage(city,page)
+        else:
+            worker.watch(self.master,worker.submit(self.wiki.resolve,city),
+                lambda task: self.openPage(city,task.result()))
+
+    def openPage(self,city,page):
+        '''Method opening the Wikipedia page of city in the web browser (page: its looked up entry, None if unknown)'''
+        if page is not None and not page['exists']:
+            messagebox.showinfo("Web warning",("It appears that Wikipedia has no page for %s."%city))
+            return
+        import webbrowser
         try:
-            webbrowser.open("https://en.wikipedia.org/wiki/"+city)
-        except:
+            #A failed lookup (e.g. no connection) still lets the browser try the page
+            webbrowser.open(page['url'] if page is not None else self.wiki.pageURL(city))
+        except webbrowser.Error:
             messagebox.showinfo("Web warning",("It appears that Wikipedia can't open the page for this city."))
-            
+
+    def scheduleFind(self,event=None):
+        '''Method searching the Find place box once typing has paused, rather than on every key'''
+        if event is not None and event.keysym=='Return':
+            return
+        if self.findScheduled is not None:
+            self.master.after_cancel(self.findScheduled)
+        self.findScheduled = self.master.after(findDelay,self.findPlaces)
+
+    def showFirstFound(self,event=None):
+        '''Method showing the best place found for the text of the Find place box (searching it now if needed)'''
+        if self.findScheduled is not None:
+            self.findPlaces()
+        if len(self.found):
+            self.showPlace(self.found[0])
+
+    def findPlaces(self,event=None):
+        '''Method listing the places whose name starts like (or looks like) the text of the Find place box'''
+        if self.findScheduled is not None:
+            self.master.after_cancel(self.findScheduled)
+            self.findScheduled = None
+        if self.nameIndex is None:
+            return
+        text = self.findInput.get()
+        start = time.perf_counter()
+        self.found = self.nameIndex.search(text) if text.strip() else []
+        elapsed = time.perf_counter()-start
+        places = self.places
+        self.findList.delete(0,'end')
+        for r in self.found:
+            details = [places.typeOf(r)] if places.hasType else []
+            if places.hasPop:
+                details.append("pop. %d"%places.pop[r])
+            self.findList.insert('end',"%s (%s)"%(places.names[int(r)],", ".join(details)) if details
+                else places.names[int(r)])
+        self.findlabel.configure(text="%d found (%.1f ms)"%(len(self.found),elapsed*1e3) if text.strip() else "")
+
+    def selectFound(self,event=None):
+        '''Method showing the place selected in the list of places found'''
+        selection = self.findList.curselection()
+        if selection and selection[0]<len(self.found):
+            self.showPlace(self.found[selection[0]])
+
+    def showPlace(self,row):
+        '''Method centring the open plot on a place and highlighting it (without drawing the layers again)'''
+        row = int(row)
+        #The place also becomes the centre of searches
+        self.centreInput.delete(0,'end')
+        self.centreInput.insert(0,string=self.places.names[row])
+        if not self.plotOpen():
+            messagebox.showinfo("Search warning","Run a plot to show the place on the map.")
+            return
+        x,y = self.plotted.lon[row],self.plotted.lat[row]
+        (x0,x1),(y0,y1) = self.ax.get_xlim(),self.ax.get_ylim()
+        self.ax.set_xlim(x-(x1-x0)/2,x+(x1-x0)/2)
+        self.ax.set_ylim(y-(y1-y0)/2,y+(y1-y0)/2)
+        if self.overlay is None:
+            self.overlay = overlay.HoverOverlay(self.ax)
+            self.styles = render.styleTable(len(self.places.categories))
+        self.hoverRow = row
+        self.highlight(row)
+        self.fig.canvas.draw_idle()
+
+    def search(self,kind):
+        '''
+        Method finding the places within the radius of the centre ('radius'), nearest to it ('nearest') or
+        in the view of the open plot ('view'), optionally of one type, and highlighting them on the plot
+        '''
+        q = {'types':None if self.queryType.get()=="All" else [self.queryType.get()]}
+        if kind=='view':
+            if not self.plotOpen():
+                messagebox.showinfo("Search warning","Run a plot to search the places in view.")
+                return
+            (x0,x1),(y0,y1) = sorted(self.ax.get_xlim()),sorted(self.ax.get_ylim())
+            lon,lat = self.georef.unproject(np.array([x0,x1]),np.array([y0,y1]))
+            q['bbox'] = [lon[0],lon[1],lat[0],lat[1]]
+        else:
+            self.lastSearch = kind
+            q['near'] = self.centreInput.get()
+            try:
+                if kind=='radius':
+                    q['radius'] = float(self.radiusInput.get())
+                else:
+                    q['nearest'] = int(self.nearestInput.get())
+                if not q.get('radius',q.get('nearest'))>0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showinfo("ERROR","The radius must be a positive number and the number of nearest"\
+                    " places a positive integer.")
+                return
+        start = time.perf_counter()
+        try:
+            with instrument.stage('search'):
+                rows,km = query.runQuery(self.places,q)
+        except ValueError as e:
+            messagebox.showinfo("ERROR",str(e))
+            return
+        self.matches = (query.describe(q),rows,km)
+        self.matchlabel.configure(text="%d places (%.0f ms)"%(len(rows),(time.perf_counter()-start)*1e3))
+        self.showMatches()
+        self.refreshStatus()
+
+    def showMatches(self,draw=True):
+        '''Method highlighting the matches of the last search on the open plot (removing the previous ones)'''
+        if self.matchLayer is not None:
+            self.matchLayer.remove()
+            self.matchLayer = None
+        if self.plotOpen():
+            if self.matches is not None:
+                rows = self.matches[1]
+                self.matchLayer = render.drawMatches(self.ax,self.plotted.lon[rows],self.plotted.lat[rows])
+            if draw:
+                self.fig.canvas.draw_idle()
+
+    def setCentre(self,event):
+        '''Method making the right-clicked point of the plot the centre of searches, and searching around it'''
+        if event.button!=3 or event.inaxes!=self.ax or event.xdata is None:
+            return
+        lon,lat = self.georef.unproject(event.xdata,event.ydata)
+        self.centreInput.delete(0,'end')
+        self.centreInput.insert(0,string="%.5f, %.5f"%(lat,lon))
+        self.search(self.lastSearch)
+
+    def exportMatches(self):
+        '''Method writing the matches of the last search to a CSV file'''
+        if self.matches is None:
+            messagebox.showinfo("Search warning","There are no matches to export: search first.")
+            return
+        filepath = tk.filedialog.asksaveasfilename(defaultextension='.csv',filetypes=(("CSV files","*.csv"),))
+        if not filepath:
+            return
+        try:
+            query.writeMatches(filepath,self.places,[self.matches])
+        except OSError as e:
+            messagebox.showinfo("ERROR","The matches could not be written (%s)."%e)
+
     def aboutWindow(self):
         '''Launch about window when button pressed by calling an instance of AboutWindow'''
         self.about = tk.Toplevel(self.master)
@@ -934,12 +1719,15 @@ class HelpWindow:
                 "their real cooordinates. For the ukMERC.png map, Plymouth and Edinburgh were used."
                 "If for whatever reason this were not to occur, please select 'Boundaries' from the \n"
                 "dropdown list on the right and input from North to East (clockwise):\n"
-                "58.97832, 1.85502, 49.9717, -8.22923.\n\n"
+                "58.97832, 1.85502, 49.9717, -8.22923.\n"
+                "More accurate results can be obtained with 'Control points': enter as many points as you like (one per line)\n"
+                "and the map is fitted to all of them, the fit error being shown below the projection. Choose the projection\n"
+                "of your map (ukMERC.png is a Mercator map) for places to be positioned correctly away from the reference cities.\n\n"
                 "At this stage, you are ready to RUN the program using the third button at the bottom of the window. Each press\n"
-                "will lead to a new plot being created.\n\n"
+                "updates the open plot, redrawing only what has changed (close it to start a new one).\n\n"
                 "Option to customise the plots can be found on the left hand side and include: \n"
                 "- change map title\n- display difference between towns and cities\n- display population size\n"
-                "- add legend\n- add labels for top 10 most populated placesn\n- add option to click on point to take you to\n"
+                "- add legend\n- add labels for the most populated places (how many is set next to the Placenames box)\n- add option to click on point to take you to\n"
                 "website of the town or city.\n\n"
                 "To get the interactive map (increased marker size when mouse hovers above marker and hyperlinks), make sure to\n"
                 "deselect the population checkmark and select the type checkmark.\n\n"
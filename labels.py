@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Labels: selection of the most populated places and collision-aware placement of their names
+"""
+
+#%% Import modules
+
+import numpy as np
+
+
+#%% Set up variables
+
+defaultLabels = 10      #number of places labelled by default
+charWidth = 0.6         #approximate width of a character, as a fraction of the font size
+offsets = [(3,3),(-3,3),(3,-3),(-3,-3)]   #candidate label positions around a place (points): NE, NW, SE, SW
+
+
+# Function returning the rows of the n largest values of pop, largest first (ties: lowest row first)
+def topN(pop,n=defaultLabels):
+    pop = np.asarray(pop)
+    n = min(max(0,int(n)),len(pop))
+    if n==0:
+        return np.zeros(0,dtype=np.intp)
+    #Partial selection: O(len(pop)) to find the n largest, then only those n are sorted
+    rows = np.argpartition(-pop,n-1)[:n] if n<len(pop) else np.arange(len(pop))
+    #Rows tying with the n-th value may have been left out arbitrarily: use the lowest rows instead
+    cutoff = pop[rows].min()
+    above = np.flatnonzero(pop>cutoff)
+    ties = np.flatnonzero(pop==cutoff)[:n-len(above)]
+    rows = np.concatenate([above,ties])
+    return rows[np.lexsort((rows,-pop[rows]))]
+
+
+#%% Collision check
+
+class BoxHash:
+    '''
+    Class storing placed label boxes (x0,y0,x1,y1) in a spatial hash of square cells, so that testing
+    a new box only compares it with the boxes of the few cells it overlaps.
+    '''
+
+    def __init__(self,cell):
+        self.cell = cell
+        self.cells = {}
+
+    def keys(self,box):
+        x0,y0,x1,y1 = box
+        c = self.cell
+        for i in range(int(x0//c),int(x1//c)+1):
+            for j in range(int(y0//c),int(y1//c)+1):
+                yield (i,j)
+
+    def hits(self,box):
+        x0,y0,x1,y1 = box
+        for k in self.keys(box):
+            for b in self.cells.get(k,()):
+                if x0<b[2] and b[0]<x1 and y0<b[3] and b[1]<y1:
+                    return True
+        return False
+
+    def add(self,box):
+        for k in self.keys(box):
+            self.cells.setdefault(k,[]).append(box)
+
+
+#%% Label layer class
+
+class LabelLayer:
+    '''
+    Class labelling a set of places (rows, in order of priority) on an axes. Labels are placed greedily
+    at the first free position around their place, and skipped where every position would overlap
+    a label already placed. The layout is redone on zoom/pan, so dense areas reveal more labels.
+    '''
+
+    def __init__(self,ax,places,rows,fontsize=None):
+        self.ax = ax
+        self.rows = np.asarray(rows,dtype=np.intp)
+        self.lon = places.lon[self.rows]
+        self.lat = places.lat[self.rows]
+        self.names = [str(n) for n in places.names[self.rows]]
+        self.lengths = np.array([len(n) for n in self.names],dtype=np.float64)
+        self.fontsize = fontsize
+        self.texts = []
+        self.cids = [ax.callbacks.connect('xlim_changed',self.layout),
+            ax.callbacks.connect('ylim_changed',self.layout)]
+        self.layout()
+
+    def layout(self,ax=None):
+        '''Remove the current labels and place the candidates visible in the current view'''
+        for t in self.texts:
+            t.remove()
+        self.texts = []
+        if not len(self.rows):
+            return
+
+        ax = self.ax
+        #Transforms are only final once the aspect ratio has been applied to the axes box
+        ax.apply_aspect()
+        (x0,x1),(y0,y1) = sorted(ax.get_xlim()),sorted(ax.get_ylim())
+        inside = np.flatnonzero((self.lon>=x0)&(self.lon<=x1)&(self.lat>=y0)&(self.lat<=y1))
+        if not len(inside):
+            return
+
+        from matplotlib.font_manager import FontProperties
+        size = FontProperties(size=self.fontsize).get_size_in_points()
+        pts = ax.figure.dpi/72
+        h = size*1.2*pts
+        widths = self.lengths[inside]*size*charWidth*pts
+        px = ax.transData.transform(np.column_stack([self.lon[inside],self.lat[inside]]))
+        frame = ax.bbox
+
+        occupied = BoxHash(cell=4*h)
+        for k in range(len(inside)):
+            x,y = px[k]
+            w = widths[k]
+            for dx,dy in offsets:
+                #Box of the label when anchored on this side of the place
+                bx = x+dx*pts if dx>0 else x+dx*pts-w
+                by = y+dy*pts if dy>0 else y+dy*pts-h
+                box = (bx,by,bx+w,by+h)
+                if box[0]<frame.x0 or box[2]>frame.x1 or box[1]<frame.y0 or box[3]>frame.y1:
+                    continue
+                if not occupied.hits(box):
+                    occupied.add(box)
+                    i = inside[k]
+                    self.texts.append(ax.annotate(self.names[i],(self.lon[i],self.lat[i]),
+                        xytext=(dx,dy),textcoords='offset points',fontsize=size,
+                        ha='left' if dx>0 else 'right',va='bottom' if dy>0 else 'top'))
+                    break
+
+    def disconnect(self):
+        for cid in self.cids:
+            self.ax.callbacks.disconnect(cid)
+        for t in self.texts:
+            t.remove()
+        self.texts = []
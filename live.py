@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Live: places that keep arriving (rows appended to a CSV file, or sent over a local socket or pipe),
+parsed as they come and drawn onto an open plot
+
+A Follower reads and parses only the new bytes of its source in a background thread. The GUI takes
+the parsed places at a capped frame rate, keeps them in a LiveBuffer (optionally bounded to the
+latest places and/or a time window, so that memory and redraws stay bounded) and updates the
+scatter collections of a LiveLayer in place with set_offsets/set_sizes.
+"""
+
+#%% Import modules
+
+import io
+import os
+import re
+import csv
+import stat
+import time
+import queue
+import select
+import socket
+import threading
+import numpy as np
+
+import render
+from placetable import PlaceTable, codeType, findHeader, validateColumns, cityHeaders, lonHeaders, latHeaders, popHeaders, typeHeaders
+
+
+#%% Set up variables
+
+pollInterval = 0.2      #seconds between two checks of a source with no new data
+readSize = 2**20        #bytes read from a source at a time
+defaultFPS = 10         #redraws per second at most
+
+
+#%% Sources: read() returns the new bytes (b'' if there are none yet) or None once the source has ended
+
+class FileSource:
+    '''Source reading what is appended to a file from offset on; a file that shrinks is read again from its start'''
+
+    def __init__(self,path,offset=0):
+        self.path = path
+        self.offset = offset
+        self.file = open(path,'rb')
+
+    def read(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if size<self.offset:
+            #Truncated (or rewritten) file
+            self.offset = 0
+        if size==self.offset:
+            return b''
+        self.file.seek(self.offset)
+        data = self.file.read(min(readSize,size-self.offset))
+        self.offset += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class StreamSource:
+    '''
+    Source reading a connected socket or a named pipe (FIFO). Reads wait at most pollInterval, so
+    that the follower can be stopped. A pipe never ends: writers may come and go.
+    '''
+
+    def __init__(self,sock=None,fd=None):
+        self.sock = sock
+        self.fd = fd
+
+    def read(self):
+        handle = self.sock if self.sock is not None else self.fd
+        if not select.select([handle],[],[],pollInterval)[0]:
+            return b''
+        if self.sock is not None:
+            data = self.sock.recv(readSize)
+            return data if data else None
+        try:
+            return os.read(self.fd,readSize)
+        except BlockingIOError:
+            return b''
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        else:
+            os.close(self.fd)
+
+
+# Function opening a source: "host:port" (or ":port") for a local socket, the path of a named pipe or of a
+# file (followed from offset on)
+def openSource(spec,offset=0):
+    if not os.path.exists(spec) and re.fullmatch(r'[\w.-]*:\d+',spec):
+        host,port = spec.rsplit(':',1)
+        return StreamSource(sock=socket.create_connection((host or 'localhost',int(port)),timeout=5))
+    if stat.S_ISFIFO(os.stat(spec).st_mode):
+        #Opened without waiting for a writer
+        return StreamSource(fd=os.open(spec,os.O_RDONLY|os.O_NONBLOCK))
+    return FileSource(spec,offset)
+
+
+# Function returning the header row of a data file
+def readHeader(path):
+    with open(path,'r',newline='') as f:
+        return next(csv.reader(f),None)
+
+
+#%% Parsing
+
+class RowParser:
+    '''
+    Class parsing the bytes of a source into PlaceTables: only complete lines are parsed, the end of
+    a line still being written is kept for the next bytes. The first line is the header unless one
+    is given. Types keep the codes of categories (new types are numbered as they appear), so that
+    their styles do not change while following. Rows with invalid values are skipped and counted.
+    '''
+
+    def __init__(self,header=None,categories=None):
+        self.indices = None
+        self.header = None
+        self.partial = b''
+        self.categories = [] if categories is None else list(categories)
+        self.codes = {c:i for i,c in enumerate(self.categories)}
+        self.skipped = 0
+        if header is not None:
+            self.setHeader(header)
+
+    def setHeader(self,header):
+        '''Find the columns of a header row (raises ValueError if an essential one is missing)'''
+        indices = [findHeader(header,h) for h in (cityHeaders,lonHeaders,latHeaders,popHeaders,typeHeaders)]
+        for i,name in zip(indices[:3],('city','longitude','latitude')):
+            if i is None:
+                raise ValueError("The live data does not contain a %s header."%name)
+        self.indices = indices
+        self.header = [h.strip().lower() for h in header]
+
+    def feed(self,data):
+        '''Parse the complete rows of data (after what was left over): returns a PlaceTable, or None'''
+        data = self.partial+data
+        #Rows end at the last line break outside quotes: a quoted value may span lines
+        b = np.frombuffer(data,dtype=np.uint8)
+        breaks = np.flatnonzero(b==10)
+        breaks = breaks[np.cumsum(b==34)[breaks]%2==0]
+        end = int(breaks[-1])+1 if len(breaks) else 0
+        self.partial = data[end:]
+        text = data[:end].decode('utf-8',errors='replace')
+        rows = [r for r in csv.reader(io.StringIO(text,newline='')) if r]
+        if rows and self.indices is None:
+            self.setHeader(rows.pop(0))
+        #A source may repeat its header (e.g. a restarted writer)
+        rows = [r for r in rows if [v.strip().lower() for v in r]!=self.header]
+        if not rows:
+            return None
+        names,lon,lat,pop,types,invalid = validateColumns(rows,None,*self.indices)
+        self.skipped += int(invalid.sum())
+        if not names:
+            return None
+        codes = None
+        if types is not None:
+            codes = np.array([self.codes.setdefault(t,len(self.codes)) for t in types],dtype=np.int64)
+            codes = codes.astype(codeType(len(self.codes)))
+            self.categories = list(self.codes)
+        return PlaceTable(names,lon,lat,pop,codes,self.categories)
+
+
+#%% Follower class
+
+class Follower:
+    '''
+    Class reading and parsing a source in a background thread. project(lon,lat), if given, is applied
+    to each parsed table. take() returns the tables parsed since its last call; error holds what
+    stopped the follower (None if it is still running or the source simply ended).
+    '''
+
+    def __init__(self,source,parser,project=None):
+        self.source = source
+        self.parser = parser
+        self.project = project
+        self.tables = queue.Queue()
+        self.stopped = threading.Event()
+        self.ended = False
+        self.error = None
+        self.received = 0
+        self.thread = threading.Thread(target=self.follow,name='geoplotter-live',daemon=True)
+        self.thread.start()
+
+    def follow(self):
+        try:
+            while not self.stopped.is_set():
+                data = self.source.read()
+                if data is None:
+                    break
+                if not data:
+                    self.stopped.wait(pollInterval)
+                    continue
+                table = self.parser.feed(data)
+                if table is not None:
+                    if self.project is not None:
+                        table = table.withCoords(*self.project(table.lon,table.lat))
+                    self.received += len(table)
+                    self.tables.put(table)
+        except (OSError,ValueError) as e:
+            self.error = e
+        finally:
+            self.ended = True
+            self.source.close()
+
+    def take(self):
+        tables = []
+        while True:
+            try:
+                tables.append(self.tables.get_nowait())
+            except queue.Empty:
+                return tables
+
+    def stop(self):
+        self.stopped.set()
+
+
+#%% Live buffer class
+
+class LiveBuffer:
+    '''
+    Class holding the live places as columns (projected coordinates, population, type codes, names
+    and arrival times). With capacity, only the latest capacity places are kept; with window, only
+    those that arrived in the last window seconds. Dropped rows are compacted away once they make up
+    half of the arrays, so memory stays within twice what is kept. The type codes are widened when
+    new types no longer fit their integer type.
+    '''
+
+    def __init__(self,capacity=None,window=None):
+        self.capacity = capacity
+        self.window = window
+        self.start = 0
+        self.n = 0
+        self.columns = None
+        self.names = []
+
+    def __len__(self):
+        return self.n-self.start
+
+    def append(self,table,now=None):
+        now = time.time() if now is None else now
+        new = {'lon':table.lon,'lat':table.lat,'time':np.full(len(table),now)}
+        if table.hasPop:
+            new['pop'] = table.pop
+        if table.hasType:
+            new['codes'] = table.codes
+        if self.columns is None:
+            self.columns = {k:np.empty(max(1024,len(table)),dtype=v.dtype) for k,v in new.items()}
+        for k,v in new.items():
+            if not np.can_cast(v.dtype,self.columns[k].dtype):
+                self.columns[k] = self.columns[k].astype(np.promote_types(v.dtype,self.columns[k].dtype))
+        m = len(table)
+        if self.n+m>len(self.columns['lon']):
+            self.compact()
+        need = self.n+m
+        if need>len(self.columns['lon']):
+            capacity = max(need,2*len(self.columns['lon']))
+            for c in self.columns.values():
+                c.resize(capacity,refcheck=False)
+        for k,c in self.columns.items():
+            c[self.n:need] = new[k]
+        self.names.extend(table.names)
+        self.n = need
+
+    def trim(self,now=None):
+        '''Drop the places beyond capacity or older than window: returns whether any were dropped'''
+        if self.columns is None:
+            return False
+        start = self.start
+        if self.capacity is not None:
+            start = max(start,self.n-self.capacity)
+        if self.window is not None:
+            now = time.time() if now is None else now
+            start += int(np.searchsorted(self.columns['time'][start:self.n],now-self.window,side='left'))
+        dropped = start>self.start
+        self.start = start
+        if self.start>len(self.columns['lon'])//2:
+            self.compact()
+        return dropped
+
+    def compact(self):
+        '''Move the kept places to the front of the arrays'''
+        for c in self.columns.values():
+            c[:len(self)] = c[self.start:self.n]
+        del self.names[:self.start]
+        self.n -= self.start
+        self.start = 0
+
+    def column(self,name):
+        '''Return a view of the kept values of a column (None if the data has no such column)'''
+        if self.columns is None or name not in self.columns:
+            return None
+        return self.columns[name][self.start:self.n]
+
+    def table(self,categories=None):
+        '''Return the kept places as a PlaceTable'''
+        return PlaceTable(self.names[self.start:self.n],self.column('lon'),self.column('lat'),
+            self.column('pop'),self.column('codes'),categories)
+
+
+#%% Live layer class
+
+class LiveLayer:
+    '''
+    Class drawing the places of a LiveBuffer on an axes, styled like the points of drawPlaces: one
+    scatter collection per type when points are split by type, otherwise a single one (sized and
+    coloured by population if required). update() replaces the offsets (and sizes) of the existing
+    collections, so following never adds artists beyond one per type.
+    '''
+
+    def __init__(self,ax,options):
+        self.ax = ax
+        self.options = options
+        self.collections = {}
+
+    def collection(self,key,categories):
+        if key not in self.collections:
+            if key is None:
+                kwargs = dict(marker=render.markers[0],c='r',s=7,label='live places')
+                if self.options.population:
+                    kwargs.update(c=np.zeros(0),cmap='jet')
+            else:
+                styleColours,styleMarkers = render.styleTable(len(categories))
+                kwargs = dict(marker=styleMarkers[key],color=styleColours[key],s=7,label='_live %s'%categories[key])
+            self.collections[key] = self.ax.scatter(np.zeros(0),np.zeros(0),alpha=0.9,**kwargs)
+        return self.collections[key]
+
+    def update(self,buffer,categories):
+        '''Show the places kept in buffer'''
+        lon,lat = buffer.column('lon'),buffer.column('lat')
+        if lon is None:
+            return
+        codes,pop = buffer.column('codes'),buffer.column('pop')
+        if self.options.type and codes is not None:
+            order,bounds = render.groupRows(codes,len(categories))
+            for t in range(len(categories)):
+                rows = order[bounds[t]:bounds[t+1]]
+                if len(rows) or t in self.collections:
+                    self.collection(t,categories).set_offsets(np.column_stack([lon[rows],lat[rows]]))
+            return
+        p = self.collection(None,categories)
+        p.set_offsets(np.column_stack([lon,lat]))
+        if self.options.population and pop is not None and len(pop):
+            sizes,colourList = render.sizeList(pop)
+            p.set_sizes(sizes)
+            p.set_array(colourList)
+
+    def remove(self):
+        for p in self.collections.values():
+            p.remove()
+        self.collections = {}
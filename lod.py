@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Level of detail: viewport-aware culling and thinning of the point layers of a plot
+"""
+
+#%% Import modules
+
+import numpy as np
+
+import spatial
+
+
+#%% Set up variables
+
+cellPixels = 2      #at most one point of each layer is drawn per cell of cellPixels x cellPixels pixels
+
+
+#%% Detail layer class
+
+class DetailLayer:
+    '''
+    Class keeping the point artists of a plot down to what the screen can show. On every change of
+    xlim/ylim, places outside the view are culled (through a spatial index) and the rest are thinned
+    to one point per screen cell and per artist; the artists are then updated in place. Zooming in
+    brings the detail back, so redraw cost follows the number of pixels rather than of places.
+    '''
+
+    def __init__(self,ax,places,artists,keys=None,sizes=None,values=None,cell=cellPixels):
+        '''
+        artists: point artists (scatter collections or marker-only lines); row i of places is drawn
+        by artists[keys[i]] (by artists[0] if keys is None). sizes/values: per-place marker sizes
+        and colour values of a single scatter, subset along with its offsets.
+        '''
+        self.ax = ax
+        self.places = places
+        self.artists = artists
+        self.keys = keys
+        self.sizes = sizes
+        self.values = values
+        self.cell = cell
+        self.index = spatial.GridIndex(places.lon,places.lat)
+        #When places are sized by population, the largest place of a cell is the one kept
+        self.priority = None if sizes is None else np.argsort(np.argsort(-places.pop,kind='stable'))
+        if values is not None:
+            #Colours must not be rescaled to the visible subset
+            artists[0].set_clim(values.min(),values.max())
+        self.shown = 0
+
+        self.cids = [ax.callbacks.connect('xlim_changed',self.update),
+            ax.callbacks.connect('ylim_changed',self.update)]
+        self.update()
+
+    def visibleRows(self):
+        '''Return the rows to draw for the current view: culled to the view, thinned per screen cell'''
+        ax = self.ax
+        ax.apply_aspect()
+        (x0,x1),(y0,y1) = sorted(ax.get_xlim()),sorted(ax.get_ylim())
+        rows = self.index.within(x0,x1,y0,y1)
+        if not len(rows):
+            return rows
+        if self.priority is not None:
+            rows = rows[np.argsort(self.priority[rows])]
+
+        #Screen cell of each visible place, made unique per artist
+        sx,sy = spatial.pixelScale(ax)
+        nx = int(ax.bbox.width/self.cell)+1
+        ny = int(ax.bbox.height/self.cell)+1
+        cx = np.minimum(((self.places.lon[rows]-x0)*sx/self.cell).astype(np.int64),nx-1)
+        cy = np.minimum(((self.places.lat[rows]-y0)*sy/self.cell).astype(np.int64),ny-1)
+        cells = cy*nx+cx
+        if self.keys is not None:
+            cells += self.keys[rows].astype(np.int64)*(nx*ny)
+        #First place of each cell (in priority order when sized by population)
+        first = np.unique(cells,return_index=True)[1]
+        return np.sort(rows[first])
+
+    def update(self,ax=None):
+        '''Replace the points of each artist with those of the visible rows'''
+        rows = self.visibleRows()
+        self.shown = len(rows)
+        if self.keys is None:
+            groups = [rows]
+        else:
+            keys = self.keys[rows]
+            order = np.argsort(keys,kind='stable')
+            bounds = np.searchsorted(keys[order],np.arange(len(self.artists)+1))
+            groups = [rows[order[bounds[k]:bounds[k+1]]] for k in range(len(self.artists))]
+
+        lon,lat = self.places.lon,self.places.lat
+        for artist,g in zip(self.artists,groups):
+            if hasattr(artist,'set_offsets'):
+                artist.set_offsets(np.column_stack([lon[g],lat[g]]))
+                if self.sizes is not None:
+                    artist.set_sizes(self.sizes[g])
+                if self.values is not None:
+                    artist.set_array(self.values[g])
+            else:
+                artist.set_data(lon[g],lat[g])
+
+    def disconnect(self):
+        for cid in self.cids:
+            self.ax.callbacks.disconnect(cid)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Name search: find places by the start of their name, or by a misspelt name
+
+NameIndex sorts the place names (case folded, cut to keyWidth bytes) once, so that the names
+starting with what has been typed are one binary search away; the most populated of them are
+found without sorting them all. Only when no name starts with the text are names that merely
+look alike searched, through an inverted index of the trigrams of the names: the names sharing
+the most of the rarest trigrams of the text are ranked by edit distance, computed for all of
+them at once.
+"""
+
+#%% Import modules
+
+import numpy as np
+
+
+#%% Set up variables
+
+keyWidth = 32           #bytes of each name kept in the index (longer names are matched on their start)
+fuzzyCandidates = 2000  #names sharing the most trigrams with the text that are ranked by edit distance
+postingBudget = 100000  #rows of the trigram postings read at most by a fuzzy search
+defaultLimit = 10       #results returned at most
+
+
+# Function folding the case of ASCII letters in an array of UTF-8 bytes
+def foldBytes(b):
+    return np.where((b>=65)&(b<=90),b|32,b).astype(np.uint8)
+
+
+# Function returning the folded UTF-8 bytes of a text
+def foldText(text):
+    return foldBytes(np.frombuffer(str(text).strip().encode('utf-8'),dtype=np.uint8))
+
+
+# Function returning the trigram codes of rows of padded bytes (three bytes packed in an integer)
+def trigrams(a,b,c):
+    return (a.astype(np.int32)<<16)|(b.astype(np.int32)<<8)|c.astype(np.int32)
+
+
+#%% Name index class
+
+class NameIndex:
+    '''
+    Class answering prefix and fuzzy searches over a NameColumn. search() returns the rows of the
+    names starting with the text (the name itself first, then the most populated places), followed
+    if there are too few by the names within a few typos of the text or of their start.
+    '''
+
+    def __init__(self,names,pop=None,width=keyWidth):
+        self.names = names
+        self.pop = pop
+        offsets = np.asarray(names.offsets)
+        buffer = np.asarray(names.buffer)
+        n = len(names)
+        lengths = np.diff(offsets)
+        self.width = width = int(max(1,min(width,lengths.max() if n else 1)))
+        self.lengths = np.minimum(lengths,width)
+
+        #Folded names, one row of width bytes each (zero padded), filled one byte position at a time
+        self.matrix = np.zeros((n,width),dtype=np.uint8)
+        for j in range(width):
+            rows = np.flatnonzero(self.lengths>j)
+            self.matrix[rows,j] = foldBytes(buffer[offsets[rows]+j])
+        self.keys = self.matrix.view('S%d'%width).ravel()
+        self.order = np.argsort(self.keys,kind='stable')
+        self.sorted = self.keys[self.order]
+        #Position of each row in sorted order, and the rows by decreasing population (alphabetical among equals)
+        self.position = np.empty(n,dtype=np.intp)
+        self.position[self.order] = np.arange(n)
+        self.byPop = None if pop is None else np.lexsort((self.position,-np.asarray(pop,dtype=np.float64)))
+
+        #Trigrams of "  name ", so that the start of a name weighs more than the rest
+        padded = np.zeros((n,width+3),dtype=np.uint8)
+        padded[:,:2] = 32
+        padded[:,2:width+2] = self.matrix
+        padded[np.arange(n),self.lengths+2] = 32
+        entries = []
+        for j in range(width+1):
+            rows = np.flatnonzero(self.lengths>=j)
+            #Trigram and row packed in one integer: sorting the values is much faster than an argsort
+            entries.append((trigrams(padded[rows,j],padded[rows,j+1],padded[rows,j+2]).astype(np.int64)<<32)|rows)
+        entries = np.sort(np.concatenate(entries))
+        self.postings = (entries&0xffffffff).astype(np.int32)
+        codes = (entries>>32).astype(np.int32)
+        starts = np.flatnonzero(np.concatenate([[len(codes)>0],codes[1:]!=codes[:-1]]))
+        self.grams = codes[starts]
+        self.starts = np.append(starts,len(codes))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def bounds(self,key):
+        '''Return the positions lo<=mid<=hi in sorted order of the keys starting with key (those before mid equal it)'''
+        lo = int(np.searchsorted(self.sorted,key,'left'))
+        mid = int(np.searchsorted(self.sorted,key,'right'))
+        #No UTF-8 byte is 0xff: every name starting with key sorts before key+0xff
+        hi = mid if len(key)>=self.width else int(np.searchsorted(self.sorted,key+b'\xff','left'))
+        return lo,mid,hi
+
+    def prefix(self,text):
+        '''Return the rows of the names starting with text, in alphabetical order'''
+        key = foldText(text).tobytes()
+        if not key:
+            return np.zeros(0,dtype=np.intp)
+        #Longer texts are only told apart from the start of the names kept in the index
+        lo,mid,hi = self.bounds(key[:self.width])
+        rows = self.order[lo:hi]
+        if len(key)>=self.width and len(rows):
+            folded = str(text).strip().encode('utf-8').lower()
+            rows = rows[[bytes(self.names[int(r)].encode('utf-8')).lower().startswith(folded) for r in rows]]
+        return rows
+
+    def top(self,lo,hi,limit):
+        '''Return the limit most populated rows among the positions lo to hi of sorted order (the first if no population)'''
+        if self.pop is None or hi-lo<=1:
+            return self.order[lo:min(hi,lo+limit)]
+        if hi-lo>len(self)//16:
+            #Wide ranges (e.g. a single letter): the most populated names overall are scanned until limit of
+            #them are in the range, which takes about limit*len/(hi-lo) rows
+            found = []
+            step = 4*limit*len(self)//(hi-lo)
+            for start in range(0,len(self),step):
+                rows = self.byPop[start:start+step]
+                position = self.position[rows]
+                found.append(rows[(position>=lo)&(position<hi)])
+                if sum(map(len,found))>=limit:
+                    break
+            return np.concatenate(found)[:limit]
+        rows = self.order[lo:hi]
+        score = -self.pop[rows].astype(np.float64)
+        if len(rows)>limit:
+            best = np.argpartition(score,limit)[:limit]
+            rows,score = rows[best],score[best]
+        return rows[np.argsort(score,kind='stable')]
+
+    def fuzzy(self,text,limit,maxEdits=None):
+        '''Return the rows of the names (or starts of names) within maxEdits edits of text, nearest first'''
+        q = foldText(text)[:self.width]
+        k = len(q)
+        if not k or not len(self.grams):
+            return np.zeros(0,dtype=np.intp)
+        maxEdits = max(1,k//4) if maxEdits is None else maxEdits
+
+        #Candidates: an edit changes at most three trigrams of the text. Only the rarest trigrams are read, up to
+        #postingBudget rows of postings, so that common trigrams (e.g. of "Place") do not make typing slow
+        padded = np.concatenate([[32,32],q]).astype(np.uint8)
+        grams = np.unique(trigrams(padded[:-2],padded[1:-1],padded[2:]))
+        found = np.searchsorted(self.grams,grams)
+        found = found[(found<len(self.grams))&(self.grams[np.minimum(found,len(self.grams)-1)]==grams)]
+        if not len(found):
+            return np.zeros(0,dtype=np.intp)
+        sizes = self.starts[found+1]-self.starts[found]
+        found,sizes = found[np.argsort(sizes,kind='stable')],np.sort(sizes)
+        used = max(1,int(np.searchsorted(np.cumsum(sizes),postingBudget,'right')))
+        postings = np.concatenate([self.postings[self.starts[f]:self.starts[f+1]] for f in found[:used]])
+        shared = np.bincount(postings[:postingBudget],minlength=len(self))
+        candidates = np.flatnonzero(shared>=max(1,used+(len(grams)-len(found))-3*maxEdits))
+        if len(candidates)>fuzzyCandidates:
+            candidates = candidates[np.argpartition(-shared[candidates],fuzzyCandidates)[:fuzzyCandidates]]
+
+        #Edit distances between the text and every start of the candidates, one character of the text at a time
+        names = self.matrix[candidates]
+        m,w = names.shape
+        columns = np.arange(w+1)
+        d = np.tile(columns,(m,1))
+        for i in range(k):
+            best = np.minimum(d[:,:-1]+(names!=q[i]),d[:,1:]+1)
+            best = np.concatenate([np.full((m,1),i+1),best],axis=1)
+            #Skipping characters of the name: d[j] = min over t<=j of best[t]+(j-t)
+            d = np.minimum.accumulate(best-columns,axis=1)+columns
+        lengths = self.lengths[candidates]
+        full = d[np.arange(m),lengths]
+        d[columns>lengths[:,None]] = w+k
+        start = d.min(axis=1)
+        keep = np.flatnonzero(start<=maxEdits)
+        pop = np.zeros(m) if self.pop is None else self.pop[candidates].astype(np.float64)
+        order = np.lexsort((-pop[keep],full[keep],start[keep]))
+        return candidates[keep[order]][:limit]
+
+    def search(self,text,limit=defaultLimit):
+        '''
+        Return the rows of the best matches of text: the names starting with it (the name itself first,
+        then by decreasing population) or, if there are none, its misspellings
+        '''
+        key = foldText(text).tobytes()
+        if not key:
+            return np.zeros(0,dtype=np.intp)
+        if len(key)>=self.width:
+            #Texts as long as the keys are checked against the full names
+            rows = self.prefix(text)
+            if self.pop is not None:
+                rows = rows[np.argsort(-self.pop[rows].astype(np.float64),kind='stable')]
+            exact = np.array([len(self.names[int(r)].encode('utf-8'))==len(key) for r in rows],dtype=bool)
+            rows = np.concatenate([rows[exact],rows[~exact]])
+        else:
+            lo,mid,hi = self.bounds(key)
+            rows = np.concatenate([self.top(lo,mid,limit),self.top(mid,hi,limit)])
+        if not len(rows):
+            rows = self.fuzzy(text,limit)
+        return rows[:limit]
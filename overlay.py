@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Hover overlay: a single reusable tooltip and highlight marker drawn with blitting
+"""
+
+#%% Overlay class
+
+class HoverOverlay:
+    '''
+    Class holding the hover tooltip and highlighted marker of a plot. Both artists are created
+    once and marked as animated: the rest of the figure is cached after each full draw, and
+    hovering only restores that cache and redraws the two artists over the axes region.
+    '''
+
+    def __init__(self,ax,fontsize=7):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.background = None
+
+        props = dict(boxstyle='round',facecolor='wheat',alpha=0.7)
+        self.text = ax.text(0.05,0.95,"",bbox=props,transform=ax.transAxes,fontsize=fontsize,
+            verticalalignment='top',animated=True,visible=False)
+        self.marker, = ax.plot([],[],markersize=20,alpha=1,animated=True,visible=False)
+        #Keep the overlay out of the legend and of autoscaling
+        self.marker.set_label('_overlay')
+        self.artists = [self.marker,self.text]
+
+        self.cid = self.canvas.mpl_connect('draw_event',self.onDraw)
+
+    def onDraw(self,event):
+        '''Cache the static figure after every full draw (first show, resize, zoom) and redraw the overlay on it'''
+        if getattr(self.canvas,'supports_blit',False):
+            self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.drawArtists()
+
+    def drawArtists(self):
+        for a in self.artists:
+            if a.get_visible():
+                self.ax.draw_artist(a)
+
+    def show(self,x,y,text,colour='r',marker='o'):
+        '''Highlight the point (x,y) and show text in the tooltip'''
+        self.marker.set_data([x],[y])
+        self.marker.set_color(colour)
+        self.marker.set_marker(marker)
+        self.text.set_text(text)
+        for a in self.artists:
+            a.set_visible(True)
+        self.refresh()
+
+    def hide(self):
+        '''Hide the tooltip and highlighted marker'''
+        if not self.text.get_visible():
+            return
+        for a in self.artists:
+            a.set_visible(False)
+        self.refresh()
+
+    def refresh(self):
+        '''Redraw only the overlay, falling back to a full (idle) draw if blitting is not available'''
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.drawArtists()
+        self.canvas.blit(self.ax.bbox)
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self.cid)
+        for a in self.artists:
+            a.remove()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+Place table: columnar storage of the places loaded into Geoplotter
+
+Each column of the data file is parsed once into a typed numpy array, so that
+plotting and interaction methods never have to convert strings again. Types are
+stored once each, rows only holding their code (one byte for up to 256 types),
+and names share one contiguous UTF-8 buffer.
+"""
+
+#%% Import modules
+
+import csv
+import time
+import numpy as np
+
+
+#%% Set up variables
+
+# All possible headers in the CSV-file
+cityHeaders = ['% place','%place','place','city','cities']
+lonHeaders = ['longitude','lon']
+latHeaders = ['latitude','lat']
+popHeaders = ['population','pop']
+typeHeaders = ['type']
+
+# Number of rows parsed and validated at a time when streaming a file
+chunkSize = 100000
+
+# Numerical columns checked by validateColumns: name, type and range of valid values
+numericColumns = [('longitude',np.float64,-180,180),('latitude',np.float64,-90,90),('population',np.int64,0,np.inf)]
+
+
+# Function for finding the column of a header, returns None if it is missing
+def findHeader(headers,validHeaders):
+    for h in range(len(headers)):
+        if headers[h].strip().lower() in validHeaders:
+            return h
+    return None
+
+
+class TextRows:
+    '''Iterator splitting the non-empty lines of a plain text file on commas, counting lines like csv.reader (line_num)'''
+
+    def __init__(self,file):
+        self.file = file
+        self.line_num = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for line in self.file:
+            self.line_num += 1
+            if line.strip():
+                return line.rstrip().split(',')
+        raise StopIteration
+
+
+# Function returning an iterator over the rows of an open data file
+def rowReader(file,csvFile=True):
+    if csvFile:
+        return csv.reader(file,delimiter=',')
+    #Plain text files are split on commas conventionally
+    return TextRows(file)
+
+
+# Generator yielding lists of at most size non-empty rows, with the line number of each row in the file
+def readChunks(rows,size=chunkSize):
+    chunk,lines = [],[]
+    counted = getattr(rows,'line_num',None) is None
+    n = 1
+    for row in rows:
+        n += 1
+        if row:
+            chunk.append(row)
+            lines.append(n if counted else rows.line_num)
+            if len(chunk)==size:
+                yield chunk,np.array(lines,dtype=np.int64)
+                chunk,lines = [],[]
+    if chunk:
+        yield chunk,np.array(lines,dtype=np.int64)
+
+
+#%% Validation
+
+# Function converting a list of strings in bulk: returns the values (0 where invalid) and the mask of the
+# strings that could not be converted. If the whole list fails, it is converted again in blocks, and only
+# the values of the failing blocks one at a time.
+def parseValues(strings,dtype,block=64):
+    try:
+        return np.array(strings,dtype=dtype),np.zeros(len(strings),dtype=bool)
+    except (ValueError,OverflowError):
+        pass
+    values = np.zeros(len(strings),dtype=dtype)
+    bad = np.zeros(len(strings),dtype=bool)
+    scalar = np.dtype(dtype).type
+    for lo in range(0,len(strings),block):
+        part = strings[lo:lo+block]
+        try:
+            values[lo:lo+len(part)] = np.array(part,dtype=dtype)
+        except (ValueError,OverflowError):
+            for i,s in enumerate(part,lo):
+                try:
+                    values[i] = scalar(s)
+                except (ValueError,OverflowError):
+                    bad[i] = True
+    return values,bad
+
+
+class ValidationErrors:
+    '''
+    Class collecting the invalid values found while loading a file, chunk by chunk: line of the file,
+    column, reason ('missing', 'unparsable' or 'out of range') and value of each. rows counts the
+    rows skipped (a row may have several invalid values).
+    '''
+
+    reasons = ('missing','unparsable','out of range')
+
+    def __init__(self):
+        self.parts = []
+        self.rows = 0
+
+    def __len__(self):
+        return sum(len(p[0]) for p in self.parts)
+
+    def add(self,lines,column,reason,values):
+        if len(lines):
+            self.parts.append((np.asarray(lines),column,reason,np.asarray(values)))
+
+    def counts(self):
+        '''Return the number of invalid values of each reason'''
+        counts = dict.fromkeys(self.reasons,0)
+        for lines,column,reason,values in self.parts:
+            counts[reason] += len(lines)
+        return counts
+
+    def summary(self):
+        return ", ".join("%s %s"%(format(n,','),reason) for reason,n in self.counts().items() if n)
+
+    def first(self):
+        '''Return a description of the first invalid value (in file order)'''
+        lines,column,reason,values = min(self.parts,key=lambda p:p[0][0])
+        return "line %d: %s %s (%r)"%(lines[0],column,reason,str(values[0]))
+
+    def write(self,out):
+        '''Write the invalid values, in file order, to a CSV file (or a file object)'''
+        if isinstance(out,str):
+            with open(out,'w',newline='') as f:
+                return self.write(f)
+        writer = csv.writer(out)
+        writer.writerow(['line','column','reason','value'])
+        rows = [(int(l),column,reason,str(v)) for lines,column,reason,values in self.parts for l,v in zip(lines,values)]
+        #The invalid values of a line stay together, in column order
+        rows.sort(key=lambda r:r[0])
+        writer.writerows(rows)
+
+
+def validateColumns(rows,lines,citIdx,lonIdx,latIdx,popIdx=None,typeIdx=None,errors=None):
+    '''
+    Convert the columns of rows in bulk while checking every value: missing names and coordinates or
+    populations that are missing, unparsable or out of range. Returns the columns of the valid rows
+    (names, lon, lat, pop and types; pop and types are None without their column) and the mask of
+    the invalid rows, whose values are added to errors (if given, with the file lines of the rows).
+    '''
+    def column(idx):
+        try:
+            return [row[idx] for row in rows]
+        except IndexError:
+            #Short rows miss the value
+            return [row[idx] if idx<len(row) else '' for row in rows]
+
+    invalid = np.zeros(len(rows),dtype=bool)
+
+    def report(mask,name,reason,strings):
+        found = np.flatnonzero(mask)
+        invalid[found] = True
+        if errors is not None and len(found):
+            errors.add(lines[found],name,reason,[strings[i] for i in found])
+
+    names = column(citIdx)
+    report(np.array([not n.strip() for n in names],dtype=bool),'city','missing',names)
+    converted = []
+    for idx,(name,dtype,low,high) in zip((lonIdx,latIdx,popIdx),numericColumns):
+        if idx is None:
+            converted.append(None)
+            continue
+        strings = column(idx)
+        values,bad = parseValues(strings,dtype)
+        if bad.any():
+            missing = np.zeros(len(rows),dtype=bool)
+            missing[bad] = [not strings[i].strip() for i in np.flatnonzero(bad)]
+            report(missing,name,'missing',strings)
+            report(bad&~missing,name,'unparsable',strings)
+        #NaN and infinite values are out of range too
+        report(~bad&~((values>=low)&(values<=high)),name,'out of range',strings)
+        converted.append(values)
+    if errors is not None:
+        errors.rows += int(invalid.sum())
+
+    if not invalid.any():
+        types = None if typeIdx is None else column(typeIdx)
+        return (names,*converted,types,invalid)
+    valid = np.flatnonzero(~invalid)
+    lon,lat,pop = (None if c is None else c[valid] for c in converted)
+    types = None if typeIdx is None else [t for t,bad in zip(column(typeIdx),invalid) if not bad]
+    return [n for n,bad in zip(names,invalid) if not bad],lon,lat,pop,types,invalid
+
+
+#%% Name column class
+
+class NameColumn:
+    '''
+    Class storing the place names as one contiguous UTF-8 buffer with offsets: name i is
+    buffer[offsets[i]:offsets[i+1]]. The buffer and offsets may be memory maps, in which case
+    names are only read from disk when used.
+    '''
+
+    def __init__(self,buffer,offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def fromStrings(cls,names):
+        encoded = [str(n).encode('utf-8') for n in names]
+        offsets = np.zeros(len(encoded)+1,dtype=np.int64)
+        np.cumsum(np.fromiter(map(len,encoded),dtype=np.int64,count=len(encoded)),out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded),dtype=np.uint8),offsets)
+
+    @classmethod
+    def concat(cls,columns):
+        '''Join NameColumns end to end into one'''
+        columns = list(columns)
+        lengths = [np.diff(np.asarray(c.offsets)) for c in columns]
+        offsets = np.zeros(sum(map(len,lengths))+1,dtype=np.int64)
+        if len(offsets)>1:
+            np.cumsum(np.concatenate(lengths),out=offsets[1:])
+        buffers = [np.asarray(c.buffer) for c in columns]
+        return cls(np.concatenate(buffers) if buffers else np.zeros(0,dtype=np.uint8),offsets)
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes+self.offsets.nbytes
+
+    def find(self,name):
+        '''Return the indices of the names equal to name, ignoring case (of ASCII letters) and surrounding spaces'''
+        target = np.frombuffer(str(name).strip().lower().encode('utf-8'),dtype=np.uint8)
+        starts = self.offsets[:-1]
+        rows = np.flatnonzero(np.diff(self.offsets)==len(target))
+        #Compare one byte position at a time over the names still matching
+        buffer = np.asarray(self.buffer)
+        for j,byte in enumerate(target):
+            if not len(rows):
+                break
+            b = buffer[starts[rows]+j]
+            rows = rows[np.where((b>=65)&(b<=90),b|32,b)==byte]
+        return rows
+
+    def __getitem__(self,i):
+        '''A single name (str) for an integer index, a NameColumn for a slice, mask or index array'''
+        if isinstance(i,(int,np.integer)):
+            n = len(self)
+            if i<0: i += n
+            if not 0<=i<n:
+                raise IndexError("name index out of range")
+            return bytes(self.buffer[self.offsets[i]:self.offsets[i+1]]).decode('utf-8')
+        rows = np.arange(len(self))[i]
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows+1]-starts
+        offsets = np.zeros(len(rows)+1,dtype=np.int64)
+        np.cumsum(lengths,out=offsets[1:])
+        #Gather all selected bytes at once: byte j of the new buffer comes from starts[k]+(j-offsets[k])
+        gather = np.arange(offsets[-1],dtype=np.int64)+np.repeat(starts-offsets[:-1],lengths)
+        return NameColumn(np.asarray(self.buffer)[gather] if len(gather) else np.zeros(0,dtype=np.uint8),offsets)
+
+
+#%% Place table class
+
+# Function returning the smallest integer type holding the codes of n categories
+def codeType(n):
+    for t in (np.uint8,np.uint16,np.uint32):
+        if n<=np.iinfo(t).max+1:
+            return np.dtype(t)
+    return np.dtype(np.int64)
+
+
+# Function returning a number of bytes as a short text (e.g. 7.6 MB)
+def formatBytes(n):
+    for unit in ('bytes','kB','MB'):
+        if n<1024:
+            return ("%d %s" if unit=='bytes' else "%.1f %s")%(n,unit)
+        n /= 1024
+    return "%.1f GB"%n
+
+
+class PlaceTable:
+    '''
+    Class holding the places as columns: float64 longitude/latitude, int64 population,
+    categorical type (codes of the smallest integer type into self.categories) and place names.
+    '''
+
+    def __init__(self,names,lon,lat,pop=None,codes=None,categories=None):
+        self.names = names if isinstance(names,NameColumn) else NameColumn.fromStrings(names)
+        self.lon = np.asarray(lon,dtype=np.float64)
+        self.lat = np.asarray(lat,dtype=np.float64)
+        self.pop = None if pop is None else np.asarray(pop,dtype=np.int64)
+        self.categories = [] if categories is None else list(categories)
+        #Without categories the codes are kept as they are (their number is unknown)
+        self.codes = None if codes is None else np.asarray(codes,
+            dtype=codeType(len(self.categories)) if categories is not None else None)
+
+    def __len__(self):
+        return len(self.lon)
+
+    @property
+    def hasPop(self):
+        return self.pop is not None
+
+    @property
+    def hasType(self):
+        return self.codes is not None
+
+    def typeOf(self,i):
+        '''Return the type (category name) of row i'''
+        return self.categories[self.codes[i]]
+
+    def memoryUsage(self):
+        '''Return the bytes used by each column, as a list of (column, bytes)'''
+        usage = [('longitude',self.lon.nbytes),('latitude',self.lat.nbytes)]
+        if self.hasPop:
+            usage.append(('population',self.pop.nbytes))
+        if self.hasType:
+            #The category dictionary holds each type name once, whatever the number of rows
+            usage.append(('type',self.codes.nbytes+sum(len(c.encode('utf-8')) for c in self.categories)))
+        usage.append(('names',self.names.nbytes))
+        return usage
+
+    def memoryReport(self):
+        '''Return the memory used by each column and in total as one line of text'''
+        usage = self.memoryUsage()
+        return "%s; total %s"%(", ".join("%s %s"%(name,formatBytes(n)) for name,n in usage),
+            formatBytes(sum(n for name,n in usage)))
+
+    def select(self,mask):
+        '''Return a new PlaceTable containing only the rows selected by mask (boolean or indices)'''
+        table = PlaceTable.__new__(PlaceTable)
+        table.names = self.names[mask]
+        table.lon = self.lon[mask]
+        table.lat = self.lat[mask]
+        table.pop = None if self.pop is None else self.pop[mask]
+        table.categories = list(self.categories)
+        table.codes = None if self.codes is None else self.codes[mask]
+        return table
+
+    def withCoords(self,lon,lat):
+        '''Return a PlaceTable sharing the other columns of this one, with new coordinates (e.g. projected)'''
+        table = PlaceTable.__new__(PlaceTable)
+        table.__dict__.update(self.__dict__)
+        table.lon = np.asarray(lon,dtype=np.float64)
+        table.lat = np.asarray(lat,dtype=np.float64)
+        return table
+
+
+#%% Streaming ingestion
+
+class PlaceBuilder:
+    '''
+    Class used to stream chunks of rows into compact column arrays: each chunk is validated
+    and appended in place, so that memory stays close to the size of the final table. Names are
+    kept as the UTF-8 buffers of the chunks, and types as one-byte codes (widened if there are
+    more than 256 types).
+    '''
+
+    def __init__(self,citIdx,lonIdx,latIdx,popIdx=None,typeIdx=None,capacity=1024,errors=None):
+        self.indices = (citIdx,lonIdx,latIdx,popIdx,typeIdx)
+        #With a ValidationErrors, invalid rows are skipped and collected; without, they stop the load
+        self.errors = errors
+        self.n = 0
+        self.names = []         #NameColumn of each chunk, joined in finish()
+        self.lon = np.empty(capacity,dtype=np.float64)
+        self.lat = np.empty(capacity,dtype=np.float64)
+        self.pop = None if popIdx is None else np.empty(capacity,dtype=np.int64)
+        self.codes = None if typeIdx is None else np.empty(capacity,dtype=np.uint8)
+        #Categories are numbered in the order they are first seen, then sorted in finish()
+        self.categoryCodes = {}
+
+    def columns(self):
+        return [c for c in (self.lon,self.lat,self.pop,self.codes) if c is not None]
+
+    def reserve(self,extra):
+        '''Grow the column arrays in place (amortised doubling) to fit extra rows'''
+        need = self.n+extra
+        if need>len(self.lon):
+            capacity = max(need,2*len(self.lon))
+            for c in self.columns():
+                c.resize(capacity,refcheck=False)
+
+    def append(self,rows,lines=None):
+        '''
+        Validate a chunk of rows (lines: their line numbers in the file) and append its valid rows to
+        the columns. Without self.errors, raises ValueError (leaving the builder unchanged) if the
+        chunk contains invalid values.
+        '''
+        if lines is None:
+            lines = np.arange(self.n+2,self.n+2+len(rows))
+        errors = self.errors if self.errors is not None else ValidationErrors()
+        names,lon,lat,pop,types,invalid = validateColumns(rows,lines,*self.indices,errors=errors)
+        if self.errors is None and invalid.any():
+            raise ValueError("Invalid value at %s"%errors.first())
+        if types is not None:
+            local,inverse = np.unique(np.asarray(types,dtype=str),return_inverse=True)
+            lookup = np.array([self.categoryCodes.setdefault(str(t),len(self.categoryCodes))
+                for t in local],dtype=np.int64)
+            codes = lookup[inverse]
+            if codeType(len(self.categoryCodes)).itemsize>self.codes.itemsize:
+                self.codes = self.codes.astype(codeType(len(self.categoryCodes)))
+
+        m = len(names)
+        self.reserve(m)
+        self.lon[self.n:self.n+m] = lon
+        self.lat[self.n:self.n+m] = lat
+        if pop is not None:
+            self.pop[self.n:self.n+m] = pop
+        if types is not None:
+            self.codes[self.n:self.n+m] = codes
+        self.names.append(NameColumn.fromStrings(names))
+        self.n += m
+
+    def finish(self):
+        '''Trim the columns to their final length and return the PlaceTable'''
+        for c in self.columns():
+            c.resize(self.n,refcheck=False)
+        codes,categories = self.codes,None
+        if codes is not None:
+            #Renumber categories in sorted order so that colours do not depend on row order
+            categories = sorted(self.categoryCodes)
+            remap = np.empty(len(categories),dtype=codes.dtype)
+            for c in range(len(categories)):
+                remap[self.categoryCodes[categories[c]]] = c
+            np.take(remap,codes,out=codes)
+        return PlaceTable(NameColumn.concat(self.names),self.lon,self.lat,self.pop,codes,categories)
+
+
+# Function streaming the rows of a data file into a builder, reporting progress as it goes
+def streamRows(rows,builder,progress=None,size=chunkSize):
+    start = time.perf_counter()
+    for chunk,lines in readChunks(rows,size):
+        builder.append(chunk,lines)
+        if progress is not None:
+            progress(builder.n,time.perf_counter()-start)
+    return builder.finish()
+
+
+# Function loading a data file into a PlaceTable without any GUI. Raises ValueError on invalid files, or on the
+# first invalid value unless errors (a ValidationErrors) is given to collect them while loading the valid rows.
+def loadPlaces(path,progress=None,size=chunkSize,errors=None):
+    with open(path,'r',newline='') as file:
+        rows = rowReader(file,csvFile=path.lower().endswith('.csv'))
+        headers = next(rows,None)
+        if headers is None:
+            raise ValueError("%s is empty"%path)
+        indices = [findHeader(headers,h) for h in (cityHeaders,lonHeaders,latHeaders,popHeaders,typeHeaders)]
+        for i,name in zip(indices[:3],('city','longitude','latitude')):
+            if i is None:
+                raise ValueError("%s does not contain a %s header"%(path,name))
+        return streamRows(rows,PlaceBuilder(*indices,errors=errors),progress,size)
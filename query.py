@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Query: the places within a distance of a point, in a box of longitudes/latitudes or nearest to a point
+
+Distances are great circle (haversine) distances in km. The grid index of spatial.GridIndex is built
+once over the longitudes/latitudes of a table: a query only visits the cells of the box bounding its
+circle, so it takes milliseconds even on millions of places.
+
+Usage (batch):
+    python query.py data.csv [--near PLACE | --point=LAT,LON]... [--radius KM | --nearest K]
+                             [--bbox=WEST,EAST,SOUTH,NORTH]... [--type TYPE]... [--queries queries.json]
+                             [--output matches.csv]
+(write --point=... and --bbox=... so that negative coordinates are not taken for options)
+
+queries.json holds a list of queries, each of the form:
+    {"near": "Leeds"} or {"point": [lat,lon]}, with {"radius": 30} or {"nearest": 5}
+    or {"bbox": [west,east,south,north]}, optionally with {"types": ["Town"]}
+"""
+
+#%% Import modules
+
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+import numpy as np
+
+import spatial
+from placetable import loadPlaces
+
+
+#%% Set up variables
+
+earthRadius = 6371.0088     #mean radius of the Earth (km)
+kmPerDegree = earthRadius*math.pi/180
+
+
+# Function returning the haversine distances (km) between points given in degrees (arrays broadcast)
+def haversine(lon1,lat1,lon2,lat2):
+    lon1,lat1,lon2,lat2 = (np.radians(np.asarray(a,dtype=np.float64)) for a in (lon1,lat1,lon2,lat2))
+    a = np.sin((lat2-lat1)/2)**2+np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 2*earthRadius*np.arcsin(np.sqrt(np.clip(a,0,1)))
+
+
+# Function returning the box (west,east,south,north) in degrees bounding the circle of radius km around a
+# point: west may be below -180 and east above 180 when the circle crosses the antimeridian
+def circleBounds(lon,lat,km):
+    d = km/earthRadius
+    south,north = lat-math.degrees(d),lat+math.degrees(d)
+    if d>=math.pi or south<=-90 or north>=90 or math.sin(d)>=math.cos(math.radians(lat)):
+        #The circle contains a pole: all longitudes
+        return -180.,180.,max(south,-90.),min(north,90.)
+    dlon = math.degrees(math.asin(math.sin(d)/math.cos(math.radians(lat))))
+    return lon-dlon,lon+dlon,south,north
+
+
+#%% Geographic index class
+
+class GeoIndex:
+    '''
+    Class answering radius, box and nearest-neighbour queries over places given by longitude and
+    latitude (degrees). Queries return row ids; keep (a boolean mask over the rows, e.g. one type)
+    restricts them to some places.
+    '''
+
+    def __init__(self,lon,lat):
+        self.grid = spatial.GridIndex(lon,lat)
+        self.lon,self.lat = self.grid.x,self.grid.y
+
+    def __len__(self):
+        return len(self.grid)
+
+    def box(self,west,east,south,north,keep=None):
+        '''Return the rows inside the box (west may be greater than east across the antimeridian)'''
+        if west>east:
+            return np.concatenate([self.box(west,180.,south,north,keep),self.box(-180.,east,south,north,keep)])
+        if west<-180:
+            return np.concatenate([self.box(west+360,180.,south,north,keep),self.box(-180.,east,south,north,keep)])
+        if east>180:
+            return np.concatenate([self.box(west,180.,south,north,keep),self.box(-180.,east-360,south,north,keep)])
+        rows = self.grid.within(west,east,south,north)
+        return rows if keep is None else rows[keep[rows]]
+
+    def radius(self,lon,lat,km,keep=None):
+        '''Return the rows within km of (lon,lat) and their distances, nearest first'''
+        rows = self.box(*circleBounds(lon,lat,km),keep=keep)
+        d = haversine(lon,lat,self.lon[rows],self.lat[rows])
+        inside = d<=km
+        rows,d = rows[inside],d[inside]
+        order = np.argsort(d,kind='stable')
+        return rows[order],d[order]
+
+    def nearest(self,lon,lat,k,keep=None):
+        '''Return the k rows nearest to (lon,lat) and their distances, nearest first'''
+        available = len(self) if keep is None else int(np.count_nonzero(keep))
+        k = min(k,available)
+        if k<=0:
+            return np.zeros(0,dtype=np.intp),np.zeros(0)
+        #Start from the circle holding about k places where they are spread evenly (cells hold a few places
+        #each), then double it until it holds k of them: those are the nearest
+        km = kmPerDegree*max(self.grid.cw,self.grid.ch)*max(1.,math.sqrt(k/4))
+        while True:
+            rows,d = self.radius(lon,lat,km,keep)
+            if len(rows)>=k or km>=math.pi*earthRadius:
+                return rows[:k],d[:k]
+            km *= 2
+
+
+#%% Index of the last place table, so that successive queries on the same data do not build it again
+
+lastIndex = (None,None)
+
+
+def indexFor(places):
+    global lastIndex
+    if lastIndex[0] is not places:
+        lastIndex = (places,GeoIndex(places.lon,places.lat))
+    return lastIndex[1]
+
+
+# Function returning the mask of the places of the given types (None for all places)
+def typeMask(places,types):
+    if not types:
+        return None
+    if not places.hasType:
+        raise ValueError("The data has no type column.")
+    unknown = [t for t in types if t not in places.categories]
+    if unknown:
+        raise ValueError("Unknown type(s): %s"%", ".join(unknown))
+    #One lookup per row in a table of the categories, rather than a comparison per type
+    wanted = np.zeros(len(places.categories),dtype=bool)
+    wanted[[places.categories.index(t) for t in types]] = True
+    return wanted[places.codes]
+
+
+# Function returning the (lon,lat) of a centre given as "lat, lon" or as the name of a place (the most
+# populated place of that name, ignoring case); raises ValueError if it is neither
+def parseCentre(places,text):
+    parts = str(text).replace(';',',').split(',')
+    if len(parts)==2:
+        try:
+            lat,lon = float(parts[0]),float(parts[1])
+        except ValueError:
+            pass
+        else:
+            if not (-90<=lat<=90 and -180<=lon<=180):
+                raise ValueError("Latitude must be within [-90,90] and longitude within [-180,180].")
+            return lon,lat
+    rows = places.names.find(text)
+    if not len(rows):
+        raise ValueError("No place called %s."%str(text).strip())
+    if places.hasPop:
+        rows = rows[np.argsort(-places.pop[rows],kind='stable')]
+    return float(places.lon[rows[0]]),float(places.lat[rows[0]])
+
+
+def runQuery(places,query):
+    '''
+    Run one query (a dict as in queries.json) on places: returns the matching rows and their
+    distances (km) from the centre, nearest first (None for boxes). Raises ValueError if invalid.
+    '''
+    index = indexFor(places)
+    keep = typeMask(places,query.get('types'))
+    if 'bbox' in query:
+        west,east,south,north = (float(v) for v in query['bbox'])
+        return index.box(west,east,south,north,keep),None
+    if 'near' in query:
+        lon,lat = parseCentre(places,query['near'])
+    elif 'point' in query:
+        lat,lon = (float(v) for v in query['point'])
+    else:
+        raise ValueError("A query needs a 'near', 'point' or 'bbox'.")
+    if 'radius' in query:
+        return index.radius(lon,lat,float(query['radius']),keep)
+    if 'nearest' in query:
+        return index.nearest(lon,lat,int(query['nearest']),keep)
+    raise ValueError("A query around a point needs a 'radius' or 'nearest'.")
+
+
+# Function returning a short description of a query, used to label its matches
+def describe(query):
+    if 'bbox' in query:
+        what = "in %s"%",".join("%g"%float(v) for v in query['bbox'])
+    else:
+        centre = query['near'] if 'near' in query else ",".join("%g"%float(v) for v in query['point'])
+        what = ("within %g km of %s"%(float(query['radius']),centre) if 'radius' in query
+            else "%d nearest to %s"%(int(query.get('nearest',0)),centre))
+    return what if not query.get('types') else "%s %s"%("/".join(query['types']),what)
+
+
+# Function writing the matches of queries ([(label,rows,km)]) to a CSV file, or to a file object
+def writeMatches(out,places,results):
+    if isinstance(out,str):
+        with open(out,'w',newline='') as f:
+            return writeMatches(f,places,results)
+    writer = csv.writer(out)
+    writer.writerow(['query','place','type','population','latitude','longitude','distance_km'])
+    for label,rows,km in results:
+        for j,r in enumerate(rows):
+            writer.writerow([label,places.names[int(r)],places.typeOf(r) if places.hasType else "",
+                places.pop[r] if places.hasPop else "","%.5f"%places.lat[r],"%.5f"%places.lon[r],
+                "" if km is None else "%.3f"%km[j]])
+
+
+#%% Command line
+
+# Function building the queries given on the command line
+def argumentQueries(args):
+    queries = []
+    types = args.type or None
+    centres = [{'near':n} for n in args.near or []]+[{'point':p.split(',')} for p in args.point or []]
+    if centres and args.radius is None and args.nearest is None:
+        raise ValueError("--near and --point need --radius or --nearest.")
+    for centre in centres:
+        if args.radius is not None:
+            queries.append(dict(centre,radius=args.radius,types=types))
+        if args.nearest is not None:
+            queries.append(dict(centre,nearest=args.nearest,types=types))
+    queries += [{'bbox':b.split(','),'types':types} for b in args.bbox or []]
+    if args.queries:
+        with open(args.queries) as f:
+            queries += json.load(f)
+    return queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the places within a distance of a point, in a box or nearest to a point.")
+    parser.add_argument('data',help="data file (CSV) of the places")
+    parser.add_argument('--near',action='append',help="centre: name of a place (repeatable)")
+    parser.add_argument('--point',action='append',help="centre: LAT,LON (repeatable)")
+    parser.add_argument('--radius',type=float,default=None,help="places within this distance (km) of each centre")
+    parser.add_argument('--nearest',type=int,default=None,help="this number of places nearest to each centre")
+    parser.add_argument('--bbox',action='append',help="places in the box WEST,EAST,SOUTH,NORTH (repeatable)")
+    parser.add_argument('--type',action='append',help="only places of this type (repeatable)")
+    parser.add_argument('--queries',default=None,help="JSON file listing more queries")
+    parser.add_argument('--output',default=None,help="write the matches to this CSV file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    try:
+        queries = argumentQueries(args)
+        places = loadPlaces(args.data)
+        start = time.perf_counter()
+        indexFor(places)
+        built = time.perf_counter()-start
+        start = time.perf_counter()
+        results = [(describe(q),)+tuple(runQuery(places,q)) for q in queries]
+        elapsed = time.perf_counter()-start
+    except (OSError,ValueError,KeyError,TypeError) as e:
+        print("Query failed (%s: %s)"%(type(e).__name__,e),file=sys.stderr)
+        return 1
+
+    writeMatches(args.output or sys.stdout,places,results)
+    print("%d queries on %d places: index %.3fs, queries %.1fms, %d matches"%(len(queries),len(places),built,
+        elapsed*1e3,sum(len(r[1]) for r in results)),file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
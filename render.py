@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Render: drawing of the places onto a map, shared by the Geoplotter GUI and the batch renderer
+"""
+
+#%% Import modules
+
+import numpy as np
+
+import cluster
+import heatmap
+import instrument
+import labels
+import lod
+
+
+#%% Set up variables
+
+plottypes = ["Placenames","Heatmap"]
+markers = ['s','o','^','v','*']
+colours = ['r','c','y','b','m']
+maxLegend = 20      #types listed in the legend at most
+
+
+#%% Plot options class
+
+class PlotOptions:
+    '''
+    Class holding the settings of the analysis frame: title, plot type, criteria (population
+    and type), placenames (and how many), legend, hyperlinks, the heatmap grid and whether
+    points are drawn with viewport level of detail or as clusters.
+    '''
+
+    def __init__(self,title="",plottype=plottypes[0],population=False,type=True,placenames=True,
+            legend=True,hyperlinks=True,bins=heatmap.defaultBins,smoothing=heatmap.defaultSmoothing,
+            labels=labels.defaultLabels,detail=False,cluster=False):
+        self.title = title
+        self.plottype = plottype
+        self.population = bool(population)
+        self.type = bool(type)
+        self.placenames = bool(placenames)
+        self.legend = bool(legend)
+        self.hyperlinks = bool(hyperlinks)
+        self.bins = int(bins)
+        self.smoothing = float(smoothing)
+        self.labels = int(labels)
+        self.detail = bool(detail)
+        self.cluster = bool(cluster)
+
+        if self.plottype not in plottypes:
+            raise ValueError("Unknown plot type '%s' (expected one of %s)."%(plottype,", ".join(plottypes)))
+        if self.bins<1 or self.smoothing<0:
+            raise ValueError("The heatmap grid must be a positive integer and the smoothing a positive number.")
+        if self.labels<0:
+            raise ValueError("The number of placenames must be a positive integer.")
+
+    @property
+    def interactive(self):
+        '''Hover highlighting is available for clusters, and for points split by type without population sizes'''
+        return self.plottype==plottypes[0] and (self.cluster or (self.type and not self.population))
+
+    @classmethod
+    def fromDict(cls,d):
+        return cls(**{k:v for k,v in d.items() if k in cls.__init__.__code__.co_varnames})
+
+
+#%% Layers class
+
+class Layers:
+    '''
+    Class holding what drawPlaces added to an axes: the point artists (plots), the heatmap image
+    (heat), the placename LabelLayer (names), the level-of-detail DetailLayer (detail), the
+    ClusterLayer (clusters) and the legend or colorbar (legend). Keeping it alive keeps the zoom
+    callbacks of the label, detail and cluster layers connected.
+    '''
+
+    def __init__(self,plots=None,heat=None,names=None,detail=None,legend=None,clusters=None):
+        self.plots = [] if plots is None else plots
+        self.heat = heat
+        self.names = names
+        self.detail = detail
+        self.legend = legend
+        self.clusters = clusters
+
+    def removePoints(self):
+        for layer in (self.detail,self.clusters):
+            if layer is not None:
+                layer.disconnect()
+        for p in self.plots:
+            p.remove()
+        if self.heat is not None:
+            self.heat.remove()
+        self.plots,self.heat,self.detail,self.clusters = [],None,None,None
+
+    def removeLabels(self):
+        if self.names is not None:
+            self.names.disconnect()
+        self.names = None
+
+    def removeLegend(self):
+        if self.legend is not None:
+            self.legend.remove()
+        self.legend = None
+
+
+#%% Drawing functions
+
+# Function to customise size and color w.r.t. population
+def sizeList(pop):
+    #Adapt larger numbers to manageable domain (populations of 0 are valid: they get the smallest marker, as 1)
+    lnPops = np.log(np.maximum(pop,1))
+    baseMarker = 7
+    minPop = lnPops.min()
+
+    #Change wieght of colour and size respectively
+    colourList = (baseMarker*(lnPops-minPop+1)**1.1).astype(int)
+    sizes = (baseMarker*(lnPops-minPop+1)**3).astype(int)
+    return sizes,colourList
+
+
+# Function grouping rows by an integer key in one pass (stable counting sort)
+# Returns the row order and the bounds of each key k: rows order[bounds[k]:bounds[k+1]]
+def groupRows(keys,n):
+    order = np.argsort(keys,kind='stable')
+    bounds = np.zeros(n+1,dtype=np.intp)
+    np.cumsum(np.bincount(keys,minlength=n),out=bounds[1:])
+    return order,bounds
+
+
+# Function to split lon/lat of the places by type: returns type names, xs and ys
+def groupByType(places):
+    types = list(places.categories)
+    order,bounds = groupRows(places.codes,len(types))
+    lon,lat = places.lon[order],places.lat[order]
+    xs, ys = [], []
+    for t in range(len(types)):
+        rows = slice(bounds[t],bounds[t+1])
+        xs.append(lon[rows])
+        ys.append(lat[rows])
+    return types,xs,ys
+
+
+# Function generating the style (RGBA colour, marker) of n types
+# The first types keep the original colours and markers; further colours are spread around the hue circle
+def styleTable(n):
+    from matplotlib.colors import to_rgba, hsv_to_rgb
+    styleColours = np.zeros((n,4))
+    styleMarkers = []
+    for t in range(n):
+        if t<len(colours):
+            styleColours[t] = to_rgba(colours[t])
+        else:
+            hue = (t*0.618034)%1
+            styleColours[t,:3] = hsv_to_rgb([hue,0.85,0.9])
+            styleColours[t,3] = 1
+        styleMarkers.append(markers[t%len(markers)])
+    return styleColours,styleMarkers
+
+
+def drawMap(ax,img,xlims,ylims,aspect):
+    '''Draw the map image over its geographical extent'''
+    ax.imshow(img,extent=[xlims[0],xlims[1],ylims[0],ylims[1]])
+    ax.set_aspect(aspect=aspect)
+
+
+def drawPlaces(ax,places,options,xlims,ylims,aspect):
+    '''
+    Draw the places on ax following options and return the Layers drawn. Raises ValueError if the
+    options cannot be applied to this data (e.g. type requested without a type column).
+    '''
+    layers = Layers()
+    layers.plots,layers.heat,layers.detail,layers.clusters = drawPoints(ax,places,options,xlims,ylims,aspect)
+
+    #Give the plot its title
+    ax.set_title(options.title)
+
+    layers.names = drawLabels(ax,places,options)
+    layers.legend = drawLegend(ax,places,options,layers.plots,layers.heat)
+    return layers
+
+
+def drawPoints(ax,places,options,xlims,ylims,aspect):
+    '''Draw the points (or heatmap) of the places: returns the point artists, heatmap image, DetailLayer and ClusterLayer'''
+    plots = []
+    heat = None
+    detail = None
+    clusters = None
+    sizes,colourList = None,None
+
+    #Heatmap: bin all places into a density grid drawn as a single image layer
+    if options.plottype==plottypes[1]:
+        with instrument.stage('heatmap'):
+            weighted = options.population and places.hasPop
+            shape = heatmap.gridShape(xlims,ylims,options.bins,aspect)
+            grid = heatmap.densityGrid(places.lon,places.lat,xlims,ylims,shape,
+                weights=places.pop if weighted else None,sigma=options.smoothing)
+            heat = heatmap.drawHeatmap(ax,grid,xlims,ylims)
+            heat.set_label("Population per cell" if weighted else "Places per cell")
+
+    #Clusters: one sized marker per cluster of the level matching the zoom (the hierarchy is built once per table)
+    elif options.cluster:
+        with instrument.stage('clusters'):
+            clusters = cluster.ClusterLayer(ax,places)
+            plots.append(clusters.artist)
+
+    #if type not selected
+    elif not options.type:
+        with instrument.stage('points'):
+            if options.population and places.hasPop:
+                sizes,colourList = sizeList(places.pop)
+                p = ax.scatter(places.lon,places.lat,s=sizes,c=colourList,cmap='jet',marker=markers[0],
+                    label='city or town',alpha=0.9)
+            else:
+                p = ax.scatter(places.lon,places.lat,s=7,c='r',marker=markers[0],label='city or town',alpha=0.9)
+            plots.append(p)
+
+    #if type selected, check that type exists
+    elif places.hasType:
+        with instrument.stage('points'):
+            plots = drawTypes(ax,places)
+
+    #if type selected but not type column
+    else:
+        raise ValueError("Type cannot be displayed as there is no header 'type'. "\
+            "Please untick the type box before proceeding")
+
+    #Level of detail: only draw the points the current view can show, updated on zoom/pan
+    if options.detail and plots and clusters is None:
+        with instrument.stage('detail'):
+            keys = places.codes if options.type else None
+            detail = lod.DetailLayer(ax,places,plots,keys=keys,sizes=sizes,values=colourList)
+    return plots,heat,detail,clusters
+
+
+def drawLabels(ax,places,options):
+    '''Label the most populated places if placenames are required: returns the LabelLayer (or None)'''
+    if options.placenames and places.hasPop:
+        with instrument.stage('labels'):
+            return labels.LabelLayer(ax,places,labels.topN(places.pop,options.labels))
+    return None
+
+
+def drawLegend(ax,places,options,plots,heat):
+    '''Add the legend (or the colorbar of a heatmap) if it is required: returns it (or None)'''
+    if not options.legend:
+        return None
+    with instrument.stage('legend'):
+        if plots and options.type and places.hasType and not options.cluster:
+            return typeLegend(ax,plots)
+        elif plots:
+            return ax.legend(loc='upper right')
+        return ax.figure.colorbar(heat,ax=ax,label=heat.get_label())
+
+
+# Function circling the places matching a search (x,y: plot coordinates), above the other layers and out of the legend
+def drawMatches(ax,x,y):
+    return ax.scatter(x,y,s=150,facecolors='none',edgecolors='lime',linewidths=1.5,zorder=5,label='_matches')
+
+
+#%% Plot session class
+
+class PlotSession:
+    '''
+    Class keeping the plot of an axes up to date with successive options: each layer (points,
+    placenames, legend, title) remembers the settings it was drawn with, and only the layers whose
+    settings changed are removed and drawn again. The map itself is left to the caller.
+    '''
+
+    def __init__(self,ax):
+        self.ax = ax
+        self.layers = Layers()
+        self.keys = {}
+
+    def layerKeys(self,places,options,xlims,ylims,aspect):
+        '''Settings each layer depends on (places are compared by identity)'''
+        points = (places,options.plottype,options.population,options.type,options.detail,options.cluster,
+            options.bins,options.smoothing,tuple(xlims),tuple(ylims),aspect)
+        return {'points':points,'labels':(places,options.placenames,options.labels),
+            'legend':(points,options.legend),'title':options.title}
+
+    def draw(self,places,options,xlims,ylims,aspect):
+        '''
+        Update the plot to options and return the names of the layers redrawn. Raises ValueError
+        (leaving the plot unchanged) if the options cannot be applied to this data.
+        '''
+        keys = self.layerKeys(places,options,xlims,ylims,aspect)
+        changed = [name for name in keys if self.keys.get(name)!=keys[name]]
+        layers = self.layers
+
+        if 'points' in changed:
+            #Drawn before the old points are removed, so that an error leaves the plot as it was
+            new = drawPoints(self.ax,places,options,xlims,ylims,aspect)
+            #The legend depends on the points: it goes first, as a colorbar needs its heatmap image to be removed
+            layers.removeLegend()
+            layers.removePoints()
+            layers.plots,layers.heat,layers.detail,layers.clusters = new
+        if 'title' in changed:
+            self.ax.set_title(options.title)
+        if 'labels' in changed:
+            layers.removeLabels()
+            layers.names = drawLabels(self.ax,places,options)
+        if 'legend' in changed:
+            layers.removeLegend()
+            layers.legend = drawLegend(self.ax,places,options,layers.plots,layers.heat)
+
+        self.keys = keys
+        return changed
+
+
+def drawTypes(ax,places):
+    '''
+    Draw the places coloured and shaped by type: one artist per type, split from a single grouping
+    pass and styled from styleTable, so any number of types can be drawn. Marker-only lines are
+    used since they draw far faster than scatter collections with per-point colours.
+    '''
+    styleColours,styleMarkers = styleTable(len(places.categories))
+    types,xs,ys = groupByType(places)
+    plots = []
+    for t in range(len(types)):
+        p, = ax.plot(xs[t],ys[t],linestyle='',marker=styleMarkers[t],color=styleColours[t],
+            label=types[t],alpha=0.5)
+        plots.append(p)
+    return plots
+
+
+def typeLegend(ax,plots,limit=maxLegend):
+    '''Add a legend listing the types (the first limit types, in category order)'''
+    n = min(limit,len(plots))
+    title = None if n==len(plots) else "%d of %d types"%(n,len(plots))
+    return ax.legend(handles=plots[:n],loc='upper right',title=title,ncol=1 if n<=10 else 2,
+        fontsize='small' if n>10 else None)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index: uniform grid over the places, used for hover and click hit-testing
+"""
+
+#%% Import modules
+
+import math
+import numpy as np
+
+
+#%% Set up variables
+
+pickRadius = 7   #pixels within which a place is considered under the mouse
+
+
+# Function returning the number of pixels per data unit along x and y for (linear) axes
+def pixelScale(ax):
+    (x0,y0),(x1,y1) = ax.transData.transform([(0,0),(1,1)])
+    return abs(x1-x0),abs(y1-y0)
+
+
+#%% Grid index class
+
+class GridIndex:
+    '''
+    Class bucketing points into a uniform grid (cells sorted in a single array, CSR style), so that
+    the points near a position are found by visiting a handful of cells instead of every point.
+    Points are identified by their row id, i.e. their position in the arrays given.
+    '''
+
+    def __init__(self,x,y,perCell=4):
+        self.x = np.asarray(x,dtype=np.float64)
+        self.y = np.asarray(y,dtype=np.float64)
+        n = len(self.x)
+
+        #Grid covering the points, with on average perCell points per cell
+        if n:
+            self.x0,self.y0 = float(self.x.min()),float(self.y.min())
+            width = max(float(self.x.max())-self.x0,1e-9)
+            height = max(float(self.y.max())-self.y0,1e-9)
+        else:
+            self.x0,self.y0,width,height = 0.,0.,1.,1.
+        cells = max(1,n//perCell)
+        self.nx = max(1,min(4096,int(math.sqrt(cells*width/height))))
+        self.ny = max(1,min(4096,cells//self.nx))
+        self.cw = width/self.nx
+        self.ch = height/self.ny
+
+        cell = self.cellY(self.y)*self.nx+self.cellX(self.x)
+        self.order = np.argsort(cell,kind='stable')
+        self.starts = np.zeros(self.nx*self.ny+1,dtype=np.intp)
+        np.cumsum(np.bincount(cell,minlength=self.nx*self.ny),out=self.starts[1:])
+
+    def __len__(self):
+        return len(self.x)
+
+    def cellX(self,x):
+        return np.clip(np.floor((np.asarray(x)-self.x0)/self.cw),0,self.nx-1).astype(np.intp)
+
+    def cellY(self,y):
+        return np.clip(np.floor((np.asarray(y)-self.y0)/self.ch),0,self.ny-1).astype(np.intp)
+
+    def within(self,xmin,xmax,ymin,ymax):
+        '''Return the row ids of the points inside the box [xmin,xmax] x [ymin,ymax]'''
+        if not len(self) or xmax<xmin or ymax<ymin:
+            return np.zeros(0,dtype=np.intp)
+        c0,c1 = int(self.cellX(xmin)),int(self.cellX(xmax))
+        r0,r1 = int(self.cellY(ymin)),int(self.cellY(ymax))
+        #The cells of one grid row are contiguous in self.order, so each row is a single slice
+        parts = [self.order[self.starts[r*self.nx+c0]:self.starts[r*self.nx+c1+1]] for r in range(r0,r1+1)]
+        rows = np.concatenate(parts)
+        x,y = self.x[rows],self.y[rows]
+        return rows[(x>=xmin)&(x<=xmax)&(y>=ymin)&(y<=ymax)]
+
+    def nearest(self,x,y,radius=pickRadius,scale=(1.,1.)):
+        '''
+        Return the row id of the point nearest to (x,y) within radius, or None. The radius is in
+        pixels when scale gives the pixels per data unit along x and y (see pixelScale).
+        '''
+        sx,sy = scale
+        if sx<=0 or sy<=0:
+            return None
+        rows = self.within(x-radius/sx,x+radius/sx,y-radius/sy,y+radius/sy)
+        if not len(rows):
+            return None
+        d2 = ((self.x[rows]-x)*sx)**2+((self.y[rows]-y)*sy)**2
+        j = int(np.argmin(d2))
+        return int(rows[j]) if d2[j]<=radius**2 else None
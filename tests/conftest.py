@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Test configuration: the modules of Geoplotter live at the root of the repository (not in a package),
+and plots are drawn without a display
+"""
+
+import os
+import sys
+
+os.environ.setdefault('MPLBACKEND','Agg')
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
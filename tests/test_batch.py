@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the batch renderer
+"""
+
+import json
+
+import numpy as np
+import matplotlib.image
+
+import batch
+
+
+def test_read_jobs_from_a_list_or_lines(tmp_path):
+    jobs = [{'output':'a.png'},{'output':'b.png'}]
+    path = tmp_path/'jobs.json'
+    path.write_text(json.dumps(jobs))
+    assert batch.readJobs(str(path))==jobs
+    path.write_text("\n".join(json.dumps(j) for j in jobs)+"\n\n")
+    assert batch.readJobs(str(path))==jobs
+    path.write_text(json.dumps(jobs[0]))
+    assert batch.readJobs(str(path))==jobs[:1]
+
+
+def job(tmp_path,name,**changes):
+    data = tmp_path/'places.csv'
+    if not data.exists():
+        data.write_text("City,Longitude,Latitude,Population,Type\nLeeds,-1.55,53.8,474632,City\n"
+            "York,-1.08,53.96,152841,Town\nHull,-0.33,53.74,256406,City\n")
+        matplotlib.image.imsave(str(tmp_path/'map.png'),np.zeros((40,30,3)))
+    j = {'data':str(data),'map':str(tmp_path/'map.png'),'georef':{'bounds':[-3,0,53,55]},
+        'options':{'title':name,'labels':2},'output':str(tmp_path/'out'/(name+'.png')),'dpi':30}
+    j.update(changes)
+    return j
+
+
+def test_jobs_are_rendered_in_order(tmp_path):
+    jobs = [job(tmp_path,'b'),job(tmp_path,'a',georef={'points':[[0,0,-3,55],[30,40,0,53]],'projection':'Mercator'}),
+        job(tmp_path,'c',options={'plottype':'Heatmap'})]
+    reports = batch.runJobs(jobs,workers=1)
+    assert [r['output'] for r in reports]==[j['output'] for j in jobs]
+    assert all(r['ok'] for r in reports)
+    assert all((tmp_path/'out'/(name+'.png')).exists() for name in 'abc')
+    assert reports[0]['total']>=reports[0]['render']
+
+
+def test_failed_jobs_are_reported(tmp_path):
+    reports = batch.runJobs([job(tmp_path,'x',georef={}),job(tmp_path,'y',data=str(tmp_path/'missing.csv'))],workers=1)
+    assert not reports[0]['ok'] and reports[0]['error'].startswith('ValueError')
+    assert not reports[1]['ok'] and 'missing.csv' in reports[1]['error']
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the benchmark suite, on a tiny synthetic data file
+"""
+
+import json
+
+import benchmark
+
+
+stageNames = ['parse','cacheStore','cacheLoad','group','georef','index','render','renderDetail','heatmap','hover']
+
+
+def test_generated_csv_loads(tmp_path):
+    path = benchmark.dataFile(str(tmp_path),50,categories=3,duplicates=0.5)
+    assert benchmark.dataFile(str(tmp_path),50,categories=3,duplicates=0.5)==path
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0]=="% place,type,population,latitude,longitude" and len(lines)==51
+
+
+def test_results_and_comparison(tmp_path,capsys):
+    args = ['--sizes','100,200','--repeat','1','--no-startup','--workdir',str(tmp_path)]
+    first = str(tmp_path/'first.json')
+    assert benchmark.main(args+['--output',first])==0
+    with open(first) as f:
+        data = json.load(f)
+    assert set(data)=={'environment','repeat','peakRSS','startup','results'}
+    assert data['startup'] is None and data['repeat']==1
+    assert [r['stage'] for r in data['results']]==stageNames*2
+    for r in data['results']:
+        assert r['rows'] in (100,200) and r['categories']==2 and r['duplicates']==0
+        assert r['seconds']<=r['median'] and len(r['runs'])==1 and r['peakBytes']>0
+    parse = data['results'][0]
+    assert set(parse['columnBytes'])=={'longitude','latitude','population','type','names'}
+    assert {'p50','p95','p99'}<=set(data['results'][9])
+    capsys.readouterr()
+
+    second = str(tmp_path/'second.json')
+    benchmark.main(args+['--stages','parse,hover','--no-memory','--output',second,'--compare',first])
+    out = capsys.readouterr().out
+    comparison = out.split("Change against %s:"%first)[1].strip().splitlines()
+    assert [line.split()[2] for line in comparison]==['parse','hover']*2
+    assert all(' -> ' in line and '(x' in line for line in comparison)
+    with open(second) as f:
+        assert [r['stage'] for r in json.load(f)['results']]==['parse','hover']*2
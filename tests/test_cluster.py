@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the cluster hierarchy
+"""
+
+import numpy as np
+
+import cluster
+
+
+def test_spread_bits():
+    assert list(cluster.spreadBits(np.array([0,1,2,3,0xffff])))==[0,1,4,5,0x55555555]
+
+
+def test_morton_keys_interleave_cells():
+    cx,cy = np.array([0,1,0,1,2]),np.array([0,0,1,1,0])
+    assert list(cluster.mortonKeys(cx,cy))==[0,1,2,3,4]
+    #The parent cell of a key is key>>2
+    cx,cy = np.array([5,6]),np.array([3,7])
+    assert list(cluster.mortonKeys(cx,cy)>>2)==list(cluster.mortonKeys(cx>>1,cy>>1))
+
+
+def points(n=3000,seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-5,2,n),rng.uniform(50,58,n),rng.integers(0,10**6,n)
+
+
+def test_every_level_holds_every_place():
+    x,y,pop = points()
+    tree = cluster.ClusterTree(x,y,pop)
+    assert len(tree.levels)==tree.finest+1 and len(tree.levels[0])==1
+    for c in tree.levels:
+        assert c.count.sum()==len(x) and c.pop.sum()==pop.sum()
+        assert np.all(np.diff(c.key)>0)
+    top = tree.levels[0]
+    assert np.isclose(top.x[0],x.mean()) and np.isclose(top.y[0],y.mean())
+    assert (top.xmin[0],top.xmax[0])==(x.min(),x.max())
+
+
+def test_clusters_match_their_cells():
+    x,y,pop = points()
+    tree = cluster.ClusterTree(x,y,pop)
+    L = 3
+    m = 2**L
+    cx = np.minimum(((x-tree.x0)/tree.size*m).astype(int),m-1)
+    cy = np.minimum(((y-tree.y0)/tree.size*m).astype(int),m-1)
+    c = tree.levels[L]
+    for k in range(len(c)):
+        rows = np.flatnonzero((cx==c.cx[k])&(cy==c.cy[k]))
+        assert c.count[k]==len(rows) and c.pop[k]==pop[rows].sum()
+        #Representative: the most populated place, the first one on ties
+        assert c.row[k]==rows[np.argmax(pop[rows])] and c.best[k]==pop[rows].max()
+
+
+def test_representative_ties_keep_the_first_place():
+    tree = cluster.ClusterTree([0,1,2,3],[0,0,0,0],[5,9,9,1],levels=1)
+    assert tree.levels[0].row[0]==1
+    assert list(tree.levels[1].row)==[1,2]
+
+
+def test_level_and_within():
+    x,y,pop = points()
+    tree = cluster.ClusterTree(x,y,pop)
+    assert tree.levelFor((1,1))==0
+    assert tree.levelFor((10**9,10**9))==tree.finest
+    c = tree.levels[2]
+    inside = tree.within(2,-1,0,52,54)
+    assert list(inside)==list(np.flatnonzero((c.x>=-1)&(c.x<=0)&(c.y>=52)&(c.y<=54)))
+
+
+def test_empty_tree():
+    tree = cluster.ClusterTree([],[])
+    assert tree.n==0 and all(len(c)==0 for c in tree.levels)
+    assert not tree.hasPop
+
+
+def test_marker_sizes_grow_with_count():
+    sizes = cluster.markerSizes(np.array([1,10,100]),100)
+    assert sizes[0]==cluster.minDiameter**2 and sizes[2]==cluster.maxDiameter**2
+    assert sizes[0]<sizes[1]<sizes[2]
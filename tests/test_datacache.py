@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the on-disk dataset cache
+"""
+
+import os
+
+import numpy as np
+
+import datacache
+from placetable import PlaceTable
+
+
+def table():
+    return PlaceTable(['Leeds','York','Hull'],[-1.55,-1.08,-0.33],[53.8,53.96,53.74],[474632,152841,256406],
+        [1,0,1],['City','Town'])
+
+
+def dataFile(tmp_path,name='places.csv',text='Leeds,York,Hull\n'):
+    path = tmp_path/name
+    path.write_text(text)
+    return str(path)
+
+
+def test_stored_table_loads_as_memory_maps(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    path = dataFile(tmp_path)
+    assert cache.load(path) is None
+    assert cache.store(path,table())
+    loaded = cache.load(path)
+    #Columns are views of the memory-mapped files, not copies
+    assert isinstance(loaded.lon.base,np.memmap) and isinstance(loaded.names.buffer,np.memmap)
+    assert not loaded.lon.flags.writeable
+    assert list(loaded.names)==['Leeds','York','Hull']
+    assert list(loaded.pop)==list(table().pop)
+    assert loaded.codes.dtype==np.uint8 and list(loaded.categories)==['City','Town']
+
+
+def test_missing_columns_stay_missing(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    path = dataFile(tmp_path)
+    cache.store(path,PlaceTable(['a'],[1.],[2.]))
+    loaded = cache.load(path)
+    assert loaded.pop is None and loaded.codes is None and len(loaded)==1
+
+
+def test_modified_file_is_not_loaded(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    path = dataFile(tmp_path)
+    cache.store(path,table())
+    stat = os.stat(path)
+    #Same size and timestamps, different content
+    dataFile(tmp_path,text='Leeds,York,Hulk\n')
+    os.utime(path,ns=(stat.st_atime_ns,stat.st_mtime_ns))
+    assert cache.load(path) is None
+    #Storing the new content replaces the stale entry
+    cache.store(path,table())
+    assert len(cache.entries())==1 and cache.load(path) is not None
+
+
+def test_other_versions_are_ignored(tmp_path,monkeypatch):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    path = dataFile(tmp_path)
+    cache.store(path,table())
+    monkeypatch.setattr(datacache,'cacheVersion',datacache.cacheVersion+1)
+    assert cache.load(path) is None
+
+
+def test_invalidate(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    a,b = dataFile(tmp_path,'a.csv'),dataFile(tmp_path,'b.csv')
+    cache.store(a,table())
+    cache.store(b,table())
+    cache.invalidate(a)
+    assert cache.load(a) is None and cache.load(b) is not None
+    cache.invalidate()
+    assert cache.load(b) is None and os.listdir(tmp_path/'cache')==[]
+
+
+def test_prune_removes_least_recently_used(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'),limit=10**9)
+    paths = [dataFile(tmp_path,'%d.csv'%i,'%d\n'%i) for i in range(3)]
+    for i,path in enumerate(paths):
+        cache.store(path,table())
+        os.utime(cache.entryDir(datacache.datasetKey(path)),(i,i))
+    cache.limit = sum(datacache.directorySize(cache.entryDir(datacache.datasetKey(p))) for p in paths[1:])
+    cache.prune()
+    assert cache.load(paths[0]) is None
+    assert cache.load(paths[1]) is not None and cache.load(paths[2]) is not None
+
+
+def test_file_grown_while_it_was_read_is_not_loaded_truncated(tmp_path):
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    path = dataFile(tmp_path)
+    key = datacache.datasetKey(path)
+    #Rows appended after reading started are not in the parsed table
+    with open(path,'a') as f:
+        f.write('Leeds,York,Hull\n')
+    cache.store(path,table(),key=key)
+    assert cache.load(path) is None
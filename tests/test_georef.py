@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the map georeferencing
+"""
+
+import numpy as np
+import pytest
+
+import georef
+from placetable import PlaceTable
+
+
+def test_mercator_round_trip():
+    merc = georef.Mercator()
+    lon,lat = np.array([-10.,0.,2.5]),np.array([-60.,0.,58.3])
+    x,y = merc.forward(lon,lat)
+    assert np.isclose(y[1],0) and y[2]>lat[2]
+    assert np.allclose(merc.inverse(x,y),(lon,lat))
+
+
+def test_unknown_projection():
+    with pytest.raises(ValueError):
+        georef.getProjection('Robinson')
+
+
+@pytest.mark.parametrize('projection',['Equirectangular','Mercator'])
+def test_fit_recovers_the_extent(projection):
+    truth = georef.fromBounds((800,1000),-8,2,50,59,projection)
+    lon,lat = np.array([-6.,-1.,1.5,-3.]),np.array([51.,58.,52.,55.])
+    u,v = truth.toPixels(lon,lat)
+    fitted = georef.fit((800,1000),np.column_stack([u,v,lon,lat]),projection)
+    assert np.allclose(fitted.xlims,truth.xlims) and np.allclose(fitted.ylims,truth.ylims)
+    assert fitted.rms<1e-6
+    assert np.allclose(fitted.unproject(*fitted.project(lon,lat)),(lon,lat))
+
+
+def test_residuals_of_a_misplaced_point():
+    points = [[0,0,0,10],[100,100,10,0],[50,40,5,5]]
+    fitted = georef.fit((100,100),points)
+    assert fitted.residuals.shape==(3,2)
+    assert fitted.rms>1
+
+
+def test_from_cities_uses_both_cities():
+    ref = georef.fromCities((200,100),(0,0),(-5,55),(200,100),(1,50))
+    assert np.allclose(ref.xlims,[-5,1]) and np.allclose(ref.ylims,[50,55])
+    assert np.isclose(ref.aspect,0.6)
+
+
+def test_degenerate_points_are_rejected():
+    with pytest.raises(ValueError):
+        georef.fit((100,100),[[0,0,1,1]])
+    with pytest.raises(ValueError):
+        georef.fit((100,100),[[0,0,1,1],[10,0,2,1]])
+    with pytest.raises(ValueError):
+        georef.fromBounds((100,100),1,1,50,51)
+
+
+def test_parse_points():
+    text = "# pixel lon, pixel lat, lon, lat\n10, 20, -1.5, 53\n\n30 40 0.5 52 # York\n"
+    assert georef.parsePoints(text)==[[10,20,-1.5,53],[30,40,0.5,52]]
+    with pytest.raises(ValueError):
+        georef.parsePoints("1,2,3")
+
+
+def test_project_table_keeps_only_the_last_table():
+    places = PlaceTable(['a'],[1.],[52.])
+    assert georef.fromBounds((10,10),0,2,50,54).projectTable(places) is places
+    merc = georef.fromBounds((10,10),0,2,50,54,'Mercator')
+    projected = merc.projectTable(places)
+    assert projected is not places and projected.names is places.names
+    assert merc.projectTable(places) is projected
+    other = PlaceTable(['b'],[1.],[52.])
+    assert merc.projectTable(other) is not projected
+    assert georef.lastProjected[1] is other
+
+
+def test_cached_fit_is_bounded(tmp_path,monkeypatch):
+    monkeypatch.setattr(georef,'transforms',georef.OrderedDict())
+    monkeypatch.setattr(georef,'maxTransforms',2)
+    path = tmp_path/'map.png'
+    path.write_bytes(b'x')
+    calls = []
+    def fitter(west):
+        calls.append(west)
+        return georef.fromBounds((10,10),west,west+1,50,51)
+    first = georef.cachedFit(path,fitter,0)
+    assert georef.cachedFit(path,fitter,0) is first and calls==[0]
+    georef.cachedFit(path,fitter,1)
+    #Using 0 again makes 1 the least recently used fit
+    georef.cachedFit(path,fitter,0)
+    georef.cachedFit(path,fitter,2)
+    assert len(georef.transforms)==2
+    assert georef.cachedFit(path,fitter,0) is first
+    georef.cachedFit(path,fitter,1)
+    assert calls==[0,1,2,1]
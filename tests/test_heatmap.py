@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the heatmap density grid
+"""
+
+import numpy as np
+
+import heatmap
+
+
+def test_grid_shape_follows_the_longest_side():
+    assert heatmap.gridShape([0,20],[0,10],bins=100)==(50,100)
+    assert heatmap.gridShape([0,10],[0,20],bins=100)==(100,50)
+    #The aspect stretches the x axis
+    assert heatmap.gridShape([0,10],[0,10],bins=100,aspect=2)==(50,100)
+
+
+def test_kernel_is_normalised():
+    k = heatmap.gaussianKernel(1.5)
+    assert np.isclose(k.sum(),1) and np.allclose(k,k[::-1])
+
+
+def test_points_are_binned_south_up():
+    grid = heatmap.densityGrid([0.5,1.5,1.5,5],[0.5,1.5,1.5,0.5],[0,2],[0,2],(2,2),sigma=0)
+    #Row 0 is the southern edge; the point outside the extent is ignored
+    assert grid.tolist()==[[1,0],[0,2]]
+
+
+def test_weights_are_summed():
+    grid = heatmap.densityGrid([0.5,0.5],[0.5,0.5],[0,1],[0,1],(1,1),weights=[10,5],sigma=0)
+    assert grid[0,0]==15
+
+
+def test_smoothing_keeps_the_total_away_from_the_edges():
+    grid = np.zeros((21,21))
+    grid[10,10] = 1
+    smoothed = heatmap.smooth(grid,1.0)
+    assert np.isclose(smoothed.sum(),1)
+    assert smoothed.argmax()==grid.argmax()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the in-memory image cache
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import imagecache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = imagecache.ImageCache(budget=10)
+    cache.put('a',1,4)
+    cache.put('b',2,4)
+    #Reading a makes b the least recently used entry
+    assert cache.get('a')==1
+    cache.put('c',3,4)
+    assert cache.get('b') is None
+    assert cache.get('a')==1 and cache.get('c')==3
+    assert cache.used==8
+
+
+def test_replacing_an_entry_releases_its_bytes():
+    cache = imagecache.ImageCache(budget=10)
+    cache.put('a',1,6)
+    cache.put('a',2,3)
+    assert cache.get('a')==2 and cache.used==3
+
+
+def test_entries_over_budget_are_not_cached():
+    cache = imagecache.ImageCache(budget=10)
+    cache.put('a',1,4)
+    assert cache.put('big',2,11)==2
+    assert cache.get('big') is None
+    assert cache.get('a')==1
+
+
+def test_file_key_changes_when_the_file_is_modified(tmp_path):
+    path = tmp_path/'map.png'
+    path.write_bytes(b'x')
+    key = imagecache.fileKey(path)
+    path.write_bytes(b'xy')
+    assert imagecache.fileKey(path)!=key
+
+
+def test_raster_is_decoded_once(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    path = str(tmp_path/'map.png')
+    Image.fromarray(np.arange(48,dtype=np.uint8).reshape(4,4,3)).save(path)
+    cache = imagecache.ImageCache()
+    assert cache.cachedRaster(path) is None
+    img = cache.raster(path)
+    assert img.shape==(4,4,3) and img.dtype==np.uint8
+    assert cache.raster(path) is img and cache.cachedRaster(path) is img
+    #A modified file is decoded again
+    Image.fromarray(np.zeros((2,2,3),np.uint8)).save(path)
+    os.utime(path,ns=(0,0))
+    assert cache.cachedRaster(path) is None
+    assert cache.raster(path).shape==(2,2,3)
+
+
+def test_thumbnails_are_persisted(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    path = str(tmp_path/'map.png')
+    Image.fromarray(np.full((40,60,3),200,np.uint8)).save(path)
+    cache = imagecache.ImageCache(thumbDir=str(tmp_path/'thumbs'))
+    thumb,res = cache.thumbnail(path,size=(6,4))
+    assert thumb.size==(6,4) and res==(60,40)
+    #A new cache reads the saved thumbnail back with its resolution
+    thumb,res = imagecache.ImageCache(thumbDir=str(tmp_path/'thumbs')).thumbnail(path,size=(6,4))
+    assert thumb.size==(6,4) and res==(60,40)
+    assert len(os.listdir(tmp_path/'thumbs'))==1
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the stage and latency instrumentation
+"""
+
+import json
+
+import instrument
+
+
+def test_percentiles_nearest_rank():
+    assert instrument.percentiles(range(101))=={'p50':50,'p95':95,'p99':99}
+    assert instrument.percentiles([3])=={'p50':3,'p95':3,'p99':3}
+    assert instrument.percentiles([])=={}
+
+
+def test_disabled_recorder_records_nothing():
+    recorder = instrument.Recorder()
+    assert recorder.stage('load') is instrument.nullStage
+    with recorder.stage('load'):
+        pass
+    assert recorder.last=={} and recorder.summary()==""
+
+
+def test_nested_stages_are_grouped(tmp_path):
+    log = tmp_path/'profile.jsonl'
+    recorder = instrument.Recorder(enabled=True,log=str(log))
+    with recorder.stage('load'):
+        with recorder.stage('parse'):
+            data = [0]*100000
+        with recorder.stage('index'):
+            pass
+    del data
+    group = recorder.last['load']
+    assert [r['stage'] for r in group]==['parse','index','load']
+    assert [r['parent'] for r in group]==['load','load',None]
+    assert group[0]['allocated']>=700000 and group[2]['peak']>=700000
+    recorder.configure(False)
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [r['stage'] for r in records]==['parse','index','load']
+
+
+def test_latencies_are_summarised(monkeypatch):
+    monkeypatch.setattr(instrument,'recorder',instrument.Recorder(enabled=True,memory=False))
+    @instrument.timed('hover')
+    def handler(x):
+        return x*2
+    assert [handler(i) for i in range(5)]==[0,2,4,6,8]
+    assert instrument.recorder.calls['hover']==5
+    instrument.recorder.record('draw',0.5)
+    summary = instrument.recorder.summary()
+    assert summary.startswith('draw 0.50s  |  hover p50 ')
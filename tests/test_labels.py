@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the label selection
+"""
+
+import numpy as np
+
+import labels
+
+
+def test_top_n_is_sorted_largest_first():
+    pop = [5,50,20,40,10]
+    assert list(labels.topN(pop,3))==[1,3,2]
+
+
+def test_ties_keep_the_lowest_rows():
+    pop = np.array([7,9,7,7,1,7])
+    assert list(labels.topN(pop,3))==[1,0,2]
+    assert list(labels.topN(pop,5))==[1,0,2,3,5]
+
+
+def test_top_n_bounds():
+    assert len(labels.topN([3,2,1],0))==0
+    assert len(labels.topN([3,2,1],-4))==0
+    assert list(labels.topN([1,3,2],10))==[1,2,0]
+    assert len(labels.topN([],5))==0
+
+
+def test_top_n_matches_a_full_sort():
+    pop = np.random.default_rng(0).integers(0,50,1000)
+    expected = np.lexsort((np.arange(len(pop)),-pop))[:25]
+    assert list(labels.topN(pop,25))==list(expected)
+
+
+def test_box_hash_finds_overlaps_only():
+    boxes = labels.BoxHash(cell=10)
+    boxes.add((0,0,5,5))
+    assert boxes.hits((4,4,30,30))
+    #Touching edges do not overlap
+    assert not boxes.hits((5,0,8,5))
+    assert not boxes.hits((50,50,60,60))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the live data parsing and buffering
+"""
+
+import numpy as np
+import pytest
+
+import live
+from placetable import PlaceTable
+
+
+def test_partial_lines_wait_for_the_rest():
+    parser = live.RowParser()
+    assert parser.feed(b'City,Longitude,Latitude,Population,Type\nLeeds,-1.55,5') is None
+    table = parser.feed(b'3.8,474632,City\nYork,-1.08,53.96,152841,Town\nHu')
+    assert list(table.names)==['Leeds','York'] and list(table.lat)==[53.8,53.96]
+    assert list(parser.feed(b'll,-0.33,53.74,256406,City\n').names)==['Hull']
+
+
+def test_types_keep_their_codes():
+    parser = live.RowParser(header=['City','Lon','Lat','Type'],categories=['Town'])
+    table = parser.feed(b'a,0,50,City\nb,0,51,Town\n')
+    assert list(table.codes)==[1,0] and table.categories==['Town','City']
+    table = parser.feed(b'c,0,52,Village\nd,0,53,City\n')
+    assert list(table.codes)==[2,1] and table.categories==['Town','City','Village']
+
+
+def test_repeated_headers_and_invalid_rows_are_skipped():
+    parser = live.RowParser(header=['City','Lon','Lat'])
+    table = parser.feed(b'a,0,50\nCity,Lon,Lat\nb,x,51\nc,1,\nd,2,52\n')
+    assert list(table.names)==['a','d'] and parser.skipped==2
+    assert parser.feed(b'e,y,50\n') is None and parser.skipped==3
+
+
+def test_missing_header():
+    with pytest.raises(ValueError):
+        live.RowParser(header=['City','Lon','Population'])
+
+
+def places(names,pop=None,codes=None):
+    n = len(names)
+    return PlaceTable(names,np.arange(n,dtype=float),np.arange(n,dtype=float),pop,codes,
+        None if codes is None else ['t%d'%i for i in range(int(max(codes))+1)])
+
+
+def test_buffer_keeps_the_latest_places():
+    buffer = live.LiveBuffer(capacity=3)
+    buffer.append(places(['a','b']))
+    buffer.append(places(['c','d']))
+    assert buffer.trim() and len(buffer)==3
+    assert list(buffer.table().names)==['b','c','d']
+    assert list(buffer.column('lon'))==[1,0,1]
+    assert buffer.column('pop') is None
+    assert not buffer.trim()
+
+
+def test_buffer_drops_places_outside_the_window():
+    buffer = live.LiveBuffer(window=10)
+    buffer.append(places(['a']),now=0)
+    buffer.append(places(['b','c']),now=5)
+    assert not buffer.trim(now=9)
+    assert buffer.trim(now=12) and list(buffer.table().names)==['b','c']
+    assert buffer.trim(now=20) and len(buffer)==0
+
+
+def test_buffer_grows_and_compacts():
+    buffer = live.LiveBuffer(capacity=1500)
+    for i in range(10):
+        buffer.append(places(['p%d'%i]*500,pop=np.full(500,i)))
+        buffer.trim()
+    assert len(buffer)==1500 and len(buffer.names)<=3000
+    assert list(np.unique(buffer.column('pop')))==[7,8,9]
+    assert len(buffer.columns['lon'])<=4096
+
+
+def test_buffer_widens_type_codes():
+    buffer = live.LiveBuffer()
+    buffer.append(places(['a'],codes=np.array([3],np.uint8)))
+    buffer.append(places(['b'],codes=np.array([300],np.uint16)))
+    assert buffer.column('codes').dtype==np.uint16
+    assert list(buffer.column('codes'))==[3,300]
+
+
+def test_rows_are_split_as_csv_records():
+    parser = live.RowParser(header=['City','Lon','Lat','Type'])
+    table = parser.feed('a b,0,50,T\r\n"c\nd",1,51,T\r\nx\x1cy,2,52,T\r\n"e\n'.encode('utf-8'))
+    assert list(table.names)==['a b','c\nd','x\x1cy']
+    #The quoted value still open waits for the rest of its record
+    assert list(parser.feed(b'f",3,53,T\n').names)==['e\nf'] and parser.skipped==0
+
+
+def test_only_whole_header_rows_are_skipped():
+    parser = live.RowParser()
+    table = parser.feed(b'City,Lon,Lat,Type\nLat,0,50,Latitude\ncity, LON,lat,type\nb,1,51,T\n')
+    assert list(table.names)==['Lat','b'] and table.categories==['Latitude','T']
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the viewport level of detail
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import lod
+from placetable import PlaceTable
+
+
+def places(n=20000,seed=3):
+    rng = np.random.default_rng(seed)
+    return PlaceTable(['p']*n,rng.uniform(0,10,n),rng.uniform(0,10,n),rng.integers(1,10**6,n))
+
+
+def axes():
+    fig,ax = plt.subplots(figsize=(2,2),dpi=50)
+    ax.set_xlim(0,10)
+    ax.set_ylim(0,10)
+    return fig,ax
+
+
+def test_points_are_culled_and_thinned_per_cell():
+    table = places()
+    fig,ax = axes()
+    line, = ax.plot([],[],'o')
+    layer = lod.DetailLayer(ax,table,[line],cell=4)
+    #Far fewer points than places: at most one per cell of the axes
+    cells = (int(ax.bbox.width/4)+1)*(int(ax.bbox.height/4)+1)
+    assert 0<layer.shown<=cells<len(table)
+    ax.set_xlim(2,3)
+    ax.set_ylim(2,3)
+    x,y = line.get_data()
+    assert len(x)==layer.shown and (x>=2).all() and (x<=3).all() and (y>=2).all() and (y<=3).all()
+    layer.disconnect()
+    plt.close(fig)
+
+
+def test_largest_place_of_each_cell_is_kept():
+    table = places()
+    fig,ax = axes()
+    scatter = ax.scatter([],[])
+    layer = lod.DetailLayer(ax,table,[scatter],sizes=np.sqrt(table.pop),cell=40)
+    rows = layer.visibleRows()
+    #The most populated place overall is always drawn
+    assert int(np.argmax(table.pop)) in rows
+    assert len(scatter.get_offsets())==len(rows)==len(scatter.get_sizes())
+    layer.disconnect()
+    plt.close(fig)
+
+
+def test_each_artist_keeps_its_own_places():
+    table = places(2000)
+    keys = (table.lon>5).astype(np.int64)
+    fig,ax = axes()
+    lines = [ax.plot([],[],'o')[0],ax.plot([],[],'s')[0]]
+    lod.DetailLayer(ax,table,lines,keys=keys,cell=4)
+    assert (lines[0].get_data()[0]<=5).all() and (lines[1].get_data()[0]>5).all()
+    plt.close(fig)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the place-name search
+"""
+
+import numpy as np
+
+from namesearch import NameIndex
+from placetable import NameColumn
+
+
+names = ['Yorkley','York','Hull','Leeds','Yorkshire Dales','Leek','Leeming','Hulland','yORK','Ynys Môn']
+pop = np.array([1500,152841,256406,474632,0,20000,2000,800,10,70000])
+
+
+def index(width=32):
+    return NameIndex(NameColumn.fromStrings(names),pop,width=width)
+
+
+def test_prefix_is_alphabetical_and_ignores_case():
+    assert [names[r] for r in index().prefix('york')]==['York','yORK','Yorkley','Yorkshire Dales']
+    assert [names[r] for r in index().prefix(' LEE')]==['Leeds','Leek','Leeming']
+    assert len(index().prefix('Zz'))==0 and len(index().prefix(''))==0
+
+
+def test_exact_names_come_first_then_population():
+    assert [names[r] for r in index().search('york')]==['York','yORK','Yorkley','Yorkshire Dales']
+    assert [names[r] for r in index().search('Lee')]==['Leeds','Leek','Leeming']
+    assert [names[r] for r in index().search('Lee',limit=2)][:2]==['Leeds','Leek']
+
+
+def test_texts_longer_than_the_keys():
+    short = index(width=4)
+    assert [names[r] for r in short.prefix('Yorks')]==['Yorkshire Dales']
+    assert [names[r] for r in short.search('york')]==['York','yORK','Yorkley','Yorkshire Dales']
+
+
+def test_non_ascii_names():
+    assert [names[r] for r in index().search('ynys m')]==['Ynys Môn']
+
+
+def test_misspellings_are_found_when_no_name_starts_with_the_text():
+    assert names[index().search('Leds')[0]]=='Leeds'
+    assert names[index().search('Hul1')[0]]=='Hull'
+    #Within one edit of the start of a name
+    assert 'Yorkshire Dales' in [names[r] for r in index().fuzzy('Yorkshre',10)]
+    assert len(index().fuzzy('Qwxz',10))==0
+
+
+def test_fuzzy_matches_brute_force_edit_distance():
+    def distance(a,b):
+        d = list(range(len(b)+1))
+        for i,ca in enumerate(a,1):
+            prev,d[0] = d[0],i
+            for j,cb in enumerate(b,1):
+                prev,d[j] = d[j],min(d[j]+1,d[j-1]+1,prev+(ca!=cb))
+        return d[-1]
+    rows = index().fuzzy('leak',10,maxEdits=1)
+    expected = [i for i,n in enumerate(names) if min(distance('leak',n.lower()[:j]) for j in range(len(n)+1))<=1]
+    assert sorted(rows)==sorted(expected)
+    assert names[rows[0]]=='Leek'
+
+
+def test_empty_index():
+    empty = NameIndex(NameColumn.fromStrings([]))
+    assert len(empty)==0 and len(empty.search('a'))==0
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the blitted hover overlay
+"""
+
+import matplotlib.pyplot as plt
+
+from overlay import HoverOverlay
+
+
+def figure():
+    fig,ax = plt.subplots(figsize=(2,2),dpi=50)
+    ax.plot([0,1],[0,1],'o',label='places')
+    calls = []
+    canvas = fig.canvas
+    for name in ('restore_region','blit','draw_idle'):
+        method = getattr(canvas,name)
+        setattr(canvas,name,lambda *a,name=name,method=method:(calls.append(name),method(*a))[1])
+    return fig,ax,calls
+
+
+def test_artists_are_animated_and_out_of_the_legend():
+    fig,ax,calls = figure()
+    hover = HoverOverlay(ax)
+    assert hover.marker in ax.lines and hover.text in ax.texts
+    assert all(a.get_animated() and not a.get_visible() for a in hover.artists)
+    assert [h.get_label() for h in ax.legend().legend_handles]==['places']
+    plt.close(fig)
+
+
+def test_background_is_captured_on_every_draw():
+    fig,ax,calls = figure()
+    hover = HoverOverlay(ax)
+    assert hover.background is None
+    #No full draw yet: showing falls back to an idle draw, which captures the background
+    hover.show(0.5,0.5,"Leeds")
+    assert calls[0]=='draw_idle' and 'blit' not in calls
+    first = hover.background
+    assert first is not None
+    fig.canvas.draw()
+    assert hover.background is not first
+    plt.close(fig)
+
+
+def test_show_and_hide_blit_the_overlay():
+    fig,ax,calls = figure()
+    hover = HoverOverlay(ax)
+    fig.canvas.draw()
+    hover.show(0.5,0.25,"York",colour='b',marker='s')
+    assert calls==['restore_region','blit']
+    assert hover.text.get_text()=="York" and list(hover.marker.get_xdata())==[0.5]
+    assert hover.marker.get_marker()=='s' and all(a.get_visible() for a in hover.artists)
+    hover.hide()
+    assert calls==['restore_region','blit']*2 and not any(a.get_visible() for a in hover.artists)
+    #Hiding again does nothing
+    hover.hide()
+    assert len(calls)==4
+    plt.close(fig)
+
+
+def test_disconnect_removes_the_artists():
+    fig,ax,calls = figure()
+    hover = HoverOverlay(ax)
+    hover.disconnect()
+    assert hover.marker not in ax.lines and hover.text not in ax.texts
+    hover.background = None
+    fig.canvas.draw()
+    assert hover.background is None
+    plt.close(fig)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the place table: columns, selection and streaming ingestion
+"""
+
+import numpy as np
+import pytest
+
+from placetable import PlaceTable, PlaceBuilder, NameColumn, codeType, formatBytes, loadPlaces, readChunks, rowReader
+
+
+def table():
+    return PlaceTable(['Leeds','York','Hull'],[-1.55,-1.08,-0.33],[53.8,53.96,53.74],[474632,152841,256406],
+        [1,0,1],['City','Town'])
+
+
+def test_columns_are_typed():
+    places = table()
+    assert len(places)==3
+    assert places.lon.dtype==np.float64 and places.pop.dtype==np.int64
+    assert places.hasPop and places.hasType
+    assert [places.typeOf(i) for i in range(3)]==['Town','City','Town']
+
+
+def test_optional_columns():
+    places = PlaceTable(['a'],[1],[2])
+    assert not places.hasPop and not places.hasType
+
+
+def test_select_keeps_rows_in_step():
+    places = table().select(np.array([False,True,True]))
+    assert list(places.names)==['York','Hull']
+    assert list(places.pop)==[152841,256406]
+    assert places.typeOf(1)=='Town'
+
+
+def test_with_coords_shares_other_columns():
+    places = table()
+    moved = places.withCoords(places.lon+1,places.lat)
+    assert moved.names is places.names and moved.pop is places.pop
+    assert np.allclose(moved.lon,places.lon+1)
+
+
+def test_read_chunks_counts_lines_and_skips_blank_rows():
+    rows = [['a'],[],['b'],['c']]
+    chunks = list(readChunks(iter(rows),size=2))
+    assert [c for c,lines in chunks]==[[['a'],['b']],[['c']]]
+    #The first row given is on line 2 (line 1 is the header)
+    assert [list(lines) for c,lines in chunks]==[[2,4],[5]]
+
+
+def test_text_rows_count_lines(tmp_path):
+    path = tmp_path/'places.txt'
+    path.write_text("place,lon,lat\n\nLeeds,-1.5,53.8\n")
+    with open(path) as f:
+        rows = rowReader(f,csvFile=False)
+        next(rows)
+        chunk,lines = next(readChunks(rows))
+    assert chunk==[['Leeds','-1.5','53.8']] and list(lines)==[3]
+
+
+def test_builder_streams_chunks_into_one_table():
+    builder = PlaceBuilder(0,1,2,3,4,capacity=1)
+    builder.append([['A','1','2','10','Town'],['B','3','4','20','City']])
+    builder.append([['C','5','6','30','Town']])
+    places = builder.finish()
+    assert list(places.names)==['A','B','C']
+    assert list(places.lon)==[1,3,5] and list(places.pop)==[10,20,30]
+    #Categories are sorted, whatever the order they were seen in
+    assert places.categories==['City','Town']
+    assert [places.typeOf(i) for i in range(3)]==['Town','City','Town']
+
+
+def test_invalid_chunk_leaves_the_builder_unchanged():
+    builder = PlaceBuilder(0,1,2)
+    builder.append([['a','1','2']])
+    with pytest.raises(ValueError):
+        builder.append([['b','1','2'],['c','1','x']])
+    assert builder.n==1
+
+
+def test_load_places(tmp_path):
+    path = tmp_path/'places.csv'
+    path.write_text("% place,type,population,latitude,longitude\nLeeds,City,474632,53.8,-1.55\nYork,Town,152841,53.96,-1.08\n")
+    progress = []
+    places = loadPlaces(str(path),progress=lambda n,t:progress.append(n),size=1)
+    assert list(places.names)==['Leeds','York']
+    assert list(places.lat)==[53.8,53.96]
+    assert progress==[1,2]
+
+
+def test_load_places_needs_coordinates(tmp_path):
+    path = tmp_path/'places.csv'
+    path.write_text("place,population\nLeeds,474632\n")
+    with pytest.raises(ValueError):
+        loadPlaces(str(path))
+
+
+def test_name_column_indexing():
+    names = NameColumn.fromStrings(['Leeds','Ynys Môn','','York'])
+    assert len(names)==4 and names[1]=='Ynys Môn' and names[-1]=='York' and names[2]==''
+    with pytest.raises(IndexError):
+        names[4]
+    assert list(names[1:3])==['Ynys Môn','']
+    assert list(names[np.array([True,False,False,True])])==['Leeds','York']
+    assert list(names[np.array([3,0,3])])==['York','Leeds','York']
+    assert len(names[np.zeros(4,dtype=bool)])==0
+
+
+def test_name_column_find_ignores_case_and_spaces():
+    names = NameColumn.fromStrings(['Leeds','York','LEEDS','Leek'])
+    assert list(names.find(' leeds '))==[0,2]
+    assert len(names.find('Lee'))==0
+
+
+def test_name_column_concat():
+    joined = NameColumn.concat([NameColumn.fromStrings(['a','bc']),NameColumn.fromStrings([]),
+        NameColumn.fromStrings(['def'])])
+    assert list(joined)==['a','bc','def']
+    assert len(NameColumn.concat([]))==0
+
+
+def test_code_type_fits_the_categories():
+    assert [codeType(n) for n in (1,256,257,65536,65537)]==[np.uint8,np.uint8,np.uint16,np.uint16,np.uint32]
+
+
+def test_builder_widens_codes_past_256_types():
+    builder = PlaceBuilder(0,1,2,typeIdx=3)
+    builder.append([['a','0','0','t%03d'%i] for i in range(200)])
+    assert builder.codes.dtype==np.uint8
+    builder.append([['b','0','0','t%03d'%i] for i in range(150,300)])
+    places = builder.finish()
+    assert places.codes.dtype==np.uint16 and len(places.categories)==300
+    assert places.typeOf(0)=='t000' and places.typeOf(349)=='t299'
+    assert places.typeOf(200)=='t150'
+
+
+def test_memory_usage_per_column():
+    places = table()
+    usage = dict(places.memoryUsage())
+    assert usage['longitude']==24 and usage['population']==24
+    assert usage['type']==3+len('CityTown')
+    assert usage['names']==places.names.nbytes
+    assert places.memoryReport().endswith("total %s"%formatBytes(sum(usage.values())))
+    assert [formatBytes(n) for n in (512,1536,3*2**20,5*2**30)]==['512 bytes','1.5 kB','3.0 MB','5.0 GB']
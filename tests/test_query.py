@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the radius, box and nearest-place queries
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+import query
+from placetable import PlaceTable
+
+
+def test_haversine_known_distances():
+    #London to Paris, and a quarter of a meridian
+    assert query.haversine(-0.1278,51.5074,2.3522,48.8566)==pytest.approx(343.5,abs=1)
+    assert query.haversine(0,0,0,90)==pytest.approx(query.earthRadius*np.pi/2)
+    assert query.haversine(179.5,0,-179.5,0)==pytest.approx(query.kmPerDegree)
+
+
+def test_circle_bounds():
+    west,east,south,north = query.circleBounds(0,0,query.kmPerDegree)
+    assert np.allclose([west,east,south,north],[-1,1,-1,1])
+    #A circle around a pole spans all longitudes
+    assert query.circleBounds(10,89.5,200)[:2]==(-180.,180.)
+
+
+def places(n=5000,seed=2):
+    rng = np.random.default_rng(seed)
+    lon,lat = rng.uniform(-180,180,n),rng.uniform(-80,80,n)
+    return lon,lat
+
+
+def test_radius_matches_brute_force():
+    lon,lat = places()
+    index = query.GeoIndex(lon,lat)
+    for centre in [(0,0),(179.9,10),(-179,-30),(20,79)]:
+        rows,km = index.radius(*centre,1500)
+        d = query.haversine(*centre,lon,lat)
+        assert sorted(rows)==list(np.flatnonzero(d<=1500))
+        assert np.all(np.diff(km)>=0) and np.allclose(km,d[rows])
+
+
+def test_box_across_the_antimeridian():
+    lon,lat = places()
+    index = query.GeoIndex(lon,lat)
+    rows = index.box(170,-170,-10,10)
+    expected = np.flatnonzero(((lon>=170)|(lon<=-170))&(lat>=-10)&(lat<=10))
+    assert sorted(rows)==list(expected)
+    assert sorted(index.box(-190,-170,-10,10))==list(expected)
+
+
+def test_nearest_matches_brute_force():
+    lon,lat = places()
+    index = query.GeoIndex(lon,lat)
+    keep = lon>0
+    for k in (1,7,60):
+        rows,km = index.nearest(-3,53,k)
+        d = query.haversine(-3,53,lon,lat)
+        assert list(rows)==list(np.argsort(d,kind='stable')[:k])
+        rows,km = index.nearest(-3,53,k,keep)
+        assert keep[rows].all() and list(rows)==list(np.flatnonzero(keep)[np.argsort(d[keep],kind='stable')[:k]])
+    assert len(index.nearest(0,0,10,np.zeros(len(lon),dtype=bool))[0])==0
+    assert len(query.GeoIndex([1.],[2.]).nearest(0,0,5)[0])==1
+
+
+def table():
+    return PlaceTable(['Leeds','York','Hull','leeds'],[-1.55,-1.08,-0.33,-2.],[53.8,53.96,53.74,52.],
+        [474632,152841,256406,10],[1,0,1,0],['City','Town'])
+
+
+def test_type_mask():
+    places = table()
+    assert query.typeMask(places,None) is None
+    assert list(query.typeMask(places,['Town']))==[True,False,True,False]
+    with pytest.raises(ValueError):
+        query.typeMask(places,['Hamlet'])
+
+
+def test_parse_centre():
+    places = table()
+    assert query.parseCentre(places,'53.5, -1.2')==(-1.2,53.5)
+    #The most populated place of that name
+    assert query.parseCentre(places,'LEEDS')==(-1.55,53.8)
+    for text in ['95,0','Leek']:
+        with pytest.raises(ValueError):
+            query.parseCentre(places,text)
+
+
+def test_run_query_and_write_matches():
+    places = table()
+    rows,km = query.runQuery(places,{'near':'York','radius':80,'types':['Town']})
+    assert list(rows)==[0,2]
+    rows,km = query.runQuery(places,{'point':[53.96,-1.08],'nearest':2})
+    assert list(rows)==[1,0] and km[0]==0
+    rows,km = query.runQuery(places,{'bbox':[-1.6,-1,53,54]})
+    assert sorted(rows)==[0,1] and km is None
+    with pytest.raises(ValueError):
+        query.runQuery(places,{'point':[53,-1]})
+    out = io.StringIO()
+    query.writeMatches(out,places,[(query.describe({'near':'York','nearest':2}),rows,None)])
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('query,place') and lines[1].startswith('2 nearest to York,')
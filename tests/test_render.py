@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the drawing helpers and of the plot session
+"""
+
+import numpy as np
+import pytest
+
+import render
+from placetable import PlaceTable
+
+
+def test_group_rows_is_a_stable_counting_sort():
+    keys = np.array([2,0,2,1,0])
+    order,bounds = render.groupRows(keys,4)
+    assert list(bounds)==[0,2,3,5,5]
+    assert list(order[bounds[0]:bounds[1]])==[1,4]
+    assert list(order[bounds[2]:bounds[3]])==[0,2]
+
+
+def test_group_by_type_splits_coordinates():
+    places = PlaceTable(['a','b','c'],[1.,2.,3.],[4.,5.,6.],[0,0,0],[1,0,1],['City','Town'])
+    types,xs,ys = render.groupByType(places)
+    assert types==['City','Town']
+    assert list(xs[0])==[2.] and list(ys[1])==[4.,6.]
+
+
+def test_size_list_grows_with_population():
+    sizes,colours = render.sizeList(np.array([10,1000,100000]))
+    assert list(np.argsort(sizes))==[0,1,2]
+    assert sizes[0]==7 and colours[0]==7
+
+
+def test_size_list_accepts_zero_population():
+    sizes,colours = render.sizeList(np.array([0,1,100]))
+    assert np.all(np.isfinite(sizes)) and sizes[0]==sizes[1]==7
+    assert sizes[2]>sizes[1]
+
+
+def test_style_table_keeps_original_styles_and_spreads_new_colours():
+    styleColours,styleMarkers = render.styleTable(8)
+    assert styleColours.shape==(8,4) and len(styleMarkers)==8
+    assert styleMarkers[:5]==render.markers and styleMarkers[5]==render.markers[0]
+    assert tuple(styleColours[0])==(1,0,0,1)
+    #Generated colours are distinct and opaque
+    assert len({tuple(c) for c in styleColours})==8
+    assert (styleColours[:,3]==1).all()
+
+
+def session():
+    from matplotlib.figure import Figure
+    fig = Figure()
+    ax = fig.add_subplot(111)
+    rng = np.random.default_rng(0)
+    places = PlaceTable(['p%d'%i for i in range(200)],rng.uniform(0,1,200),rng.uniform(0,1,200),
+        rng.integers(1,10**5,200),rng.integers(0,3,200),['City','Town','Village'])
+    s = render.PlotSession(ax)
+    return fig,ax,places,lambda **o:s.draw(places,render.PlotOptions(**o),[0,1],[0,1],1),s
+
+
+def test_session_redraws_only_the_changed_layers():
+    fig,ax,places,draw,s = session()
+    assert draw(title='A',labels=5)==['points','labels','legend','title']
+    lines = list(ax.lines)
+    assert len(lines)==3 and ax.get_legend() is not None and len(s.layers.names.texts)>0
+    assert draw(title='B',labels=5)==['title']
+    assert ax.get_title()=='B' and list(ax.lines)==lines
+    assert draw(title='B',labels=5,legend=False)==['legend']
+    assert ax.get_legend() is None
+    assert draw(title='B',labels=2,legend=False)==['labels']
+    assert len(s.layers.names.texts)<=2 and list(ax.lines)==lines
+
+
+def test_session_heatmap_with_and_without_a_colorbar():
+    fig,ax,places,draw,s = session()
+    draw()
+    assert draw(plottype='Heatmap')==['points','legend']
+    assert len(ax.images)==1 and not ax.lines and len(fig.axes)==2
+    #The colorbar of the old heatmap is removed before its image
+    assert draw(plottype='Heatmap',bins=50)==['points','legend']
+    assert len(ax.images)==1 and len(fig.axes)==2
+    assert draw(plottype='Heatmap',bins=50,smoothing=0)==['points','legend']
+    assert draw(plottype='Heatmap',bins=50,smoothing=0,legend=False)==['legend']
+    assert len(fig.axes)==1
+    assert draw(plottype='Heatmap',legend=False)==['points','legend']
+    assert len(ax.images)==1 and len(fig.axes)==1
+    assert draw(plottype='Heatmap')==['legend'] and len(fig.axes)==2
+    assert draw()==['points','legend']
+    assert not ax.images and len(ax.lines)==3 and len(fig.axes)==1 and ax.get_legend() is not None
+
+
+def test_session_points_clusters_and_detail():
+    fig,ax,places,draw,s = session()
+    draw(type=False,population=True)
+    assert len(ax.collections)==1 and not ax.lines
+    assert draw(type=False,population=True,detail=True)==['points','legend']
+    assert s.layers.detail is not None and len(ax.collections)==1
+    assert draw(cluster=True)==['points','legend']
+    assert s.layers.detail is None and s.layers.clusters is not None
+    assert list(ax.collections)==[s.layers.clusters.artist] and ax.get_legend() is not None
+    assert draw(plottype='Heatmap')==['points','legend']
+    assert s.layers.clusters is None and not ax.collections and len(fig.axes)==2
+    assert draw(detail=True)==['points','legend']
+    assert s.layers.detail is not None and len(ax.lines)==3 and len(fig.axes)==1
+
+
+def test_session_errors_leave_the_plot_unchanged():
+    fig,ax,places,draw,s = session()
+    draw(type=False)
+    plots = list(s.layers.plots)
+    untyped = places.select(np.ones(len(places),dtype=bool))
+    untyped.codes = None
+    with pytest.raises(ValueError):
+        s.draw(untyped,render.PlotOptions(),[0,1],[0,1],1)
+    assert s.layers.plots==plots and list(ax.collections)==plots
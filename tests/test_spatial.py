@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the grid spatial index
+"""
+
+import numpy as np
+
+import spatial
+
+
+def points(n=2000,seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-5,2,n),rng.uniform(50,58,n)
+
+
+def test_within_matches_brute_force():
+    x,y = points()
+    index = spatial.GridIndex(x,y)
+    for box in [(-1,0,52,53),(-5,2,50,58),(1.9,3,57.9,60)]:
+        xmin,xmax,ymin,ymax = box
+        expected = np.flatnonzero((x>=xmin)&(x<=xmax)&(y>=ymin)&(y<=ymax))
+        assert sorted(index.within(*box))==list(expected)
+
+
+def test_nearest_within_radius():
+    x,y = points()
+    index = spatial.GridIndex(x,y)
+    i = 123
+    assert index.nearest(x[i],y[i],radius=0.01)==i
+    #Nothing within the radius of a point far away
+    assert index.nearest(100,100,radius=1)is None
+
+
+def test_radius_in_pixels():
+    index = spatial.GridIndex([0.,1.],[0.,0.])
+    #10 pixels per unit: the point at 1 is 9 pixels from 0.1, the point at 0 is only 1 pixel away
+    assert index.nearest(0.1,0,radius=5,scale=(10,10))==0
+    assert index.nearest(0.6,0,radius=3,scale=(10,10))is None
+
+
+def test_empty_and_single_points():
+    assert spatial.GridIndex([],[]).nearest(0,0) is None
+    assert spatial.GridIndex([3.],[4.]).nearest(3,4)==0
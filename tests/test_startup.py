@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the startup of the GUI: the heavy modules must not be imported before the window is shown
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import benchmark
+
+
+def test_gui_import_leaves_out_the_plotting_and_web_modules():
+    pytest.importorskip('tkinter')
+    code = ("import sys,importlib.util;spec=importlib.util.spec_from_file_location('geoplotter',%r);"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec));"
+        "print(','.join(m for m in ('matplotlib.pyplot','PIL','requests') if m in sys.modules))"%benchmark.guiPath)
+    env = dict(os.environ)
+    env.pop('MPLBACKEND',None)
+    result = subprocess.run([sys.executable,'-c',code],capture_output=True,text=True,check=True,
+        cwd=os.path.dirname(benchmark.guiPath),env=env)
+    assert result.stdout.strip()==''
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the tile pyramid
+"""
+
+import numpy as np
+import pytest
+
+import tiles
+
+
+def test_halve_averages_blocks():
+    strip = np.array([[0,2,10],[2,4,20]],np.uint8)
+    #The odd column is padded by repeating the edge
+    assert tiles.halve(strip).tolist()==[[2,15]]
+
+
+def test_halve_keeps_channels():
+    strip = np.full((3,3,4),255,np.uint8)
+    out = tiles.halve(strip)
+    assert out.shape==(2,2,4) and out.dtype==np.uint8 and (out==255).all()
+
+
+def test_build_writes_every_level(tmp_path,monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(tiles,'stripRows',8)
+    rng = np.random.default_rng(0)
+    src = rng.integers(0,256,(50,37,3),dtype=np.uint8)
+    path = str(tmp_path/'map.png')
+    Image.fromarray(src).save(path)
+    limit = Image.MAX_IMAGE_PIXELS
+    calls = []
+    pyramid = tiles.TilePyramid.build(path,str(tmp_path/'tiles'),tileSize=16,
+        progress=lambda *a: calls.append(a))
+    assert Image.MAX_IMAGE_PIXELS==limit
+    assert pyramid.size==(37,50)
+    assert (np.asarray(pyramid.levels[0])==src).all()
+    assert [l.shape[:2] for l in pyramid.levels]==[(50,37),(25,19),(13,10)]
+    assert (np.asarray(pyramid.levels[1])==tiles.halve(src)).all()
+    assert calls[-1]==(2,25,25)
+    #The pyramid is reopened from disk
+    again = tiles.TilePyramid(str(tmp_path/'tiles'))
+    assert len(again.levels)==3
+
+
+def test_window_snaps_to_tiles(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    path = str(tmp_path/'map.png')
+    Image.fromarray(np.zeros((40,40),np.uint8)).save(path)
+    pyramid = tiles.TilePyramid.build(path,str(tmp_path/'tiles'),tileSize=16)
+    arr,extent = pyramid.window(0,5,5,20,10)
+    assert extent==(0,0,32,16) and arr.shape==(16,32)
+    arr,extent = pyramid.window(1,0,0,40,40)
+    assert extent==(0,0,40,40) and arr.shape==(20,20)
+    #One image pixel per screen pixel at least
+    assert pyramid.level(40,40,20,20)==1
+    assert pyramid.level(40,40,30,30)==0
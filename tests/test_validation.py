@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the validation of the values of a data file
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+import datacache
+from placetable import PlaceBuilder, ValidationErrors, loadPlaces, parseValues, validateColumns
+
+
+def test_parse_values_in_bulk():
+    values,bad = parseValues(['1.5','-2','3e2'],np.float64)
+    assert list(values)==[1.5,-2,300] and not bad.any()
+
+
+def test_parse_values_marks_only_the_bad_strings():
+    strings = [str(i) for i in range(200)]
+    strings[3],strings[150] = 'x',''
+    values,bad = parseValues(strings,np.int64,block=16)
+    assert list(np.flatnonzero(bad))==[3,150]
+    assert values[3]==0 and values[149]==149 and values[199]==199
+    values,bad = parseValues(['1','99999999999999999999'],np.int64)
+    assert list(bad)==[False,True]
+
+
+def test_validate_columns_reasons():
+    rows = [['Leeds','-1.55','53.8','474632'],
+            ['','-1','53','5'],
+            ['York','abc','53.96','152841'],
+            ['Hull','-0.33','95','256406'],
+            ['Selby','-1.07','53.78',''],
+            ['Goole','nan','53.7','-3'],
+            ['Ripon','-1.52']]
+    errors = ValidationErrors()
+    names,lon,lat,pop,types,invalid = validateColumns(rows,np.arange(2,9),0,1,2,3,errors=errors)
+    assert names==['Leeds'] and list(pop)==[474632] and types is None
+    assert list(np.flatnonzero(invalid))==[1,2,3,4,5,6]
+    assert errors.rows==6 and len(errors)==8
+    assert errors.counts()=={'missing':4,'unparsable':1,'out of range':3}
+    assert errors.summary()=="4 missing, 1 unparsable, 3 out of range"
+    assert errors.first()=="line 3: city missing ('')"
+
+
+def test_validate_columns_without_errors():
+    names,lon,lat,pop,types,invalid = validateColumns([['a','1','2','T'],['b','x','2','U']],None,0,1,2,None,3)
+    assert names==['a'] and pop is None and types==['T'] and list(invalid)==[False,True]
+
+
+def test_errors_are_written_in_file_order():
+    errors = ValidationErrors()
+    errors.add(np.array([4]),'longitude','unparsable',['x'])
+    errors.add(np.array([4,9]),'latitude','out of range',['-91','95'])
+    errors.add(np.array([],dtype=int),'city','missing',[])
+    out = io.StringIO()
+    errors.write(out)
+    assert out.getvalue().splitlines()==['line,column,reason,value','4,longitude,unparsable,x',
+        '4,latitude,out of range,-91','9,latitude,out of range,95']
+    assert errors.first()=="line 4: longitude unparsable ('x')"
+
+
+def test_builder_without_errors_stops_at_the_first_invalid_value():
+    builder = PlaceBuilder(0,1,2)
+    builder.append([['a','1','2']])
+    with pytest.raises(ValueError,match="line 3: latitude unparsable"):
+        builder.append([['b','1','2'],['c','1','x']],np.array([2,3]))
+    #The invalid chunk was not appended
+    assert builder.n==1
+
+
+def test_load_collects_errors_and_caches_their_report(tmp_path):
+    path = tmp_path/'places.csv'
+    path.write_text("City,Longitude,Latitude,Population\nLeeds,-1.55,53.8,474632\nYork,x,53.96,1\n,0,0,0\n")
+    with pytest.raises(ValueError):
+        loadPlaces(str(path))
+    errors = ValidationErrors()
+    places = loadPlaces(str(path),errors=errors)
+    assert list(places.names)==['Leeds'] and errors.rows==2
+    cache = datacache.DatasetCache(str(tmp_path/'cache'))
+    cache.store(str(path),places,errors)
+    report,invalid = cache.errorReport(str(path))
+    assert invalid==2
+    with open(report) as f:
+        assert f.read().splitlines()[1:]==['3,longitude,unparsable,x','4,city,missing,']
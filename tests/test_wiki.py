@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the Wikipedia page lookups that do not need the network
+"""
+
+import time
+
+import wiki
+
+
+def test_page_urls():
+    assert wiki.quoteTitle(' Newcastle upon Tyne ')=='Newcastle_upon_Tyne'
+    assert wiki.pageURL('Ynys Môn/Anglesey','https://w')=='https://w/wiki/Ynys_M%C3%B4n%2FAnglesey'
+    assert wiki.summaryURL('York','https://w')=='https://w/api/rest_v1/page/summary/York'
+
+
+def test_short_extract():
+    assert wiki.shortExtract({'extract':None})==''
+    text = wiki.shortExtract({'extract':'York  is a\ncathedral city '*20},length=40,width=20)
+    assert text.endswith('...') and all(len(line)<=20 for line in text.splitlines())
+    assert len(text.replace('\n',' '))<=43
+
+
+def test_entries_are_cached_on_disk_until_they_expire(tmp_path):
+    resolver = wiki.Resolver(base='https://w',directory=str(tmp_path))
+    assert resolver.lookup('York') is None
+    entry = {'name':'York','url':resolver.pageURL('York'),'exists':True,'extract':'A city','time':time.time()}
+    resolver.store(entry)
+    assert resolver.lookup('York')==entry
+    #Another resolver reads the entry back, unless it belongs to another server or has expired
+    assert wiki.Resolver(base='https://w',directory=str(tmp_path)).lookup('York')==entry
+    assert wiki.Resolver(base='https://other',directory=str(tmp_path)).lookup('York') is None
+    assert wiki.Resolver(base='https://w',directory=str(tmp_path),ttl=-1).lookup('York') is None
+    resolver.close()
+
+
+def test_nothing_is_queued_without_requests(tmp_path,monkeypatch):
+    monkeypatch.setattr(wiki,'hasRequests',False)
+    resolver = wiki.Resolver(directory=str(tmp_path))
+    assert resolver.prefetch(['York','Leeds'])==0 and resolver.fetch('York') is None
+    resolver.close()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the background tasks
+"""
+
+import threading
+
+import pytest
+
+import worker
+
+
+def test_result_and_progress():
+    def func(task,n):
+        for i in range(n):
+            task.report(i,n)
+        return n*2
+    task = worker.Task(func,3)
+    task.future.result(timeout=5)
+    assert task.done() and task.result()==6
+    assert task.progress==(2,3)
+
+
+def test_exceptions_are_raised_by_result():
+    task = worker.submit(int,'x')
+    task.future.exception(timeout=5)
+    with pytest.raises(ValueError):
+        task.result()
+
+
+def test_cancel_stops_at_the_next_report():
+    started,release = threading.Event(),threading.Event()
+    def func(task):
+        started.set()
+        release.wait(5)
+        task.report(1)
+        return 'finished'
+    task = worker.Task(func)
+    assert started.wait(5)
+    task.cancel()
+    release.set()
+    with pytest.raises(worker.Cancelled):
+        task.future.result(timeout=5)
+    with pytest.raises(worker.Cancelled):
+        task.result()
+
+
+def test_cancelled_task_that_finished_raises_cancelled():
+    started,release = threading.Event(),threading.Event()
+    def func():
+        started.set()
+        release.wait(5)
+        return 'finished'
+    task = worker.submit(func)
+    assert started.wait(5)
+    task.cancel()
+    release.set()
+    assert task.future.result(timeout=5)=='finished'
+    with pytest.raises(worker.Cancelled):
+        task.result()
+
+
+def test_watch_polls_until_done():
+    class Widget:
+        def __init__(self):
+            self.pending = []
+        def after(self,ms,func):
+            self.pending.append(func)
+    widget = Widget()
+    release = threading.Event()
+    def func(task):
+        task.report(1)
+        release.wait(5)
+        return 'ok'
+    task = worker.Task(func)
+    seen,results = [],[]
+    worker.watch(widget,task,lambda t:results.append(t.result()),seen.append)
+    #The task is still running: the poll is rescheduled
+    while task.progress is None:
+        pass
+    widget.pending.pop()()
+    assert len(widget.pending)==1 and seen==[1] and not results
+    release.set()
+    task.future.result(timeout=5)
+    widget.pending.pop()()
+    assert not widget.pending and results==['ok'] and seen==[1]
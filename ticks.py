@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Ticks: tick locator and formatter labelling a projected y axis in degrees of latitude
+
+Kept apart from georef so that georeferencing does not import matplotlib.
+"""
+
+#%% Import modules
+
+import numpy as np
+from matplotlib.ticker import FuncFormatter, Locator, MaxNLocator
+
+
+#%% Latitude ticks
+
+class LatitudeLocator(Locator):
+    '''Tick locator placing ticks at round latitudes on a projected y axis'''
+
+    def __init__(self,georef):
+        self.georef = georef
+        self.base = MaxNLocator()
+
+    def __call__(self):
+        vmin,vmax = self.axis.get_view_interval()
+        return self.tick_values(vmin,vmax)
+
+    def tick_values(self,vmin,vmax):
+        lat = self.georef.unproject([0,0],[vmin,vmax])[1]
+        ticks = self.base.tick_values(lat.min(),lat.max())
+        return self.georef.project(np.zeros_like(ticks),ticks)[1]
+
+
+# Function returning a formatter labelling projected y values with their latitude
+def latitudeFormatter(georef):
+    return FuncFormatter(lambda y,pos: "%g"%round(float(georef.unproject(0,y)[1]),4))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Tiles: multi-resolution pyramid of a (very large) map image, stored as memory-mapped arrays on
+disk, and a view that only loads the tiles of the level matching the visible extent
+"""
+
+#%% Import modules
+
+import os
+import json
+import math
+import hashlib
+import numpy as np
+
+import imagecache
+
+
+#%% Set up variables
+
+tileSize = 512      #pixels per side of a tile: windows are read in whole tiles
+stripRows = 1024    #rows of a level downsampled at a time while building the pyramid
+tileDir = os.path.join(imagecache.cacheDir,'tiles')
+
+
+# Function halving an image strip (rows,cols,channels) by averaging blocks of 2x2 pixels
+def halve(strip):
+    h,w = strip.shape[:2]
+    #Odd edges are padded by repeating the last row/column
+    if h%2 or w%2:
+        strip = np.pad(strip,[(0,h%2),(0,w%2)]+[(0,0)]*(strip.ndim-2),mode='edge')
+    s = strip.astype(np.uint16)
+    out = (s[0::2,0::2]+s[1::2,0::2]+s[0::2,1::2]+s[1::2,1::2]+2)>>2
+    return out.astype(strip.dtype)
+
+
+#%% Pyramid class
+
+class TilePyramid:
+    '''
+    Class holding the levels of a map image: level 0 is the full resolution, each following level
+    halves the previous one until it fits in a single tile. Levels are .npy files opened as memory
+    maps, so reading a window only pages in the rows it covers.
+    '''
+
+    def __init__(self,directory):
+        self.directory = directory
+        with open(os.path.join(directory,'pyramid.json')) as f:
+            self.meta = json.load(f)
+        self.levels = [np.load(os.path.join(directory,'level%d.npy'%l),mmap_mode='r')
+            for l in range(self.meta['levels'])]
+        self.tileSize = self.meta['tileSize']
+
+    @property
+    def size(self):
+        '''(width,height) of the full resolution image'''
+        h,w = self.levels[0].shape[:2]
+        return w,h
+
+    @classmethod
+    def build(cls,path,directory,tileSize=tileSize,progress=None):
+        '''
+        Decode the image at path once and write all levels of its pyramid to directory, one strip of
+        rows at a time. progress(level,row,height) is called after each strip written, if given.
+        '''
+        from PIL import Image
+        os.makedirs(directory,exist_ok=True)
+        #Maps are trusted local files: allow images above PIL's decompression-bomb limit, for this build only
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(path) as img:
+                w,h = img.size
+                mode = img.mode if img.mode in ('RGB','RGBA','L') else 'RGBA'
+                channels = {'L':(),'RGB':(3,),'RGBA':(4,)}[mode]
+                level = np.lib.format.open_memmap(os.path.join(directory,'level0.npy'),mode='w+',
+                    dtype=np.uint8,shape=(h,w)+channels)
+                #PIL decodes the whole image on the first crop; level 0 is then written from it in strips, so that
+                #no second full-size array (e.g. of np.asarray(img)) is made
+                for r in range(0,h,stripRows):
+                    strip = img.crop((0,r,w,min(h,r+stripRows)))
+                    level[r:r+stripRows] = np.asarray(strip if strip.mode==mode else strip.convert(mode))
+                    if progress is not None:
+                        progress(0,min(h,r+stripRows),h)
+                level.flush()
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+        levels = 1
+        while max(level.shape[:2])>tileSize:
+            h,w = level.shape[:2]
+            nxt = np.lib.format.open_memmap(os.path.join(directory,'level%d.npy'%levels),mode='w+',
+                dtype=level.dtype,shape=((h+1)//2,(w+1)//2)+level.shape[2:])
+            #Downsample in strips so that memory use does not depend on the image size
+            for r in range(0,h,stripRows):
+                nxt[r//2:(min(h,r+stripRows)+1)//2] = halve(level[r:r+stripRows])
+                if progress is not None:
+                    progress(levels,min(h,r+stripRows),h)
+            nxt.flush()
+            level = nxt
+            levels += 1
+
+        #The metadata is written last: its presence marks a complete pyramid
+        with open(os.path.join(directory,'pyramid.json'),'w') as f:
+            json.dump({'levels':levels,'tileSize':tileSize,'source':os.path.abspath(path)},f)
+        return cls(directory)
+
+    def level(self,width,height,screenWidth,screenHeight):
+        '''
+        Return the coarsest level still giving at least one image pixel per screen pixel along the
+        denser axis (bounding the window read even while only one of xlim/ylim has been updated)
+        '''
+        ratio = max(width/max(screenWidth,1),height/max(screenHeight,1))
+        l = int(math.floor(math.log2(ratio))) if ratio>1 else 0
+        return min(l,len(self.levels)-1)
+
+    def window(self,l,c0,r0,c1,r1):
+        '''
+        Read the window of level l covering full-resolution pixels [c0,c1) x [r0,r1), snapped outwards
+        to whole tiles. Returns (array,(c0,r0,c1,r1)) with the window in full-resolution pixels.
+        '''
+        data = self.levels[l]
+        scale = 2**l
+        t = self.tileSize
+        h,w = data.shape[:2]
+        lc0 = max(0,(int(c0)//scale)//t*t)
+        lr0 = max(0,(int(r0)//scale)//t*t)
+        lc1 = min(w,-(-int(math.ceil(c1/scale))//t)*t)
+        lr1 = min(h,-(-int(math.ceil(r1/scale))//t)*t)
+        #Copy out of the memory map: only the pages of these rows are read from disk
+        arr = np.array(data[lr0:lr1,lc0:lc1])
+        full = self.size
+        return arr,(lc0*scale,lr0*scale,min(full[0],lc1*scale),min(full[1],lr1*scale))
+
+
+# Function returning the pyramid of an image, building it (once) if it is not on disk yet
+def pyramidFor(path,directory=tileDir,progress=None):
+    key = repr(imagecache.fileKey(path)).encode()
+    directory = os.path.join(directory,hashlib.sha1(key).hexdigest())
+    if os.path.exists(os.path.join(directory,'pyramid.json')):
+        return TilePyramid(directory)
+    return TilePyramid.build(path,directory,progress=progress)
+
+
+#%% Tiled map view
+
+class TiledMap:
+    '''
+    Class drawing a pyramid as the base map of an axes. On every change of xlim/ylim only the tiles
+    of the visible extent are read, at the level matching the axes' size on screen, so memory is
+    bounded by the viewport rather than by the source image.
+    '''
+
+    def __init__(self,ax,pyramid,xlims,ylims):
+        self.ax = ax
+        self.pyramid = pyramid
+        self.xlims = xlims
+        self.ylims = ylims
+        self.current = None
+
+        coarsest = pyramid.levels[-1]
+        self.image = ax.imshow(np.array(coarsest),extent=[xlims[0],xlims[1],ylims[0],ylims[1]],zorder=0)
+        self.cids = [ax.callbacks.connect('xlim_changed',self.update),
+            ax.callbacks.connect('ylim_changed',self.update)]
+        self.update()
+
+    def pixels(self,x,y):
+        '''Convert data coordinates to full-resolution pixel (column,row)'''
+        w,h = self.pyramid.size
+        c = (x-self.xlims[0])/(self.xlims[1]-self.xlims[0])*w
+        r = (self.ylims[1]-y)/(self.ylims[1]-self.ylims[0])*h
+        return c,r
+
+    def update(self,ax=None):
+        '''Load the level and tiles matching the visible extent of the axes'''
+        w,h = self.pyramid.size
+        (x0,x1),(y0,y1) = sorted(self.ax.get_xlim()),sorted(self.ax.get_ylim())
+        c0,r0 = self.pixels(x0,y1)
+        c1,r1 = self.pixels(x1,y0)
+        c0,r0 = max(0,c0),max(0,r0)
+        c1,r1 = min(w,c1),min(h,r1)
+        if c1<=c0 or r1<=r0:
+            return
+
+        bbox = self.ax.bbox
+        l = self.pyramid.level(c1-c0,r1-r0,bbox.width,bbox.height)
+        #Nothing to load if the level and tiles on screen already cover the view
+        if self.current is not None:
+            cl,(wc0,wr0,wc1,wr1) = self.current
+            if cl==l and wc0<=c0 and wr0<=r0 and wc1>=c1 and wr1>=r1:
+                return
+
+        arr,window = self.pyramid.window(l,c0,r0,c1,r1)
+        wc0,wr0,wc1,wr1 = window
+        dx = (self.xlims[1]-self.xlims[0])/w
+        dy = (self.ylims[1]-self.ylims[0])/h
+        self.image.set_data(arr)
+        #Moving the image must not autoscale the axes (which would change the view being loaded)
+        autoscale = self.ax.get_autoscalex_on(),self.ax.get_autoscaley_on()
+        self.ax.set_autoscale_on(False)
+        self.image.set_extent([self.xlims[0]+wc0*dx,self.xlims[0]+wc1*dx,
+            self.ylims[1]-wr1*dy,self.ylims[1]-wr0*dy])
+        self.ax.set_autoscalex_on(autoscale[0])
+        self.ax.set_autoscaley_on(autoscale[1])
+        self.current = (l,window)
+
+    def disconnect(self):
+        for cid in self.cids:
+            self.ax.callbacks.disconnect(cid)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Wiki: Wikipedia pages of the places, checked and summarised in the background
+
+Pages are looked up through the page summary API over one pooled HTTP session, with at most
+maxConnections requests in flight. Results (whether the page exists, its address and the start of
+its extract) are kept in memory and on disk for ttl seconds, so that tooltips can show an extract
+at once and clicks open a page known to exist. The server is configurable (GEOPLOTTER_WIKI_URL or
+Resolver(base=...)), e.g. to test against a local stand-in serving the same two paths:
+    <base>/wiki/<title>                      the page opened in the browser
+    <base>/api/rest_v1/page/summary/<title>  JSON with 'extract' and 'content_urls' (404 if missing)
+"""
+
+#%% Import modules
+
+import os
+import json
+import time
+import hashlib
+import textwrap
+import threading
+import urllib.parse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import imagecache
+
+
+#%% Set up variables
+
+baseURL = os.environ.get('GEOPLOTTER_WIKI_URL','https://en.wikipedia.org').rstrip('/')
+wikiDir = os.path.join(imagecache.cacheDir,'wiki')
+defaultTTL = 7*24*3600  #seconds a looked up page is trusted before it is checked again
+maxConnections = 4      #requests in flight at once (and connections kept open)
+maxPending = 200        #lookups queued at once: further prefetches are dropped until the queue drains
+prefetchLimit = 50      #places looked up ahead of hovering, most populated first
+requestTimeout = 5      #seconds
+#requests is only imported by the first lookup: here it is just looked for
+hasRequests = importlib.util.find_spec('requests') is not None
+userAgent = 'Geoplotter/1.0 (https://github.com/ItsJamesLockwood/UK-city-plotter)'
+
+
+# Function returning the title of a place's page, percent-encoded for use in a URL
+def quoteTitle(name):
+    return urllib.parse.quote(str(name).strip().replace(' ','_'),safe='')
+
+
+# Function returning the address of a place's page
+def pageURL(name,base=baseURL):
+    return "%s/wiki/%s"%(base,quoteTitle(name))
+
+
+# Function returning the address of the summary of a place's page
+def summaryURL(name,base=baseURL):
+    return "%s/api/rest_v1/page/summary/%s"%(base,quoteTitle(name))
+
+
+# Function returning the start of the extract of a looked up page, wrapped to fit in a tooltip
+def shortExtract(entry,length=300,width=50):
+    extract = " ".join((entry.get('extract') or "").split())
+    if len(extract)>length:
+        extract = extract[:length].rsplit(' ',1)[0]+"..."
+    return textwrap.fill(extract,width)
+
+
+#%% Resolver class
+
+class Resolver:
+    '''
+    Class looking up the pages of places. lookup() never waits on the network: it returns the known
+    entry of a place ({'name','url','exists','extract','time'}) or None. prefetch() queues lookups in
+    the background and resolve() waits for one. Failed requests (no connection, server errors) are not
+    cached, so they are tried again later. May be used from any thread.
+    '''
+
+    def __init__(self,base=baseURL,directory=wikiDir,ttl=defaultTTL,connections=maxConnections,
+                 timeout=requestTimeout):
+        self.base = base.rstrip('/')
+        self.directory = directory
+        self.ttl = ttl
+        self.connections = connections
+        self.timeout = timeout
+        self.entries = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.session = None
+        self.executor = ThreadPoolExecutor(max_workers=connections,thread_name_prefix='wiki')
+
+    @property
+    def available(self):
+        return hasRequests
+
+    def pageURL(self,name):
+        return pageURL(name,self.base)
+
+    def getSession(self):
+        '''Return the HTTP session, created on first use with a pool of self.connections connections'''
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self.lock:
+            if self.session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,pool_maxsize=self.connections)
+                session.mount('http://',adapter)
+                session.mount('https://',adapter)
+                session.headers['User-Agent'] = userAgent
+                self.session = session
+            return self.session
+
+    def entryPath(self,name):
+        key = hashlib.sha1(("%s\n%s"%(self.base,name)).encode()).hexdigest()
+        return os.path.join(self.directory,key+'.json')
+
+    def fresh(self,entry):
+        return time.time()-entry['time']<self.ttl
+
+    def lookup(self,name):
+        '''Return the entry of name if it was looked up less than ttl seconds ago, else None'''
+        name = str(name)
+        entry = self.entries.get(name)
+        if entry is None:
+            try:
+                with open(self.entryPath(name)) as f:
+                    entry = json.load(f)
+            except (OSError,ValueError):
+                return None
+            self.entries[name] = entry
+        return entry if self.fresh(entry) else None
+
+    def store(self,entry):
+        self.entries[entry['name']] = entry
+        path = self.entryPath(entry['name'])
+        tmp = path+'.tmp%d.%d'%(os.getpid(),threading.get_ident())
+        try:
+            os.makedirs(self.directory,exist_ok=True)
+            with open(tmp,'w') as f:
+                json.dump(entry,f)
+            os.replace(tmp,path)
+        except OSError:
+            #The disk cache only saves requests: a failed write is not an error
+            pass
+
+    def fetch(self,name):
+        '''Look name up on the server and cache the result: returns the entry, or None if the request failed'''
+        name = str(name)
+        if not self.available:
+            return None
+        import requests
+        try:
+            response = self.getSession().get(summaryURL(name,self.base),timeout=self.timeout)
+            if response.status_code==404:
+                entry = {'name':name,'url':self.pageURL(name),'exists':False,'extract':"",'time':time.time()}
+            elif response.status_code==200:
+                data = response.json()
+                url = data.get('content_urls',{}).get('desktop',{}).get('page') or self.pageURL(name)
+                entry = {'name':name,'url':url,'exists':True,'extract':data.get('extract',""),'time':time.time()}
+            else:
+                return None
+        except (requests.RequestException,ValueError):
+            return None
+        self.store(entry)
+        return entry
+
+    def resolve(self,name):
+        '''Return the entry of name, looking it up on the server if needed (None if that failed)'''
+        return self.lookup(name) or self.fetch(name)
+
+    def prefetch(self,names):
+        '''Queue the lookup of the names that are not known yet: returns the number queued'''
+        if not self.available:
+            return 0
+        queued = 0
+        for name in names:
+            name = str(name)
+            with self.lock:
+                if name in self.pending or len(self.pending)>=maxPending:
+                    continue
+            if self.lookup(name) is not None:
+                continue
+            with self.lock:
+                self.pending.add(name)
+            self.executor.submit(self.prefetchOne,name)
+            queued += 1
+        return queued
+
+    def prefetchOne(self,name):
+        try:
+            self.fetch(name)
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+    def isPending(self,name):
+        return str(name) in self.pending
+
+    def close(self):
+        '''Drop the queued lookups and close the connections'''
+        self.executor.shutdown(wait=False,cancel_futures=True)
+        if self.session is not None:
+            self.session.close()
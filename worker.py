@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Worker: background tasks (loading, parsing, decoding) for the Geoplotter GUI
+
+Tasks run on a small thread pool; Tk is never touched from the workers. The GUI polls its tasks with
+after() (see watch) to show their progress and to receive their result, and can cancel them.
+"""
+
+#%% Import modules
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+#%% Set up variables
+
+pollInterval = 50   #milliseconds between two polls of a running task
+executor = ThreadPoolExecutor(max_workers=2,thread_name_prefix='geoplotter')
+
+
+class Cancelled(Exception):
+    '''Raised inside a task when it has been cancelled'''
+
+
+#%% Task class
+
+class Task:
+    '''
+    Class running func(task,*args) in the background. The function reports its progress with
+    task.report(value), which raises Cancelled once the task has been cancelled, so that long
+    loops stop at their next report.
+    '''
+
+    def __init__(self,func,*args):
+        self.cancelled = threading.Event()
+        self.progress = None
+        self.future = executor.submit(func,self,*args)
+
+    def report(self,*value):
+        if self.cancelled.is_set():
+            raise Cancelled()
+        self.progress = value
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        '''Return the result of the task, raising its exception (Cancelled if it was cancelled)'''
+        #A task cancelled while running may still have finished (e.g. a task that reports no progress)
+        if self.cancelled.is_set() or self.future.cancelled():
+            raise Cancelled()
+        return self.future.result()
+
+
+# Function running func(*args) as a task that reports no progress
+def submit(func,*args):
+    return Task(lambda task,*a:func(*a),*args)
+
+
+# Function polling a task from the Tk main loop: progress(*value) is called whenever the reported
+# progress changes and done(task) once it has finished (task.result() then returns or raises)
+def watch(widget,task,done,progress=None,interval=pollInterval):
+    last = [None]
+    def poll():
+        value = task.progress
+        if progress is not None and value is not None and value is not last[0]:
+            last[0] = value
+            progress(*value)
+        if task.done():
+            done(task)
+        else:
+            widget.after(interval,poll)
+    widget.after(interval,poll)